@@ -17,19 +17,38 @@ from PyQt6.QtWidgets import (
     QLineEdit,
     QPushButton,
     QListWidget,
+    QListWidgetItem,
     QMessageBox,
     QTextEdit,
     QTableWidget,
     QTableWidgetItem,
     QHeaderView,
     QInputDialog,
+    QProgressBar,
+    QCheckBox,
 )
 from PyQt6.QtGui import QColor, QPixmap, QIcon
-from PyQt6.QtCore import QObject, pyqtSignal, QThread
+from PyQt6.QtCore import QObject, Qt, pyqtSignal, QThread
 
 from database import create_connection, create_community_connection, create_tables
+from community_sync import COMMUNITY_SYNC_INTERVAL, CommunitySync, report_fraud
+from fraud_lookup import get_fraud_lookup, lookup_key
 from licensing import validate_key, generate_key
-from gemini_processor import initialize_gemini, analyze_message_with_gemini, classify_message_type, find_matches_in_catalog, detect_fraud_report_with_gemini
+from gemini_processor import initialize_gemini
+from enrichment import enrich_new_messages, retry_failed_enrichments
+from fraud_reports import FRAUD_CHECK_INTERVAL, report_new_fraud
+from matching import match_new_buying_requests, reset_match_state
+from message_search import search_archives, search_messages
+from media_store import get_media_store, get_thumbnail, migrate_picture_blobs
+from retention import list_archives, run_retention_if_due
+from contacts import SELF_ALIAS, get_or_create_contact
+from phone_numbers import normalize_kenyan_number
+from db_writer import DatabaseWriter
+from group_scheduler import GroupScheduler
+from page_pool import assign_groups, browser_launch_args, get_page_pool_size, open_pool_page
+from whatsapp_events import FULL_SWEEP_INTERVAL, ChatEventWatcher
+from whatsapp_navigation import GroupNavigator
+from whatsapp_scraper import scrape_and_save_messages
 
 class Worker(QObject):
     """
@@ -38,6 +57,9 @@ class Worker(QObject):
     finished = pyqtSignal()
     status_update = pyqtSignal(str)
     error = pyqtSignal(str)
+    data_changed = pyqtSignal()
+    progress = pyqtSignal(int, int)
+    result = pyqtSignal(object)
 
     def __init__(self, monitor_function):
         super().__init__()
@@ -56,6 +78,9 @@ class Worker(QObject):
         self.running = False
 
 class SalesAgentDashboard(QMainWindow):
+    # Reports added or changed in the community fraud list, from any thread
+    fraud_numbers_changed = pyqtSignal(object)
+
     def __init__(self, user_phone_number):
         super().__init__()
         self.user_phone_number = user_phone_number
@@ -70,9 +95,23 @@ class SalesAgentDashboard(QMainWindow):
 
         self.conn = create_connection()
         create_tables(self.conn)
+        # Pictures from before the media store are moved out of the messages table once
+        migrated = migrate_picture_blobs(self.conn, get_media_store())
+        if migrated:
+            print(f"Moved {migrated} pictures into the media store.")
+        # Quotes of the user's own posts show "You" instead of their number
+        self.user_contact_id = get_or_create_contact(self.conn, self.user_phone_number, aliases=(SELF_ALIAS,))
+        self.conn.commit()
+        # picture hash -> thumbnail QPixmap (or None if it could not be loaded)
+        self.thumbnail_cache = {}
         self.community_conn = create_community_connection()
         if self.community_conn:
             create_tables(self.community_conn, is_community=True)
+        # Loaded once; every later change arrives through fraud_numbers_changed
+        self.fraud_lookup = get_fraud_lookup()
+        self.fraud_lookup.add_listener(self.fraud_numbers_changed.emit)
+        # phone number -> its row in the Mulika Mwizi list
+        self.fraud_list_items = {}
 
         self.gemini_model = initialize_gemini() # Initialize the AI model
 
@@ -86,22 +125,50 @@ class SalesAgentDashboard(QMainWindow):
         self.monitoring_worker = None
         self.is_monitoring = False
         self.animation_state = 0
+        self.event_driven_capture = True
+        self.group_scheduler = None
+        self.group_navigator = None
+        self.message_writer = None
+
+        # --- Enrichment State ---
+        self.enrichment_thread = None
+        self.enrichment_worker = None
+
+        # --- Fraud Reporting State ---
+        self.fraud_thread = None
+        self.fraud_worker = None
+
+        # --- Matching State ---
+        self.matching_thread = None
+        self.matching_worker = None
+        self.new_match_count = 0
+
+        # --- Community Sync State ---
+        self.community_sync_thread = None
+        self.community_sync_worker = None
 
         self.create_customer_replies_tab()
         self.create_match_tab()
         self.create_popular_tab()
+        self.create_search_tab()
         self.create_groups_tab()
         self.create_mulika_mwizi_tab()
         self.create_catalog_tab()
         self.create_call_log_tab() # Add new tab
 
         self.load_groups()
+        self.fraud_numbers_changed.connect(self.on_fraud_numbers_changed)
         self.load_fraudulent_numbers()
         self.load_customer_replies()
         self.load_popular_products()
         self.load_catalog()
+        self.load_matches()
         self.load_call_logs() # Load data for new tab
 
+        self.start_enrichment()
+        self.start_fraud_reporting()
+        self.start_community_sync()
+
     def create_customer_replies_tab(self):
         tab = QWidget()
         self.tabs.addTab(tab, "Customer Replies")
@@ -145,9 +212,13 @@ class SalesAgentDashboard(QMainWindow):
         self.match_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         layout.addWidget(self.match_table)
 
-        find_matches_button = QPushButton("Find All Matches")
-        find_matches_button.clicked.connect(self.find_and_display_matches)
-        layout.addWidget(find_matches_button)
+        self.match_progress_bar = QProgressBar()
+        self.match_progress_bar.setVisible(False)
+        layout.addWidget(self.match_progress_bar)
+
+        self.find_matches_button = QPushButton("Find New Matches")
+        self.find_matches_button.clicked.connect(self.find_and_display_matches)
+        layout.addWidget(self.find_matches_button)
 
     def create_popular_tab(self):
         tab = QWidget()
@@ -173,6 +244,46 @@ class SalesAgentDashboard(QMainWindow):
         refresh_button.clicked.connect(self.load_popular_products)
         layout.addWidget(refresh_button)
 
+    def create_search_tab(self):
+        tab = QWidget()
+        self.tabs.addTab(tab, "Search")
+        layout = QVBoxLayout(tab)
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search all messages, e.g. 'premio headlight' or 'taa za mbele'")
+        self.search_input.returnPressed.connect(self.search_message_history)
+        layout.addWidget(self.search_input)
+
+        self.search_archives_checkbox = QCheckBox("Include archived messages")
+        layout.addWidget(self.search_archives_checkbox)
+
+        self.search_results_table = QTableWidget()
+        self.search_results_table.setColumnCount(4)
+        self.search_results_table.setHorizontalHeaderLabels(["Date and Time", "Group", "Sender", "Message"])
+        self.search_results_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.search_results_table)
+
+        search_button = QPushButton("Search")
+        search_button.clicked.connect(self.search_message_history)
+        layout.addWidget(search_button)
+
+    def search_message_history(self):
+        text = self.search_input.text().strip()
+        try:
+            self.search_results_table.setRowCount(0)
+            hits = search_messages(self.conn, text, limit=200) if text else []
+            if text and self.search_archives_checkbox.isChecked():
+                hits = sorted(hits + search_archives(list_archives(), text, limit=200), key=lambda hit: hit["rank"])[:200]
+            self.search_results_table.setRowCount(len(hits))
+            for i, hit in enumerate(hits):
+                self.search_results_table.setItem(i, 0, QTableWidgetItem(hit["timestamp"]))
+                self.search_results_table.setItem(i, 1, QTableWidgetItem(hit["group_name"]))
+                self.search_results_table.setItem(i, 2, QTableWidgetItem(hit["sender"]))
+                self.search_results_table.setItem(i, 3, QTableWidgetItem(hit["snippet"]))
+            print(f"Found {len(hits)} message(s) for '{text}'.")
+        except sqlite3.Error as e:
+            print(f"Error searching messages: {e}")
+
     def create_groups_tab(self):
         tab = QWidget()
         self.tabs.addTab(tab, "Groups")
@@ -193,6 +304,10 @@ class SalesAgentDashboard(QMainWindow):
         self.remove_group_button.clicked.connect(self.remove_group)
         layout.addWidget(self.remove_group_button)
 
+        self.event_capture_checkbox = QCheckBox("Event-driven capture (only open groups with new messages)")
+        self.event_capture_checkbox.setChecked(True)
+        layout.addWidget(self.event_capture_checkbox)
+
         self.monitoring_toggle_button = QPushButton("Start Monitoring")
         self.monitoring_toggle_button.clicked.connect(self.toggle_monitoring)
         layout.addWidget(self.monitoring_toggle_button)
@@ -387,6 +502,8 @@ class SalesAgentDashboard(QMainWindow):
             self.price_input.clear()
             self.details_input.clear()
             self.load_catalog()
+            # The new item may match requests that were already checked, so check them all again next time
+            reset_match_state(self.conn)
             print(f"Added '{product}' to catalog.")
 
         except ValueError:
@@ -447,11 +564,35 @@ class SalesAgentDashboard(QMainWindow):
             c.execute("SELECT phone_number, reason FROM fraudulent_numbers")
             numbers = c.fetchall()
             self.fraudulent_numbers_list.clear()
-            for number in numbers:
-                self.fraudulent_numbers_list.addItem(f"{number[0]} - {number[1]}")
+            self.fraud_list_items = {}
+            self.update_fraud_list(numbers)
+            # Later changes only update their own rows
+            self.fraud_lookup.refresh()
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Database Error", f"An error occurred: {e}")
 
+    def update_fraud_list(self, numbers):
+        """Adds reported numbers to the Mulika Mwizi list, or updates the rows they already have."""
+        for phone_number, reason in numbers:
+            item = self.fraud_list_items.get(phone_number)
+            if item is None:
+                item = self.fraud_list_items[phone_number] = QListWidgetItem()
+                self.fraudulent_numbers_list.addItem(item)
+            item.setText(f"{phone_number} - {reason}")
+
+    def on_fraud_numbers_changed(self, changes):
+        """Shows new or changed community fraud reports without reloading the list or the replies."""
+        self.update_fraud_list(changes)
+        reported = {lookup_key(phone_number) for phone_number, _ in changes}
+        for row in range(self.customer_replies_table.rowCount()):
+            phone_item = self.customer_replies_table.item(row, 1)
+            if phone_item and phone_item.data(Qt.ItemDataRole.UserRole) in reported:
+                self.highlight_fraudulent(phone_item)
+
+    def highlight_fraudulent(self, phone_item):
+        phone_item.setBackground(QColor("red"))
+        phone_item.setForeground(QColor("white"))
+
     def report_fraudulent_number(self):
         if not self.community_conn:
             QMessageBox.critical(self, "Database Error", "Community database connection is not available.")
@@ -459,18 +600,20 @@ class SalesAgentDashboard(QMainWindow):
             
         phone_number = self.fraud_number_input.text()
         reason = self.fraud_reason_input.toPlainText()
+        # Store Kenyan numbers in one format so lookups match however they were typed
+        phone_number = normalize_kenyan_number(phone_number) or phone_number.strip()
         if phone_number and reason:
             try:
-                c = self.community_conn.cursor()
-                c.execute("INSERT INTO fraudulent_numbers (phone_number, reason, reported_by) VALUES (?, ?, ?)", 
-                          (phone_number, reason, self.user_phone_number))
-                self.community_conn.commit()
-                self.fraudulent_numbers_list.addItem(f"{phone_number} - {reason}")
+                # Stored locally and shared with the other agents on the next sync
+                if not report_fraud(self.community_conn, self.user_phone_number, phone_number, reason,
+                                    self.user_phone_number, only_if_new=True):
+                    QMessageBox.warning(self, "Duplicate Number", "This number has already been reported.")
+                    return
+                # Adds the number to the list and highlights its replies
+                self.fraud_lookup.refresh()
                 self.fraud_number_input.clear()
                 self.fraud_reason_input.clear()
                 QMessageBox.information(self, "Success", "Fraudulent number reported to the community.")
-            except sqlite3.IntegrityError:
-                QMessageBox.warning(self, "Duplicate Number", "This number has already been reported.")
             except sqlite3.Error as e:
                 QMessageBox.critical(self, "Database Error", f"An error occurred: {e}")
         else:
@@ -488,6 +631,9 @@ class SalesAgentDashboard(QMainWindow):
             return
 
         self.is_monitoring = True
+        # Read once here: the monitoring thread must not touch widgets
+        self.event_driven_capture = self.event_capture_checkbox.isChecked()
+        self.event_capture_checkbox.setEnabled(False)
         self.monitoring_toggle_button.setText("Stop Monitoring")
         self.monitoring_status_label.setText("Status: Starting...")
         self.monitoring_status_label.setStyleSheet("color: orange;")
@@ -518,6 +664,7 @@ class SalesAgentDashboard(QMainWindow):
         
         self.monitoring_toggle_button.setText("Start Monitoring")
         self.monitoring_toggle_button.setEnabled(True)
+        self.event_capture_checkbox.setEnabled(True)
         self.monitoring_status_label.setText("Status: Inactive")
         self.monitoring_status_label.setStyleSheet("color: grey;")
 
@@ -531,21 +678,132 @@ class SalesAgentDashboard(QMainWindow):
         self.monitoring_status_label.setText(f"Status: {status}{dots}")
         self.monitoring_status_label.setStyleSheet("color: green;")
 
+    def start_enrichment(self):
+        """Starts the background thread that runs the AI analysis on newly scraped messages."""
+        if not self.gemini_model:
+            print("Enrichment disabled: Gemini model not initialized.")
+            return
+
+        self.enrichment_thread = QThread()
+        self.enrichment_worker = Worker(self.run_enrichment)
+        self.enrichment_worker.moveToThread(self.enrichment_thread)
+
+        self.enrichment_thread.started.connect(self.enrichment_worker.run)
+        self.enrichment_worker.finished.connect(self.enrichment_thread.quit)
+        self.enrichment_worker.data_changed.connect(self.on_enrichment_data_changed)
+        self.enrichment_worker.error.connect(lambda message: print(f"Error in enrichment thread: {message}"))
+
+        self.enrichment_thread.start()
+
+    def run_enrichment(self, worker):
+        """Enriches new messages every 30 seconds until the worker is stopped."""
+        # This needs its own connection for thread safety
+        conn = create_connection()
+        if not conn:
+            worker.error.emit("Could not create a database connection in the enrichment thread.")
+            return
+
+        try:
+            while worker.running:
+                try:
+                    changed = enrich_new_messages(conn, self.gemini_model, should_continue=lambda: worker.running)
+                    changed += retry_failed_enrichments(conn, self.gemini_model)
+                    # Old messages are archived once a day, after they have been enriched and
+                    # checked for fraud reports
+                    changed += run_retention_if_due(conn, wait_for_fraud=self.fraud_worker is not None)
+                    if changed:
+                        worker.data_changed.emit()
+                except Exception as e:
+                    print(f"Error during message enrichment: {e}")
+
+                for _ in range(30):
+                    if not worker.running:
+                        break
+                    time.sleep(1)
+        finally:
+            conn.close()
+            print("Enrichment thread stopped.")
+
+    def start_fraud_reporting(self):
+        """Starts the background thread that adds the fraud reports found in enriched messages to the community list."""
+        if not self.gemini_model:
+            print("Fraud reporting disabled: Gemini model not initialized.")
+            return
+
+        self.fraud_thread = QThread()
+        self.fraud_worker = Worker(self.analyze_messages_for_fraud)
+        self.fraud_worker.moveToThread(self.fraud_thread)
+
+        self.fraud_thread.started.connect(self.fraud_worker.run)
+        self.fraud_worker.finished.connect(self.fraud_thread.quit)
+        self.fraud_worker.error.connect(lambda message: print(f"Error in fraud analysis thread: {message}"))
+
+        self.fraud_thread.start()
+
+    def start_community_sync(self):
+        """Starts the background thread that exchanges fraud reports with the other agents."""
+        self.community_sync_thread = QThread()
+        self.community_sync_worker = Worker(self.run_community_sync)
+        self.community_sync_worker.moveToThread(self.community_sync_thread)
+
+        self.community_sync_thread.started.connect(self.community_sync_worker.run)
+        self.community_sync_worker.finished.connect(self.community_sync_thread.quit)
+        self.community_sync_worker.error.connect(lambda message: print(f"Error in community sync thread: {message}"))
+
+        self.community_sync_thread.start()
+
+    def run_community_sync(self, worker):
+        """Pushes and pulls community fraud reports every few minutes until the worker is stopped."""
+        # This needs its own connection for thread safety
+        conn = create_community_connection()
+        if not conn:
+            worker.error.emit("Could not open the community replica in the sync thread.")
+            return
+
+        sync = CommunitySync(conn, self.user_phone_number)
+        try:
+            while worker.running:
+                try:
+                    pushed, merged = sync.sync()
+                    if pushed or merged:
+                        print(f"Community sync: shared {pushed} report(s), received {merged}.")
+                    if merged:
+                        # Listeners are told about the reports that changed
+                        self.fraud_lookup.refresh()
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Error during community sync: {e}")
+
+                for _ in range(COMMUNITY_SYNC_INTERVAL):
+                    if not worker.running:
+                        break
+                    time.sleep(1)
+        finally:
+            conn.close()
+            print("Community sync thread stopped.")
+
+    def on_enrichment_data_changed(self):
+        self.load_customer_replies()
+        self.load_popular_products()
+
     def monitor_groups(self, worker):
         conn = create_connection()
         if not conn:
             worker.error.emit("Could not create a database connection in the monitoring thread.")
             return
 
+        # All scraped rows are written by one thread; the pages only read
+        self.message_writer = DatabaseWriter().start()
+        pool_threads = []
         with sync_playwright() as p:
             try:
                 # New: Launch a persistent browser context instead of connecting.
                 # This automates the browser launch and removes the need for manual commands.
                 user_data_dir = "wa_user_data"
+                page_count = 1 if self.event_driven_capture else get_page_pool_size()
                 context = p.chromium.launch_persistent_context(
                     user_data_dir,
                     headless=False, # Set to True if you don't want to see the browser
-                    args=['--remote-debugging-port=9223'] # Keep the port for potential future connections
+                    args=browser_launch_args(page_count) # Extra pool pages attach through the debugging port
                 )
                 page = context.pages[0] if context.pages else context.new_page()
                 
@@ -557,270 +815,274 @@ class SalesAgentDashboard(QMainWindow):
                 
                 worker.status_update.emit("Connected to browser")
 
-                # Start the fraud analysis thread
-                fraud_thread = threading.Thread(target=self.analyze_messages_for_fraud, args=(worker,), daemon=True)
-                fraud_thread.start()
-
-                while worker.running:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT name FROM groups")
-                    groups = [row[0] for row in cursor.fetchall()]
-                    
-                    if not groups:
-                        worker.status_update.emit("No groups to monitor. Waiting...")
-                        time.sleep(30)
-                        continue
-
-                    for group_name in groups:
-                        if not worker.running:
-                            break
-                        
-                        try:
-                            # This is a new, more robust navigation logic that mimics human scrolling.
-                            worker.status_update.emit(f"Searching for '{group_name}'")
-                            # Wait for the main app panel using the selector you provided.
-                            page.wait_for_selector('#app > div > div.x78zum5.xdt5ytf.x5yr21d > div > div.x9f619.x1n2onr6.xyw6214.x5yr21d.x6ikm8r.x10wlt62.x17dzmu4.x1i1dayz.x2ipvbc.x1w8yi2h.xyyilfv.x1iyjqo2.xpilrb4.x1t7ytsu.x1m2ixmg', timeout=30000)
-                            
-                            group_found = False
-                            # Try to find the group by its title attribute in a span
-                            chat_selector = f'//span[@title="{group_name}"]'
-
-                            # Scroll and search loop
-                            for i in range(10): # Try up to 10 scrolls
-                                if not worker.running: break
-                                
-                                group_elements = page.locator(chat_selector).all()
-                                if group_elements:
-                                    # Click the first element found
-                                    group_elements[0].click()
-                                    group_found = True
-                                    break
-                                
-                                # If not found, scroll the chat list down
-                                page.mouse.wheel(0, 500) # Scroll down
-                                time.sleep(1)
-
-                            if not group_found:
-                                raise Exception(f"Group '{group_name}' not found in chat list after 10 scrolls.")
-
-                            worker.status_update.emit(f"Scraping '{group_name}'")
-                            time.sleep(5) # Wait for messages to load
-                            self.scrape_and_save_messages(page, conn)
-
-                        except Exception as nav_exc:
-                            screenshot_path = "debug_screenshot.png"
-                            page.screenshot(path=screenshot_path)
-                            error_message = (
-                                f"Could not navigate to or scrape group {group_name}. "
-                                f"A screenshot has been saved to '{screenshot_path}' for debugging. "
-                                f"Please view the screenshot and describe what you see. "
-                                f"Original error: {nav_exc}"
-                            )
-                            print(error_message) # Also print to console for clarity
-                            worker.status_update.emit(f"Failed to load '{group_name}'. See console for details.")
-                            # We no longer raise a fatal error, just log and continue to the next group.
-                        
-                        if not worker.running:
-                            break
-                        time.sleep(10) # Wait between groups
-
-                    if worker.running:
-                        worker.status_update.emit("Cycle complete. Waiting...")
-                        time.sleep(60) # Wait a minute before the next full cycle
+                self.group_scheduler = GroupScheduler()
+                self.group_navigator = GroupNavigator(page)
+                if self.event_driven_capture:
+                    self.capture_group_events(conn, worker)
+                else:
+                    for page_index in range(1, page_count):
+                        pool_thread = threading.Thread(target=self.run_pool_page, args=(page_index, page_count, worker), daemon=True)
+                        pool_thread.start()
+                        pool_threads.append(pool_thread)
+                    self.poll_groups(self.group_navigator, conn, worker, 0, page_count)
 
             except Exception as e:
                 print(f"An error occurred during monitoring: {e}")
                 worker.error.emit(str(e))
             finally:
+                worker.running = False
+                for pool_thread in pool_threads:
+                    pool_thread.join()
+                self.message_writer.stop()
                 conn.close()
                 print("Database connection for monitoring thread closed.")
 
-    def analyze_messages_for_fraud(self, worker):
-        """Continuously analyzes new messages for fraud reports."""
-        if not self.community_conn:
-            print("Fraud analysis disabled: No community DB connection.")
+    def run_pool_page(self, page_index, page_count, worker):
+        """Scrapes this page's share of the groups in an extra WhatsApp Web tab, on its own thread."""
+        conn = create_connection()
+        if not conn:
+            print(f"Page {page_index}: could not create a database connection.")
             return
+        try:
+            with sync_playwright() as p:
+                browser, page = open_pool_page(p)
+                try:
+                    navigator = GroupNavigator(page, metrics_path=f"navigation_metrics_page{page_index}.csv")
+                    self.poll_groups(navigator, conn, worker, page_index, page_count)
+                finally:
+                    page.close()
+                    browser.close()
+        except Exception as e:
+            print(f"Page {page_index} stopped: {e}")
+        finally:
+            conn.close()
+
+    def load_monitored_group_names(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM groups")
+        return [row[0] for row in cursor.fetchall()]
+
+    def scrape_group(self, navigator, conn, group_name, worker, navigate=True):
+        """
+        Opens a group in the navigator's page (unless it is already open), hands its new
+        messages to the database writer and records the visit with the group scheduler.
+
+        Returns:
+            A tuple (new, skipped) of row counts; (0, 0) if the group could not be scraped.
+        """
+        page = navigator.page
+        started = time.monotonic()
+        counts = (0, 0)
+        try:
+            if navigate:
+                worker.status_update.emit(f"Searching for '{group_name}'")
+                # Returns once the chat header and messages have rendered
+                if not navigator.open_group(group_name, lambda: worker.running):
+                    return counts
+                worker.status_update.emit(f"Scraping '{group_name}'")
+            counts = scrape_and_save_messages(page, conn, self.message_writer)
+            return counts
+
+        except Exception as nav_exc:
+            screenshot_path = "debug_screenshot.png"
+            page.screenshot(path=screenshot_path)
+            error_message = (
+                f"Could not navigate to or scrape group {group_name}. "
+                f"A screenshot has been saved to '{screenshot_path}' for debugging. "
+                f"Please view the screenshot and describe what you see. "
+                f"Original error: {nav_exc}"
+            )
+            print(error_message) # Also print to console for clarity
+            worker.status_update.emit(f"Failed to load '{group_name}'. See console for details.")
+            # We no longer raise a fatal error, just log and continue to the next group.
+            return counts
 
-        print("Starting background fraud analysis...")
-        last_checked_id = 0
+        finally:
+            self.group_scheduler.record_visit(group_name, *counts, time.monotonic() - started)
+            self.group_scheduler.export_metrics()
+            if navigate:
+                navigator.export_metrics()
+
+    def wait_while_monitoring(self, page, seconds, worker):
+        """Waits up to `seconds` while keeping Playwright responsive, returning early once monitoring stops."""
+        deadline = time.monotonic() + seconds
+        while worker.running and time.monotonic() < deadline:
+            page.wait_for_timeout(min(1.0, deadline - time.monotonic()) * 1000)
+
+    def poll_groups(self, navigator, conn, worker, page_index=0, page_count=1):
+        """
+        Scrapes this page's share of the monitored groups as the scheduler makes them due,
+        busiest first, and idles until the next one is due.
+        """
+        page = navigator.page
+        # Rows stored vs. rows already known, for the current round over the page's groups
+        cycle_new, cycle_skipped, visited = 0, 0, set()
         while worker.running:
-            try:
-                # This needs its own connection for thread safety
-                local_conn = create_connection()
-                comm_conn = create_community_connection()
-                if not local_conn or not comm_conn:
-                    time.sleep(60)
-                    continue
-
-                local_cursor = local_conn.cursor()
-                comm_cursor = comm_conn.cursor()
+            all_groups = self.load_monitored_group_names(conn)
+            groups = assign_groups(all_groups, page_index, page_count)
+
+            if not groups:
+                worker.status_update.emit("No groups to monitor. Waiting...")
+                self.wait_while_monitoring(page, 30, worker)
+                continue
+
+            if page_index == 0:
+                self.group_scheduler.sync_groups(all_groups)
+            group_name = self.group_scheduler.next_group(groups)
+            if group_name is None:
+                wait = self.group_scheduler.seconds_until_next_due(groups)
+                if wait is None:
+                    # The groups were just added and are not tracked yet
+                    wait = 1
+                if page_index == 0:
+                    worker.status_update.emit(f"Next group due in {wait:.0f}s. Waiting...")
+                self.wait_while_monitoring(page, wait, worker)
+                continue
+
+            new_rows, skipped_rows = self.scrape_group(navigator, conn, group_name, worker)
+            cycle_new += new_rows
+            cycle_skipped += skipped_rows
+            visited.add(group_name)
+
+            if visited.issuperset(groups):
+                print(f"Scrape cycle (page {page_index}): {cycle_new} new rows, {cycle_skipped} skipped across {len(groups)} groups.")
+                worker.status_update.emit(f"Cycle complete ({cycle_new} new, {cycle_skipped} skipped)")
+                cycle_new, cycle_skipped, visited = 0, 0, set()
+
+    def capture_group_events(self, conn, worker):
+        """
+        Event-driven capture: an observer injected into WhatsApp Web reports new messages in
+        the open chat and new unread badges in the chat list, and only those groups are
+        scraped. Every group is still swept once at startup and then every FULL_SWEEP_INTERVAL
+        seconds, to catch up on anything that arrived while no event could be seen.
+        """
+        navigator = self.group_navigator
+        watcher = ChatEventWatcher(navigator.page)
+        watcher.install()
+        last_sweep = None
 
-                local_cursor.execute("SELECT id, sender, message_text FROM messages WHERE id > ?", (last_checked_id,))
-                new_messages = local_cursor.fetchall()
-
-                if new_messages:
-                    last_checked_id = new_messages[-1][0] # Update to the last processed ID
-                    
-                    for msg_id, sender, text in new_messages:
-                        if not worker.running: break
-                        
-                        fraud_report = detect_fraud_report_with_gemini(self.gemini_model, text)
-                        if fraud_report:
-                            phone = fraud_report.get("phone_number")
-                            reason = fraud_report.get("reason", "AI Detected")
-                            
-                            print(f"AI detected a potential fraud report by {sender} against {phone}.")
-                            try:
-                                comm_cursor.execute(
-                                    "INSERT OR IGNORE INTO fraudulent_numbers (phone_number, reason, reported_by) VALUES (?, ?, ?)",
-                                    (phone, reason, f"AI ({sender})")
-                                )
-                                comm_conn.commit()
-                                print(f"Successfully saved AI-detected fraud report for {phone} to community DB.")
-                                # Refresh the list in the UI thread
-                                self.load_fraudulent_numbers()
-                            except sqlite3.Error as e:
-                                print(f"Error saving AI-detected fraud report: {e}")
-                
-                local_conn.close()
-                comm_conn.close()
+        while worker.running:
+            groups = self.load_monitored_group_names(conn)
+            if not groups:
+                worker.status_update.emit("No groups to monitor. Waiting...")
+                watcher.wait_for_activity(30, lambda: worker.running)
+                continue
+
+            if last_sweep is None or time.monotonic() - last_sweep >= FULL_SWEEP_INTERVAL:
+                last_sweep = time.monotonic()
+                watcher.take_activity()
+                for group_name in groups:
+                    if not worker.running:
+                        break
+                    self.scrape_group(navigator, conn, group_name, worker)
+                    watcher.discard(group_name)
+                continue
+
+            worker.status_update.emit("Watching for new messages")
+            if not watcher.wait_for_activity(FULL_SWEEP_INTERVAL, lambda: worker.running):
+                continue
+
+            unread, active = watcher.take_activity()
+            # The open chat first: it needs no navigation
+            for group_name, event_time in active.items():
+                if worker.running and group_name in groups and group_name not in unread:
+                    self.report_capture(group_name, event_time, self.scrape_group(navigator, conn, group_name, worker, navigate=False))
+            for group_name, event_time in unread.items():
+                if not worker.running:
+                    break
+                if group_name in groups:
+                    self.report_capture(group_name, event_time, self.scrape_group(navigator, conn, group_name, worker))
+                    # Opening the group shows up as activity in the open chat
+                    watcher.discard(group_name)
+
+    def report_capture(self, group_name, event_time, counts):
+        new_rows, skipped_rows = counts
+        print(f"'{group_name}': {new_rows} new, {skipped_rows} skipped, "
+              f"stored {time.monotonic() - event_time:.1f}s after the event.")
 
-            except Exception as e:
-                print(f"Error in fraud analysis thread: {e}")
-            
-            # Wait for a while before checking for new messages again
-            time.sleep(120) # Check every 2 minutes
-        print("Fraud analysis thread stopped.")
+    def analyze_messages_for_fraud(self, worker):
+        """Checks new messages for fraud reports every few minutes until the worker is stopped."""
+        # Opened once and kept for the life of the thread, which owns them
+        local_conn = create_connection()
+        comm_conn = create_community_connection()
+        if not local_conn or not comm_conn:
+            print("Fraud analysis disabled: could not open the databases.")
+            return
 
-    def scrape_and_save_messages(self, page, db_connection):
-        print("Scraping active chat...")
+        print("Starting background fraud analysis...")
         try:
-            # 1. Wait for the main conversation panel, using the selector you provided.
-            conversation_panel_selector = '#main > div.x1n2onr6.x1vjfegm.x1cqoux5.x14yy4lh'
-            page.wait_for_selector(conversation_panel_selector, timeout=10000)
-
-            # 2. Find all message rows within that specific panel.
-            message_selector = f'{conversation_panel_selector} div[role="row"]'
-            page.wait_for_selector(message_selector, timeout=5000)
-            
-            messages = page.query_selector_all(message_selector)
-            
-            if not messages:
-                print("No messages found in the current view.")
-                return
-
-            # Get the active group name from the header
-            group_header_selector = 'header [role="button"] span[dir="auto"]'
-            group_name = page.locator(group_header_selector).inner_text()
-            print(f"Scraping messages from group: {group_name}")
-
-            picture_data = None
-            if img_element:
+            while worker.running:
                 try:
-                    # New Method: Take a direct screenshot of the image element
-                    picture_data = img_element.screenshot()
-                    print(f"DEBUG: Successfully captured image via screenshot. Size: {len(picture_data)} bytes.")
+                    added = report_new_fraud(local_conn, comm_conn, self.gemini_model, self.user_phone_number,
+                                             should_continue=lambda: worker.running)
+                    if added:
+                        # The UI is updated through fraud_numbers_changed
+                        self.fraud_lookup.refresh()
                 except Exception as e:
-                    print(f"ERROR: Could not capture image with screenshot method: {e}")
-
-                # --- Logic to save the message ---
-                if meta_element and (text_element or picture_data):
-                    message_text = text_element.inner_text().strip() if text_element else "[Image Post]"
-                    meta_text = meta_element.get_attribute('data-pre-plain-text').strip()
-                    timestamp = meta_text.split(']')[0][1:]
-                    sender = meta_text.split(']')[1].split(':')[0].strip()
-                    
-                    replied_to_element = msg_element.query_selector('[aria-label="Quoted message"]')
-                    is_reply = 1 if replied_to_element else 0
-                    replied_to_text = None
-                    replied_to_sender = None
-                    if is_reply:
-                        try:
-                            reply_spans = replied_to_element.query_selector_all('span')
-                            if len(reply_spans) > 1:
-                                replied_to_sender = reply_spans[0].inner_text()
-                                replied_to_text = reply_spans[1].inner_text()
-                        except Exception as e:
-                            print(f"Could not parse a reply element: {e}")
-
-                    cursor.execute("""
-                        INSERT OR IGNORE INTO messages (group_name, sender, message_text, timestamp, picture_blob, is_reply, replied_to_text, replied_to_sender)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (group_name, sender, message_text, timestamp, picture_data, is_reply, replied_to_text, replied_to_sender))
-            
-            db_connection.commit()
-            print(f"Finished scraping. {len(messages)} messages processed.")
+                    print(f"Error in fraud analysis thread: {e}")
 
-        except Exception as e:
-            print(f"Could not scrape messages: {e}")
+                for _ in range(FRAUD_CHECK_INTERVAL):
+                    if not worker.running:
+                        break
+                    time.sleep(1)
+        finally:
+            local_conn.close()
+            comm_conn.close()
+            print("Fraud analysis thread stopped.")
 
     def load_customer_replies(self):
         buyer_identifier = self.user_phone_number
         print(f"Refreshing replies for user: '{buyer_identifier}'...")
-        if not self.gemini_model:
-            QMessageBox.critical(self, "AI Error", "Gemini model not initialized.")
-            return
 
         try:
             self.customer_replies_table.setRowCount(0)
             cursor = self.conn.cursor()
 
-            # 1. Fetch all fraudulent numbers from the COMMUNITY database
-            fraudulent_numbers = set()
-            if self.community_conn:
-                try:
-                    comm_c = self.community_conn.cursor()
-                    comm_c.execute("SELECT phone_number FROM fraudulent_numbers")
-                    fraudulent_numbers = {row[0] for row in comm_c.fetchall()}
-                    print(f"DEBUG: Loaded {len(fraudulent_numbers)} fraudulent numbers from the community DB.")
-                except Exception as e:
-                    print(f"ERROR: Could not load community fraud list: {e}")
-            
-            # 2. Get the relevant messages from the LOCAL database
+            # 1. Get the relevant messages and their AI fields from the LOCAL database.
+            # The AI analysis itself is done in the background by the enrichment thread.
             cursor.execute("""
-                SELECT timestamp, sender, message_text 
-                FROM messages 
-                WHERE is_reply = 1 AND replied_to_sender LIKE ?
-                ORDER BY timestamp DESC
-            """, (f'%{buyer_identifier}%',))
+                SELECT m.timestamp, m.sender, c.e164, m.message_text, m.picture_hash,
+                       e.message_id, e.extraction_failed, e.product, e.make, e.type, e.year, e.price_ksh
+                FROM messages m
+                LEFT JOIN contacts c ON c.id = m.sender_contact_id
+                LEFT JOIN message_enrichment e ON e.message_id = m.id
+                WHERE m.is_reply = 1 AND m.replied_to_contact_id = ?
+                ORDER BY m.timestamp_epoch DESC, m.id DESC
+            """, (self.user_contact_id,))
             messages = cursor.fetchall()
 
             self.customer_replies_table.setRowCount(len(messages))
             for i, msg in enumerate(messages):
-                timestamp, sender, text = msg
-                
-                processed_data = analyze_message_with_gemini(self.gemini_model, text)
-                
+                timestamp, sender, sender_number, text, picture_hash, enriched_id, extraction_failed, product, make, ptype, year, price = msg
+
                 self.customer_replies_table.setItem(i, 0, QTableWidgetItem(timestamp))
                 
                 # Create the phone number item
                 phone_item = QTableWidgetItem(sender)
-                # 3. Check if the sender is fraudulent and highlight if so
-                if sender in fraudulent_numbers:
-                    phone_item.setBackground(QColor("red"))
-                    phone_item.setForeground(QColor("white"))
+                # Kept so a later fraud report can highlight the row without a reload
+                phone_item.setData(Qt.ItemDataRole.UserRole, lookup_key(sender_number or sender))
+                # 2. Check the sender against the community fraud list and highlight if reported
+                if self.fraud_lookup.is_fraudulent(sender_number or sender):
+                    self.highlight_fraudulent(phone_item)
                 self.customer_replies_table.setItem(i, 1, phone_item)
                 
                 risk_item = QTableWidgetItem("Unknown")
                 risk_item.setBackground(QColor("yellow"))
                 self.customer_replies_table.setItem(i, 2, risk_item)
 
-                if processed_data:
-                    self.customer_replies_table.setItem(i, 3, QTableWidgetItem(str(processed_data.get('product', 'N/A'))))
-                    self.customer_replies_table.setItem(i, 4, QTableWidgetItem(str(processed_data.get('make', 'N/A'))))
-                    self.customer_replies_table.setItem(i, 5, QTableWidgetItem(str(processed_data.get('type', 'N/A'))))
-                    self.customer_replies_table.setItem(i, 6, QTableWidgetItem(str(processed_data.get('year', 'N/A'))))
+                if enriched_id is None:
+                    self.customer_replies_table.setItem(i, 9, QTableWidgetItem(f"[AI PENDING] {text}"))
+                elif not extraction_failed:
+                    self.customer_replies_table.setItem(i, 3, QTableWidgetItem(product))
+                    self.customer_replies_table.setItem(i, 4, QTableWidgetItem(make))
+                    self.customer_replies_table.setItem(i, 5, QTableWidgetItem(ptype))
+                    self.customer_replies_table.setItem(i, 6, QTableWidgetItem(year))
                     
-                    picture_blob = self.get_picture_for_message(timestamp, sender, text)
-                    if picture_blob:
-                        pixmap = QPixmap()
-                        if pixmap.loadFromData(picture_blob):
-                            icon = QIcon(pixmap)
-                            self.customer_replies_table.setItem(i, 7, QTableWidgetItem(icon, ""))
-                        else:
-                            print("ERROR: QPixmap failed to load from blob data.")
-
-                    self.customer_replies_table.setItem(i, 8, QTableWidgetItem(str(processed_data.get('price_ksh', 0))))
+                    pixmap = self.get_picture_for_message(picture_hash)
+                    if pixmap:
+                        self.customer_replies_table.setItem(i, 7, QTableWidgetItem(QIcon(pixmap), ""))
+
+                    self.customer_replies_table.setItem(i, 8, QTableWidgetItem(str(price)))
                     self.customer_replies_table.setItem(i, 9, QTableWidgetItem(text)) # Show the actual reply text
                 else:
                     self.customer_replies_table.setItem(i, 9, QTableWidgetItem(f"[AI FAILED] {text}"))
@@ -829,57 +1091,58 @@ class SalesAgentDashboard(QMainWindow):
         except Exception as e:
             print(f"Error loading customer replies: {e}")
 
-    def get_picture_for_message(self, timestamp, sender, text):
-        """Helper function to retrieve a picture blob for a specific message."""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT picture_blob FROM messages 
-                WHERE timestamp=? AND sender=? AND message_text=?
-            """, (timestamp, sender, text))
-            result = cursor.fetchone()
-            return result[0] if result and result[0] else None
-        except Exception as e:
-            print(f"Error fetching picture from DB: {e}")
+    def get_picture_for_message(self, picture_hash):
+        """Returns the thumbnail of a message's picture as a QPixmap, decoded once per image."""
+        if not picture_hash:
             return None
+        if picture_hash not in self.thumbnail_cache:
+            try:
+                thumbnail = get_thumbnail(self.conn, picture_hash)
+            except Exception as e:
+                print(f"Error fetching picture from DB: {e}")
+                return None
+            pixmap = QPixmap()
+            if not thumbnail or not pixmap.loadFromData(thumbnail):
+                print("ERROR: QPixmap failed to load the thumbnail.")
+                pixmap = None
+            self.thumbnail_cache[picture_hash] = pixmap
+        return self.thumbnail_cache[picture_hash]
 
     def load_popular_products(self):
-        print("Refreshing Popular Products tab with AI Analysis...")
-        if not self.gemini_model:
-            QMessageBox.critical(self, "AI Error", "Gemini model not initialized. Check your API key.")
-            return
+        print("Refreshing Popular Products tab...")
             
         try:
             self.popular_products_table.setRowCount(0)
             cursor = self.conn.cursor()
-            cursor.execute("SELECT timestamp, sender, message_text FROM messages ORDER BY timestamp DESC LIMIT 50")
+            # The AI fields are filled in by the enrichment thread, so this is a plain query
+            cursor.execute("""
+                SELECT m.timestamp, m.sender, m.message_text, m.picture_hash,
+                       e.message_id, e.extraction_failed, e.product, e.make, e.type, e.year, e.other_details
+                FROM messages m
+                LEFT JOIN message_enrichment e ON e.message_id = m.id
+                ORDER BY m.timestamp_epoch DESC, m.id DESC
+                LIMIT 50
+            """)
             messages = cursor.fetchall()
 
             self.popular_products_table.setRowCount(len(messages))
             for i, msg in enumerate(messages):
-                timestamp, sender, text = msg
-                
-                processed_data = analyze_message_with_gemini(self.gemini_model, text)
+                timestamp, sender, text, picture_hash, enriched_id, extraction_failed, product, make, ptype, year, other_details = msg
 
-                if processed_data:
-                    self.popular_products_table.setItem(i, 0, QTableWidgetItem(str(processed_data.get('product', 'N/A'))))
-                    self.popular_products_table.setItem(i, 1, QTableWidgetItem(str(processed_data.get('make', 'N/A'))))
-                    self.popular_products_table.setItem(i, 2, QTableWidgetItem(str(processed_data.get('type', 'N/A'))))
-                    self.popular_products_table.setItem(i, 3, QTableWidgetItem(str(processed_data.get('year', 'N/A'))))
+                if enriched_id is not None and not extraction_failed:
+                    self.popular_products_table.setItem(i, 0, QTableWidgetItem(product))
+                    self.popular_products_table.setItem(i, 1, QTableWidgetItem(make))
+                    self.popular_products_table.setItem(i, 2, QTableWidgetItem(ptype))
+                    self.popular_products_table.setItem(i, 3, QTableWidgetItem(year))
                     
-                    picture_blob = self.get_picture_for_message(timestamp, sender, text)
-                    if picture_blob:
-                        pixmap = QPixmap()
-                        if pixmap.loadFromData(picture_blob):
-                            icon = QIcon(pixmap)
-                            self.popular_products_table.setItem(i, 4, QTableWidgetItem(icon, ""))
-                        else:
-                            print("ERROR: QPixmap failed to load from blob data.")
-
-                    self.popular_products_table.setItem(i, 5, QTableWidgetItem(str(processed_data.get('other_details', 'N/A'))))
+                    pixmap = self.get_picture_for_message(picture_hash)
+                    if pixmap:
+                        self.popular_products_table.setItem(i, 4, QTableWidgetItem(QIcon(pixmap), ""))
+
+                    self.popular_products_table.setItem(i, 5, QTableWidgetItem(other_details))
                 else:
-                    # Optional: You might want to fill the row with placeholder text if AI fails
-                    self.popular_products_table.setItem(i, 0, QTableWidgetItem("[AI FAILED]"))
+                    # Fill the row with placeholder text until the AI has processed the message
+                    self.popular_products_table.setItem(i, 0, QTableWidgetItem("[AI PENDING]" if enriched_id is None else "[AI FAILED]"))
                     self.popular_products_table.setItem(i, 1, QTableWidgetItem("N/A"))
                     self.popular_products_table.setItem(i, 2, QTableWidgetItem("N/A"))
                     self.popular_products_table.setItem(i, 3, QTableWidgetItem("N/A"))
@@ -887,63 +1150,128 @@ class SalesAgentDashboard(QMainWindow):
                     self.popular_products_table.setItem(i, 5, QTableWidgetItem(text))
 
 
-            print(f"Loaded and processed {len(messages)} messages into Popular Products tab.")
+            print(f"Loaded {len(messages)} messages into Popular Products tab.")
         except Exception as e:
             print(f"Error loading popular products: {e}")
 
+    def load_matches(self):
+        """Shows the matches found by previous matching runs."""
+        print("Loading stored matches...")
+        try:
+            self.match_table.setRowCount(0)
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT m.message_text, c.product, c.make, c.type, c.year, c.price_ksh, c.other_details
+                FROM catalog_matches c JOIN messages m ON m.id = c.message_id
+                ORDER BY c.message_id, c.id
+            """)
+            matches = [
+                dict(zip(["buyer_request", "product", "make", "type", "year", "price_ksh", "other_details"], row))
+                for row in cursor.fetchall()
+            ]
+            self.add_match_rows(matches)
+            print(f"Loaded {len(matches)} stored matches.")
+        except Exception as e:
+            print(f"Error loading stored matches: {e}")
+
+    def add_match_rows(self, matches):
+        """Appends matches to the Match table."""
+        for match in matches:
+            i = self.match_table.rowCount()
+            self.match_table.insertRow(i)
+            self.match_table.setItem(i, 0, QTableWidgetItem(match['buyer_request']))
+            self.match_table.setItem(i, 1, QTableWidgetItem(match.get('product')))
+            self.match_table.setItem(i, 2, QTableWidgetItem(match.get('make')))
+            self.match_table.setItem(i, 3, QTableWidgetItem(match.get('type')))
+            self.match_table.setItem(i, 4, QTableWidgetItem(str(match.get('year'))))
+            self.match_table.setItem(i, 5, QTableWidgetItem(str(match.get('price_ksh'))))
+            self.match_table.setItem(i, 6, QTableWidgetItem(match.get('other_details')))
+
     def find_and_display_matches(self):
+        # The same button cancels a run in progress
+        if self.matching_worker:
+            print("Cancelling matching...")
+            self.matching_worker.stop()
+            self.find_matches_button.setEnabled(False)
+            self.find_matches_button.setText("Cancelling...")
+            return
+
         print("Finding and displaying matches...")
         if not self.gemini_model:
             QMessageBox.critical(self, "AI Error", "Gemini model not initialized.")
             return
 
         try:
-            self.match_table.setRowCount(0)
             cursor = self.conn.cursor()
-
-            # 1. Get all catalog items
-            cursor.execute("SELECT id, product, make, type, year, price_ksh, other_details FROM seller_catalog")
-            catalog_items_raw = cursor.fetchall()
-            catalog_items = [dict(zip([c[0] for c in cursor.description], row)) for row in catalog_items_raw]
-
-            if not catalog_items:
+            cursor.execute("SELECT COUNT(*) FROM seller_catalog")
+            if cursor.fetchone()[0] == 0:
                 QMessageBox.information(self, "No Catalog", "The seller catalog is empty. Please add items to find matches.")
                 return
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Database Error", f"An error occurred: {e}")
+            return
 
-            # 2. Get all messages and classify them
-            cursor.execute("SELECT message_text FROM messages")
-            all_messages = cursor.fetchall()
-            
-            all_matches = []
-            for msg_tuple in all_messages:
-                message_text = msg_tuple[0]
-                if classify_message_type(self.gemini_model, message_text) == "BUYING_REQUEST":
-                    # 3. For each buying request, find matches
-                    matches = find_matches_in_catalog(self.gemini_model, message_text, catalog_items)
-                    if matches:
-                        for match in matches:
-                            # Add the original request to the match data for display
-                            match['buyer_request'] = message_text
-                            all_matches.append(match)
-            
-            # 4. Display the results
-            self.match_table.setRowCount(len(all_matches))
-            for i, match in enumerate(all_matches):
-                self.match_table.setItem(i, 0, QTableWidgetItem(match['buyer_request']))
-                self.match_table.setItem(i, 1, QTableWidgetItem(match.get('product')))
-                self.match_table.setItem(i, 2, QTableWidgetItem(match.get('make')))
-                self.match_table.setItem(i, 3, QTableWidgetItem(match.get('type')))
-                self.match_table.setItem(i, 4, QTableWidgetItem(str(match.get('year'))))
-                self.match_table.setItem(i, 5, QTableWidgetItem(str(match.get('price_ksh'))))
-                self.match_table.setItem(i, 6, QTableWidgetItem(match.get('other_details')))
-
-            print(f"Displayed {len(all_matches)} matches.")
-            QMessageBox.information(self, "Matching Complete", f"Found and displayed {len(all_matches)} matches.")
+        self.new_match_count = 0
+        self.find_matches_button.setText("Cancel Matching")
+        self.match_progress_bar.setValue(0)
+        self.match_progress_bar.setVisible(True)
 
-        except Exception as e:
-            print(f"Error during matching process: {e}")
-            QMessageBox.critical(self, "Error", f"An error occurred during the matching process: {e}")
+        self.matching_thread = QThread()
+        self.matching_worker = Worker(self.match_messages)
+        self.matching_worker.moveToThread(self.matching_thread)
+
+        self.matching_thread.started.connect(self.matching_worker.run)
+        self.matching_worker.finished.connect(self.on_matching_finished)
+        self.matching_worker.progress.connect(self.on_matching_progress)
+        self.matching_worker.result.connect(self.on_matches_found)
+        self.matching_worker.error.connect(self.on_matching_error)
+
+        self.matching_thread.start()
+
+    def match_messages(self, worker):
+        """Runs in the matching thread: matches the buying requests received since the last run."""
+        # This needs its own connection for thread safety
+        conn = create_connection()
+        if not conn:
+            worker.error.emit("Could not create a database connection in the matching thread.")
+            return
+        try:
+            match_new_buying_requests(
+                conn,
+                self.gemini_model,
+                on_match=worker.result.emit,
+                on_progress=worker.progress.emit,
+                should_continue=lambda: worker.running,
+            )
+        finally:
+            conn.close()
+
+    def on_matches_found(self, matches):
+        self.new_match_count += len(matches)
+        self.add_match_rows(matches)
+
+    def on_matching_progress(self, done, total):
+        self.match_progress_bar.setMaximum(total)
+        self.match_progress_bar.setValue(done)
+
+    def on_matching_error(self, error_message):
+        print(f"Error during matching process: {error_message}")
+        QMessageBox.critical(self, "Error", f"An error occurred during the matching process: {error_message}")
+
+    def on_matching_finished(self):
+        cancelled = not self.matching_worker.running
+        self.matching_thread.quit()
+        self.matching_thread.wait()
+        self.matching_thread = None
+        self.matching_worker = None
+
+        self.find_matches_button.setText("Find New Matches")
+        self.find_matches_button.setEnabled(True)
+        self.match_progress_bar.setVisible(False)
 
+        print(f"Displayed {self.new_match_count} new matches.")
+        if not cancelled:
+            QMessageBox.information(self, "Matching Complete", f"Found and displayed {self.new_match_count} new matches.")
 
     def closeEvent(self, event):
         if self.is_monitoring:
@@ -951,6 +1279,22 @@ class SalesAgentDashboard(QMainWindow):
             # Give the thread a moment to stop
             if self.monitoring_thread and self.monitoring_thread.isRunning():
                 self.monitoring_thread.wait(1000) # Wait up to 1 second
+        if self.enrichment_worker:
+            self.enrichment_worker.stop()
+            if self.enrichment_thread.isRunning():
+                self.enrichment_thread.wait(1000)
+        if self.fraud_worker:
+            self.fraud_worker.stop()
+            if self.fraud_thread.isRunning():
+                self.fraud_thread.wait(1000)
+        if self.matching_worker:
+            self.matching_worker.stop()
+            if self.matching_thread.isRunning():
+                self.matching_thread.wait(1000)
+        if self.community_sync_worker:
+            self.community_sync_worker.stop()
+            if self.community_sync_thread.isRunning():
+                self.community_sync_thread.wait(1000)
         if self.conn:
             self.conn.close()
         event.accept()
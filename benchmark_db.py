@@ -0,0 +1,178 @@
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from contacts import get_or_create_contact, resolve_contact_ids
+from database import MIGRATIONS, create_tables, migrate, tune_connection
+from timestamps import parse_whatsapp_timestamp
+
+# --- CONFIGURATION ---
+MESSAGE_COUNT = 1_000_000
+ITERATIONS = 5
+BUYER = "+254 700 000 001"
+SEED = 42
+# ---------------------
+
+GROUPS = [f"Car Deals {i}" for i in range(40)]
+SENDERS = [f"+2547{i:08d}" for i in range(5000)]
+PRODUCTS = [("Toyota", "Premio"), ("Nissan", "Note"), ("Mazda", "Demio"), ("Subaru", "Forester"), ("Honda", "Fit")]
+CLASSIFICATIONS = ["SELLING", "BUYING_REQUEST", "OTHER"]
+
+def seed_database(conn, count):
+    """Fills an empty database with `count` synthetic messages, their enrichment and pictures."""
+    rng = random.Random(SEED)
+    batch_size = 10_000
+    for start in range(0, count, batch_size):
+        messages, enrichments, media = [], [], []
+        for message_id in range(start + 1, min(start + batch_size, count) + 1):
+            make, product = rng.choice(PRODUCTS)
+            # Messages arrive in order, about a minute apart
+            day, minute_of_day = divmod(message_id, 24 * 60)
+            timestamp = f"{minute_of_day // 60:02d}:{minute_of_day % 60:02d}, {day % 28 + 1}/{day // 28 % 12 + 1}/{2024 + day // 336}"
+            is_reply = 1 if rng.random() < 0.05 else 0
+            replied_to_sender = (BUYER if rng.random() < 0.1 else rng.choice(SENDERS)) if is_reply else None
+            picture_hash = None
+            if rng.random() < 0.2:
+                # A third of the pictures are reposts of one of a few thousand photos
+                photo = rng.randrange(3000) if rng.random() < 0.33 else message_id + 10_000
+                picture_hash = f"{photo:064x}"
+                media.append((picture_hash, 40_000, 640, 480, b"thumbnail", None, None, 1))
+            messages.append((
+                message_id, rng.choice(GROUPS), rng.choice(SENDERS),
+                f"{make} {product} {rng.randrange(2005, 2020)} going for {rng.randrange(500, 3000)}k #{message_id}",
+                timestamp, parse_whatsapp_timestamp(timestamp, "DMY"), is_reply,
+                "Looking for a car" if is_reply else None, replied_to_sender, picture_hash,
+            ))
+            if rng.random() < 0.9:
+                enrichments.append((message_id, product, make, "Saloon", "2015", 1_200_000, "N/A", 0, rng.choice(CLASSIFICATIONS)))
+        contact_ids = resolve_contact_ids(conn, [name for message in messages for name in (message[2], message[8])])
+        conn.executemany("""
+            INSERT INTO messages (
+                id, group_name, sender, message_text, timestamp, timestamp_epoch, is_reply, replied_to_text, replied_to_sender,
+                picture_hash, sender_contact_id, replied_to_contact_id
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(*message, contact_ids.get(message[2]), contact_ids.get(message[8])) for message in messages])
+        conn.executemany("""
+            INSERT OR IGNORE INTO media (sha256, byte_size, width, height, thumbnail, perceptual_hash, duplicate_of, linked)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, media)
+        conn.executemany("""
+            INSERT INTO message_enrichment (message_id, product, make, type, year, price_ksh, other_details, extraction_failed, classification)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, enrichments)
+        conn.commit()
+
+def dashboard_queries(conn, count):
+    """The queries behind each dashboard tab and background stage, as (name, sql, parameters)."""
+    picture_hashes = [row[0] for row in conn.execute(
+        "SELECT picture_hash FROM messages WHERE picture_hash IS NOT NULL ORDER BY id DESC LIMIT 50"
+    )]
+    newest_ids = list(range(count - 100, count + 1))
+    return [
+        ("Customer Replies", """
+            SELECT m.timestamp, m.sender, c.e164, m.message_text, m.picture_hash,
+                   e.message_id, e.extraction_failed, e.product, e.make, e.type, e.year, e.price_ksh
+            FROM messages m
+            LEFT JOIN contacts c ON c.id = m.sender_contact_id
+            LEFT JOIN message_enrichment e ON e.message_id = m.id
+            WHERE m.is_reply = 1 AND m.replied_to_contact_id = ?
+            ORDER BY m.timestamp_epoch DESC, m.id DESC
+        """, (get_or_create_contact(conn, BUYER),)),
+        ("Popular Products", """
+            SELECT m.timestamp, m.sender, m.message_text, m.picture_hash,
+                   e.message_id, e.extraction_failed, e.product, e.make, e.type, e.year, e.other_details
+            FROM messages m
+            LEFT JOIN message_enrichment e ON e.message_id = m.id
+            ORDER BY m.timestamp_epoch DESC, m.id DESC
+            LIMIT 50
+        """, ()),
+        ("Thumbnails (50 pictures)", f"""
+            SELECT sha256, thumbnail FROM media WHERE sha256 IN ({",".join("?" * len(picture_hashes))})
+        """, picture_hashes),
+        ("Messages sharing a picture", f"""
+            SELECT m.id, COUNT(other.id)
+            FROM messages m JOIN messages other ON other.picture_hash = m.picture_hash AND other.id != m.id
+            WHERE m.id IN ({",".join("?" * len(newest_ids))})
+            GROUP BY m.id
+        """, newest_ids),
+        ("Buying requests to match", """
+            SELECT m.id, m.message_text
+            FROM messages m JOIN message_enrichment e ON e.message_id = m.id
+            WHERE e.classification = 'BUYING_REQUEST' AND m.id > ? AND m.id <= ?
+            ORDER BY m.id
+        """, (count - 1000, count)),
+    ]
+
+def time_queries(conn, queries):
+    """Returns {name: (median seconds, row count, query plan)}."""
+    results = {}
+    for name, sql, parameters in queries:
+        plan = " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters))
+        durations = []
+        for _ in range(ITERATIONS):
+            start = time.perf_counter()
+            rows = conn.execute(sql, parameters).fetchall()
+            durations.append(time.perf_counter() - start)
+        results[name] = (statistics.median(durations), len(rows), plan)
+    return results
+
+def drop_migration_indexes(conn):
+    """Removes every index the migrations created, to time the queries as on an untuned database."""
+    indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")]
+    for name in indexes:
+        conn.execute(f"DROP INDEX {name}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+
+def main():
+    """
+    Seeds a database with synthetic messages and times each dashboard query twice: on a default
+    connection without the migration indexes, and on a tuned connection after the migrations.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGE_COUNT
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "benchmark.db")
+        conn = sqlite3.connect(db_path)
+        create_tables(conn)
+        # Seeding is faster without the indexes; the tuned run below recreates them
+        drop_migration_indexes(conn)
+
+        print(f"--- Seeding {count:,} messages ---")
+        start = time.perf_counter()
+        seed_database(conn, count)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(db_path) / 1024 / 1024:.0f} MiB)")
+        conn.close()
+
+        print("\n--- Default connection, no indexes ---")
+        conn = sqlite3.connect(db_path)
+        queries = dashboard_queries(conn, count)
+        before = time_queries(conn, queries)
+        conn.close()
+
+        print(f"\n--- Tuned connection, {len(MIGRATIONS)} migration(s) ---")
+        conn = tune_connection(sqlite3.connect(db_path))
+        start = time.perf_counter()
+        migrate(conn)
+        print(f"Migrations took {time.perf_counter() - start:.1f}s")
+        after = time_queries(conn, queries)
+        conn.close()
+
+    print(f"\n{'Query':<28}{'Before (ms)':>14}{'After (ms)':>14}{'Speedup':>10}{'Rows':>8}")
+    for name, (seconds, rows, _) in before.items():
+        tuned_seconds = after[name][0]
+        print(f"{name:<28}{seconds * 1000:>14.2f}{tuned_seconds * 1000:>14.2f}"
+              f"{seconds / tuned_seconds:>9.1f}x{rows:>8}")
+    print("\nQuery plans after tuning:")
+    for name, (_, _, plan) in after.items():
+        print(f"  {name}: {plan}")
+
+    print("\n--- Benchmark Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import json
+import os
+import sys
+
+from gemini_processor import DEFAULT_BATCH_SIZE, _format_message_batch, initialize_gemini
+from prompts import get_prompt
+from token_usage import estimate_cost, estimate_tokens
+
+# --- CONFIGURATION ---
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "fraud_messages.json")
+CATALOG = [
+    {"id": 1, "product": "Bumper", "make": "Toyota", "type": "Harrier", "year": "2015", "price_ksh": 15000, "other_details": "Front, silver"},
+    {"id": 2, "product": "Headlight", "make": "Toyota", "type": "Premio", "year": "2010", "price_ksh": 8000, "other_details": "Left side"},
+    {"id": 3, "product": "Side Mirror", "make": "Honda", "type": "Fit", "year": "2012", "price_ksh": 4500, "other_details": "N/A"},
+    {"id": 4, "product": "Nosecut", "make": "Toyota", "type": "Belta", "year": "N/A", "price_ksh": 60000, "other_details": "Complete"},
+    {"id": 5, "product": "Radiator", "make": "Nissan", "type": "Note", "year": "2014", "price_ksh": 6500, "other_details": "New"},
+]
+BUYING_REQUEST = "Natafuta bumper ya harrier 2015, silver. Bei?"
+# ---------------------
+
+# The prompts as they were before the prompt registry, copied verbatim
+
+def legacy_message_batch(message_texts):
+    return json.dumps(
+        [{"index": i, "text": text} for i, text in enumerate(message_texts)],
+        ensure_ascii=False,
+        indent=1,
+    )
+
+def legacy_extraction_prompt(messages_json):
+    return f"""
+    You are an expert data extractor for an auto parts sales agent.
+    Your task is to analyze a list of WhatsApp messages and extract structured information from each one.
+
+    Analyze the following messages, given as a JSON array of {{"index", "text"}} objects:
+    ---
+    {messages_json}
+    ---
+
+    For every message, extract the following fields:
+    - "product": The specific part being requested or sold (e.g., "Bumper", "Headlight", "Nosecut").
+    - "make": The car brand (e.g., "Toyota", "Nissan", "Mazda"). If not mentioned, use "N/A".
+    - "type": The specific model of the car (e.g., "Harrier", "Belta", "Fielder"). If not mentioned, use "N/A".
+    - "year": The manufacturing year of the car or part. If not mentioned, use "N/A".
+    - "price_ksh": The price in Kenya Shillings. Extract only the number, no commas or currency symbols. If not mentioned, use 0.
+    - "other_details": Any other relevant information like color, side (left/right), condition (new/used), or contact info. If none, use "N/A".
+
+    Example 1:
+    Message: "Hi can i get nosecut for toyato belta?"
+    JSON Output: {{"product": "Nosecut", "make": "Toyota", "type": "Belta", "year": "N/A", "price_ksh": 0, "other_details": "N/A"}}
+
+    Example 2:
+    Message: "Both sides Back lights Bei poa"
+    JSON Output: {{"product": "Back lights", "make": "N/A", "type": "N/A", "year": "N/A", "price_ksh": 0, "other_details": "Both sides, Bei poa"}}
+
+    Example 3:
+    Message: "I need a front bumper for a 2015 Toyota Harrier, silver. Price?"
+    JSON Output: {{"product": "Bumper", "make": "Toyota", "type": "Harrier", "year": "2015", "price_ksh": 0, "other_details": "Front, silver"}}
+
+    Return a single valid JSON array with exactly one object per message. Each object must contain
+    the "index" of the message it belongs to, followed by the fields above, for example:
+    [{{"index": 0, "product": "Nosecut", "make": "Toyota", "type": "Belta", "year": "N/A", "price_ksh": 0, "other_details": "N/A"}}]
+
+    Do not include any other text, explanations, or markdown formatting in your response. Only the JSON array.
+    """
+
+def legacy_classification_prompt(messages_json):
+    return f"""
+    You are a message classifier for an auto parts sales group. Your task is to determine, for each message, if it is a request to buy a part.
+    - If the message is a request to buy, asking for a part, or inquiring about availability, classify it as "BUYING_REQUEST".
+    - For all other messages (e.g., greetings, sales offers, replies with prices), classify it as "OTHER".
+
+    Analyze the following messages, given as a JSON array of {{"index", "text"}} objects:
+    ---
+    {messages_json}
+    ---
+
+    Examples:
+    Message: "Hi can i get nosecut for toyato belta?" -> BUYING_REQUEST
+    Message: "I have a bumper for sale, 15000ksh" -> OTHER
+    Message: "Good morning everyone" -> OTHER
+    Message: "Still available" -> OTHER
+    Message: "Looking for side mirror for Honda Fit" -> BUYING_REQUEST
+
+    Return a single valid JSON array with exactly one object per message, for example:
+    [{{"index": 0, "classification": "BUYING_REQUEST"}}, {{"index": 1, "classification": "OTHER"}}]
+
+    Do not include any other text, explanations, or markdown formatting in your response. Only the JSON array.
+    """
+
+def legacy_fraud_prompt(messages_json):
+    return f"""
+    You are a security analyst for a sales group. Your task is to determine, for each message, if it is reporting a fraudulent number.
+    A fraud report typically contains a phone number and a reason, like "is a conman", "scammer", "don't trust", "stole from me".
+
+    Analyze the following messages, given as a JSON array of {{"index", "text"}} objects:
+    ---
+    {messages_json}
+    ---
+
+    If a message is a fraud report, extract the phone number being reported and the reason.
+    The phone number should be in the format +254XXXXXXXXX.
+    If a message is NOT a fraud report, use null values for "phone_number" and "reason".
+
+    Examples:
+    Message: "Beware of +254712345678, he is a conman." -> {{"phone_number": "+254712345678", "reason": "He is a conman."}}
+    Message: "That guy 0712345678 is a scammer" -> {{"phone_number": "+254712345678", "reason": "Is a scammer"}}
+    Message: "I have a bumper for sale" -> {{"phone_number": null, "reason": null}}
+    Message: "Thank you for the part" -> {{"phone_number": null, "reason": null}}
+
+    Return a single valid JSON array with exactly one object per message, for example:
+    [{{"index": 0, "phone_number": "+254712345678", "reason": "He is a conman."}}, {{"index": 1, "phone_number": null, "reason": null}}]
+
+    Do not include any other text, explanations, or markdown formatting in your response. Only the JSON array.
+    """
+
+def legacy_matching_prompt(shortlist, buying_request_text):
+    # Format the shortlisted catalog items for the prompt
+    catalog_string = "\n".join([f"- {json.dumps(item)}" for item in shortlist])
+
+    return f'''
+    You are an intelligent auto parts matching agent. Your goal is to find relevant items from a seller's catalog that match a customer's buying request.
+
+    This is the seller's catalog:
+    ---
+    {catalog_string}
+    ---
+
+    This is the customer's buying request:
+    ---
+    {buying_request_text}
+    ---
+
+    Your task:
+    1. Analyze the customer's request.
+    2. Compare the request against every item in the catalog. A good match should consider the product, make, type, and year. The "other_details" field should also be considered for relevance.
+    3. Return a single valid JSON array containing ONLY the full JSON objects of the items from the catalog that are a good match.
+    4. If there are no matches, return an empty JSON array `[]`.
+
+    Do not include any other text, explanations, or markdown formatting in your response. Only the JSON array.
+
+    Example:
+    If the catalog contains `{{"id": 1, "product": "Bumper", "make": "Toyota", "type": "Harrier", "price_ksh": 15000}}` and the request is "I need a harrier bumper", your response must be:
+    `[{{"id": 1, "product": "Bumper", "make": "Toyota", "type": "Harrier", "price_ksh": 15000}}]`
+    '''
+
+
+def count_tokens(model, prompt):
+    """Counts with the Gemini API if a model is given, otherwise estimates locally."""
+    if model:
+        return model.count_tokens(prompt).total_tokens
+    return estimate_tokens(prompt)
+
+def main():
+    """
+    Measures the input tokens of the old and the current prompts on a fixed corpus of
+    sample messages. Pass --gemini to count with the Gemini API instead of estimating.
+    """
+    model = initialize_gemini() if "--gemini" in sys.argv else None
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        messages = [message["text"] for message in json.load(f)]
+    batches = [messages[i:i + DEFAULT_BATCH_SIZE] for i in range(0, len(messages), DEFAULT_BATCH_SIZE)]
+    print(f"Corpus: {len(messages)} messages in {len(batches)} batch(es) of up to {DEFAULT_BATCH_SIZE}; "
+          f"tokens {'counted by Gemini' if model else 'estimated locally'}")
+
+    # Before: an extraction, a classification and a fraud prompt per batch. Now: one triage prompt
+    cases = [
+        ("message triage",
+         [legacy(legacy_message_batch(batch)) for batch in batches
+          for legacy in (legacy_extraction_prompt, legacy_classification_prompt, legacy_fraud_prompt)],
+         [get_prompt("triage").render(messages=_format_message_batch(batch)) for batch in batches]),
+    ]
+    catalog_string = "\n".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")) for item in CATALOG)
+    cases.append(("matching", [legacy_matching_prompt(CATALOG, BUYING_REQUEST)],
+                  [get_prompt("matching").render(catalog=catalog_string, request=BUYING_REQUEST)]))
+
+    print(f"\n{'Prompt':<16}{'Calls before':>14}{'Calls after':>13}{'Tokens before':>15}{'Tokens after':>14}{'Cut':>8}")
+    total_before = total_after = 0
+    for name, legacy_prompts, prompts in cases:
+        before = sum(count_tokens(model, prompt) for prompt in legacy_prompts)
+        after = sum(count_tokens(model, prompt) for prompt in prompts)
+        total_before += before
+        total_after += after
+        print(f"{name:<16}{len(legacy_prompts):>14}{len(prompts):>13}{before:>15}{after:>14}{1 - after / before:>8.0%}")
+    print(f"{'Total':<16}{'':>14}{'':>13}{total_before:>15}{total_after:>14}{1 - total_after / total_before:>8.0%}")
+
+    # Every message triaged (before: all three prompts, without the fraud pre-screen), plus one matching call
+    per_thousand = 1000 / len(messages)
+    print(f"\nInput cost per 1,000 messages: ${estimate_cost(total_before * per_thousand, 0):.4f} before, "
+          f"${estimate_cost(total_after * per_thousand, 0):.4f} after")
+
+    print("\n--- Benchmark Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+
+from playwright.sync_api import sync_playwright
+
+from database import create_tables
+from whatsapp_scraper import (
+    CONVERSATION_PANEL_SELECTOR,
+    GROUP_HEADER_SELECTOR,
+    MESSAGE_IMAGE_SELECTOR,
+    MESSAGE_ROW_SELECTOR,
+    build_message_records,
+    extract_visible_messages,
+    parse_meta_text,
+    save_messages,
+    scrape_and_save_messages,
+)
+
+# --- CONFIGURATION ---
+FIXTURE_PATH = Path(__file__).resolve().parent / "fixtures" / "whatsapp_chat.html"
+ITERATIONS = 10
+# ---------------------
+
+def legacy_scrape(page, db_connection):
+    """The previous scraper: several IPC round trips per message handle, one INSERT per row."""
+    messages = page.query_selector_all(MESSAGE_ROW_SELECTOR)
+    group_name = page.locator(GROUP_HEADER_SELECTOR).inner_text()
+    cursor = db_connection.cursor()
+    for msg_element in messages:
+        text_element = msg_element.query_selector('span.selectable-text')
+        meta_element = msg_element.query_selector('div[data-pre-plain-text]')
+        img_element = msg_element.query_selector(MESSAGE_IMAGE_SELECTOR)
+
+        picture_data = img_element.screenshot() if img_element else None
+        if meta_element and (text_element or picture_data):
+            message_text = text_element.inner_text().strip() if text_element else "[Image Post]"
+            timestamp, sender = parse_meta_text(meta_element.get_attribute('data-pre-plain-text').strip())
+
+            replied_to_element = msg_element.query_selector('[aria-label="Quoted message"]')
+            is_reply = 1 if replied_to_element else 0
+            replied_to_text = None
+            replied_to_sender = None
+            if is_reply:
+                reply_spans = replied_to_element.query_selector_all('span')
+                if len(reply_spans) > 1:
+                    replied_to_sender = reply_spans[0].inner_text()
+                    replied_to_text = reply_spans[1].inner_text()
+
+            cursor.execute("""
+                INSERT OR IGNORE INTO messages (group_name, sender, message_text, timestamp, picture_blob, is_reply, replied_to_text, replied_to_sender)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (group_name, sender, message_text, timestamp, picture_data, is_reply, replied_to_text, replied_to_sender))
+    db_connection.commit()
+    return len(messages)
+
+def single_pass_scrape(page, db_connection):
+    """The current scraper: one page.evaluate for the whole chat, one executemany transaction."""
+    group_name, rows, _ = extract_visible_messages(page)
+    records, media_items = build_message_records(page, group_name, rows)
+    save_messages(db_connection, records, media_items=media_items)
+    return len(rows)
+
+def incremental_rescrape(page, db_connection):
+    """A repeat cycle of the current scraper: the watermark from the first pass means no row is walked again."""
+    scrape_and_save_messages(page, db_connection)
+    new_rows, skipped = scrape_and_save_messages(page, db_connection)
+    return f"{new_rows} new / {skipped} skipped"
+
+def time_scraper(page, scraper):
+    timings = []
+    for _ in range(ITERATIONS):
+        # A fresh database each time, so both scrapers insert every row
+        conn = sqlite3.connect(":memory:")
+        create_tables(conn)
+        started = time.perf_counter()
+        rows = scraper(page, conn)
+        timings.append(time.perf_counter() - started)
+        conn.close()
+    return rows, timings
+
+def main():
+    """
+    Compares the per-scrape latency of the old per-handle scraper with the
+    single-pass scraper, on a saved WhatsApp-like chat served from a local file.
+    """
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.goto(FIXTURE_PATH.as_uri())
+        page.wait_for_selector(CONVERSATION_PANEL_SELECTOR)
+        # Wait until the fixture has turned its photos into blob: URLs
+        page.wait_for_function("() => !document.querySelector('img[data-fixture-src]:not([src])')")
+
+        print(f"--- Scraping {FIXTURE_PATH.name}, {ITERATIONS} iterations each ---")
+        results = {}
+        for name, scraper in [("Per-handle (before)", legacy_scrape), ("Single pass (after)", single_pass_scrape)]:
+            rows, timings = time_scraper(page, scraper)
+            results[name] = statistics.median(timings)
+            print(f"{name}: {rows} rows, median {statistics.median(timings) * 1000:.1f} ms, "
+                  f"min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms")
+
+        before, after = results["Per-handle (before)"], results["Single pass (after)"]
+        print(f"\nSpeed-up: {before / after:.1f}x")
+
+        # Times a first scrape plus an unchanged re-scrape; the second one should be nearly free
+        rows, timings = time_scraper(page, incremental_rescrape)
+        print(f"First scrape + re-scrape with watermark: {rows}, median {statistics.median(timings) * 1000:.1f} ms "
+              f"(single pass alone: {after * 1000:.1f} ms)")
+        browser.close()
+
+    print("\n--- Benchmark Complete ---")
+
+if __name__ == "__main__":
+    main()
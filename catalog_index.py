@@ -0,0 +1,168 @@
+import re
+from collections import defaultdict
+
+# How many catalog items are shortlisted for a buying request by default.
+DEFAULT_TOP_K = 10
+
+# How much a matching token counts, per catalog field.
+FIELD_WEIGHTS = {
+    "product": 3.0,
+    "type": 2.0,
+    "make": 1.5,
+    "year": 1.0,
+    "other_details": 0.5,
+}
+# The fields that must all match for a confident local match.
+KEY_FIELDS = ["product", "make", "type", "year"]
+
+# Multi-word part names are joined into one token before tokenizing (English and Swahili).
+PHRASES = [
+    (r'\bnose\s*-?\s*cut\b', 'nosecut'),
+    (r'\bhead\s*-?\s*(?:light|lamp)s?\b', 'headlight'),
+    (r'\b(?:back|tail|rear)\s*-?\s*(?:light|lamp)s?\b', 'taillight'),
+    (r'\bfog\s*-?\s*(?:light|lamp)s?\b', 'foglight'),
+    (r'\b(?:side|wing)\s*-?\s*mirrors?\b', 'sidemirror'),
+    (r'\btaa\s+za\s+mbele\b', 'headlight'),
+    (r'\btaa\s+za\s+nyuma\b', 'taillight'),
+]
+
+# Single-word synonyms and common misspellings seen in the groups.
+SYNONYMS = {
+    'headlamp': 'headlight',
+    'backlight': 'taillight',
+    'taillamp': 'taillight',
+    'nosecutt': 'nosecut',
+    'bamper': 'bumper',
+    'bumber': 'bumper',
+    'toyato': 'toyota',
+    'toyata': 'toyota',
+    'toyo': 'toyota',
+    'nisan': 'nissan',
+    'nissa': 'nissan',
+    'mitsu': 'mitsubishi',
+    'merc': 'mercedes',
+    'benz': 'mercedes',
+    'vw': 'volkswagen',
+}
+
+# Car makes are always part of the vocabulary, so misspelt makes are corrected even before the catalog mentions them.
+KNOWN_MAKES = [
+    'toyota', 'nissan', 'mazda', 'honda', 'subaru', 'mitsubishi', 'isuzu', 'suzuki',
+    'mercedes', 'bmw', 'volkswagen', 'audi', 'ford', 'hyundai', 'kia', 'lexus', 'landrover',
+]
+
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'for', 'of', 'to', 'in', 'on', 'with', 'is', 'it', 'my', 'me',
+    'i', 'you', 'who', 'has', 'have', 'any', 'anyone', 'can', 'get', 'need', 'needed', 'looking',
+    'want', 'hi', 'hello', 'pls', 'please', 'price', 'available', 'na', 'ya', 'za', 'kwa',
+    'nataka', 'natafuta', 'niko', 'iko', 'bei', 'poa',
+}
+
+def _singular(token):
+    if len(token) > 4 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def normalize_tokens(text):
+    """
+    Turns free text into a list of normalized tokens: lowercased, multi-word part names joined,
+    plurals and known synonyms/misspellings mapped to one spelling, stopwords removed.
+    """
+    text = (text or '').lower()
+    for pattern, replacement in PHRASES:
+        text = re.sub(pattern, f' {replacement} ', text)
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', text):
+        token = SYNONYMS.get(token, token)
+        token = _singular(token)
+        token = SYNONYMS.get(token, token)
+        if len(token) > 1 and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+def _edit_distance(a, b, limit):
+    """Optimal string alignment distance between a and b, or limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+class CatalogIndex:
+    """
+    An in-memory inverted index over the seller catalog.
+
+    It shortlists the catalog items that are plausible matches for a buying request,
+    so only those have to be sent to Gemini, and scores how confident the match is.
+    """
+    def __init__(self, catalog_items):
+        self.items = list(catalog_items)
+        # token -> {item position: weight}
+        self.postings = defaultdict(dict)
+        # item position -> {field: set of tokens}
+        self.item_fields = []
+        for position, item in enumerate(self.items):
+            fields = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                tokens = set(normalize_tokens(str(item.get(field) or '')))
+                fields[field] = tokens
+                for token in tokens:
+                    self.postings[token][position] = max(self.postings[token].get(position, 0), weight)
+            self.item_fields.append(fields)
+        self.vocabulary = set(self.postings) | set(KNOWN_MAKES)
+        self._corrections = {}
+
+    def _correct(self, token):
+        """Maps an unknown alphabetic token to the closest vocabulary token, allowing small typos."""
+        if token in self.vocabulary or not token.isalpha() or len(token) < 4:
+            return token
+        if token not in self._corrections:
+            limit = 1 if len(token) < 6 else 2
+            best, best_distance, tied = token, limit + 1, False
+            for candidate in self.vocabulary:
+                distance = _edit_distance(token, candidate, limit)
+                if distance < best_distance:
+                    best, best_distance, tied = candidate, distance, False
+                elif distance == best_distance and distance <= limit:
+                    tied = True
+            # Ambiguous corrections are worse than none
+            self._corrections[token] = best if best_distance <= limit and not tied else token
+        return self._corrections[token]
+
+    def search(self, text, top_k=DEFAULT_TOP_K):
+        """
+        Finds the catalog items that best match a buying request.
+
+        Returns:
+            Up to `top_k` (item, score, confidence) tuples, best first. `confidence` is
+            1.0 when every filled-in key field of the item (product, make, type, year)
+            is mentioned in the request. Items whose product is not mentioned are not returned.
+        """
+        query_tokens = {self._correct(token) for token in normalize_tokens(text)}
+        scores = defaultdict(float)
+        for token in query_tokens:
+            for position, weight in self.postings.get(token, {}).items():
+                scores[position] += weight
+
+        results = []
+        for position, score in scores.items():
+            fields = self.item_fields[position]
+            if not fields["product"] or not fields["product"] & query_tokens:
+                continue
+            key_fields = [field for field in KEY_FIELDS if fields[field]]
+            matched = [field for field in key_fields if fields[field] & query_tokens]
+            confidence = sum(FIELD_WEIGHTS[f] for f in matched) / sum(FIELD_WEIGHTS[f] for f in key_fields)
+            results.append((self.items[position], score, confidence))
+
+        results.sort(key=lambda result: (result[1], result[2]), reverse=True)
+        return results[:top_k]
@@ -0,0 +1,213 @@
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from database import get_pipeline_state, set_pipeline_state
+from fraud_lookup import lookup_key
+
+# The folder every agent's Google Drive client keeps in sync. COMMUNITY_SHARED_DIR overrides it.
+DEFAULT_SHARED_DIR = r'G:\My Drive\Shared Sales Agent'
+# Every agent appends its fraud reports to its own file in CHANGELOG_DIR, so no two agents
+# ever write the same file.
+CHANGELOG_DIR = "changelogs"
+# The database all agents used to write directly. It is only read, once, to seed the replica.
+LEGACY_DB_NAME = "community_fraud.db"
+# How often the dashboard pushes and pulls changes, in seconds.
+COMMUNITY_SYNC_INTERVAL = 5 * 60
+# pipeline_state key in the replica marking that the legacy database was imported
+LEGACY_IMPORT_STATE_KEY = "legacy_community_db_imported"
+
+def get_shared_dir():
+    return os.getenv("COMMUNITY_SHARED_DIR", DEFAULT_SHARED_DIR)
+
+def changelog_name(agent_id):
+    """The changelog file name of an agent, safe for any file system."""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', str(agent_id)) + ".jsonl"
+
+def apply_change(conn, change):
+    """
+    Merges one fraud report into the replica. The set of numbers is the union of all reports;
+    for a number reported more than once, the latest report (by time, then agent id) wins.
+    Every change gets the next change_seq, so fraud_lookup can read just what changed.
+    Does not commit. Returns True if the replica changed.
+    """
+    cursor = conn.execute("""
+        INSERT INTO fraudulent_numbers (phone_number, reason, reported_by, timestamp, updated_at, origin_agent, change_seq)
+        VALUES (?, ?, ?, datetime(?, 'unixepoch'), ?, ?, (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM fraudulent_numbers))
+        ON CONFLICT(phone_number) DO UPDATE SET
+            reason = excluded.reason,
+            reported_by = excluded.reported_by,
+            timestamp = excluded.timestamp,
+            updated_at = excluded.updated_at,
+            origin_agent = excluded.origin_agent,
+            change_seq = excluded.change_seq
+        WHERE (excluded.updated_at, excluded.origin_agent) > (COALESCE(updated_at, 0), COALESCE(origin_agent, ''))
+    """, (change["phone_number"], change.get("reason"), change.get("reported_by"),
+          change["reported_at"], change["reported_at"], change["agent"]))
+    return cursor.rowcount > 0
+
+def find_reported_number(conn, phone_number):
+    """
+    Returns the number as it is stored in the replica if it was already reported, or None.
+
+    Older entries, e.g. from the legacy database, may be stored as 07XXXXXXXX or 254XXXXXXXXX
+    rather than in E.164, so every usual format of a Kenyan number is looked up.
+    """
+    key = lookup_key(phone_number)
+    forms = {phone_number, key}
+    if key.startswith("+254"):
+        forms |= {key[1:], "0" + key[4:]}
+    placeholders = ", ".join("?" * len(forms))
+    row = conn.execute(
+        f"SELECT phone_number FROM fraudulent_numbers WHERE phone_number IN ({placeholders}) "
+        "ORDER BY phone_number = ? DESC LIMIT 1",
+        (*forms, key),
+    ).fetchone()
+    return row[0] if row else None
+
+def report_fraud(conn, agent_id, phone_number, reason, reported_by, only_if_new=False, reported_at=None):
+    """
+    Records a fraud report in the local replica and queues it for the shared changelog.
+    Never touches the shared drive, so it returns immediately.
+
+    Args:
+        only_if_new: Leave numbers that are already reported alone, e.g. so an automatic
+            report does not replace the reason a person gave.
+
+    Returns:
+        False if the number was already in the replica, True otherwise.
+    """
+    return bool(report_frauds(conn, agent_id, [(phone_number, reason, reported_by)], only_if_new, reported_at))
+
+def report_frauds(conn, agent_id, reports, only_if_new=False, reported_at=None):
+    """
+    Like report_fraud, for a list of (phone_number, reason, reported_by) reports, in one transaction.
+
+    Numbers are compared and saved in E.164 form, like fraud_lookup compares them.
+
+    Returns:
+        The phone numbers, in E.164 form, that were not in the replica yet.
+    """
+    added = []
+    with conn:
+        for phone_number, reason, reported_by in reports:
+            phone_number = lookup_key(phone_number)
+            known = find_reported_number(conn, phone_number)
+            if known and only_if_new:
+                continue
+            change = {
+                # A new report of a number stored in another format updates that row instead of adding a second one
+                "phone_number": known or phone_number,
+                "reason": reason,
+                "reported_by": reported_by,
+                "reported_at": time.time() if reported_at is None else reported_at,
+                "agent": str(agent_id),
+            }
+            apply_change(conn, change)
+            conn.execute("INSERT INTO pending_changes (change) VALUES (?)", (json.dumps(change),))
+            if not known:
+                added.append(phone_number)
+    return added
+
+class CommunitySync:
+    """
+    Keeps the local replica of the community fraud list in step with the other agents.
+
+    Instead of sharing one SQLite file over Google Drive, every agent appends its reports
+    to its own JSON-lines changelog in the shared folder, and reads everyone's changelogs
+    from where it stopped last time. Reports are merged with apply_change, which gives the
+    same result in any order, so changes may arrive late, twice, or out of order.
+    """
+    def __init__(self, replica_conn, agent_id, shared_dir=None):
+        self.conn = replica_conn
+        self.agent_id = str(agent_id)
+        self.shared_dir = shared_dir or get_shared_dir()
+        self.changelog_dir = os.path.join(self.shared_dir, CHANGELOG_DIR)
+
+    def sync(self):
+        """
+        Pushes the queued local reports and merges everyone's new reports.
+
+        Returns:
+            A tuple (pushed, merged): the number of reports written to the shared changelog,
+            and the number of replica rows the other agents' reports changed.
+        """
+        if not os.path.isdir(self.shared_dir):
+            print(f"Community sync skipped: shared folder {self.shared_dir} is not available.")
+            return 0, 0
+        os.makedirs(self.changelog_dir, exist_ok=True)
+        merged = self._import_legacy_database()
+        pushed = self._push()
+        for path in sorted(glob.glob(os.path.join(self.changelog_dir, "*.jsonl"))):
+            merged += self._pull(path)
+        return pushed, merged
+
+    def _push(self):
+        rows = self.conn.execute("SELECT id, change FROM pending_changes ORDER BY id").fetchall()
+        if not rows:
+            return 0
+        with open(os.path.join(self.changelog_dir, changelog_name(self.agent_id)), "a", encoding="utf-8") as changelog:
+            changelog.write("".join(change + "\n" for _, change in rows))
+            changelog.flush()
+            os.fsync(changelog.fileno())
+        # A crash before this delete only appends the same reports again, which merge to the same result
+        with self.conn:
+            self.conn.execute("DELETE FROM pending_changes WHERE id <= ?", (rows[-1][0],))
+        return len(rows)
+
+    def _pull(self, path):
+        """Merges the complete lines a changelog gained since the last pull. Returns the number of rows changed."""
+        name = os.path.basename(path)
+        row = self.conn.execute("SELECT byte_offset FROM sync_offsets WHERE changelog = ?", (name,)).fetchone()
+        offset = row[0] if row else 0
+        with open(path, "rb") as changelog:
+            changelog.seek(offset)
+            data = changelog.read()
+        # A line Drive has only partly synced yet is read on a later pull
+        complete = data[:data.rfind(b"\n") + 1]
+        if not complete:
+            return 0
+
+        changed = 0
+        with self.conn:
+            for line in complete.decode("utf-8").splitlines():
+                try:
+                    change = json.loads(line)
+                    changed += apply_change(self.conn, change)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Skipping an unreadable line in changelog {name}: {e}")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_offsets (changelog, byte_offset) VALUES (?, ?)", (name, offset + len(complete))
+            )
+        return changed
+
+    def _import_legacy_database(self):
+        """Seeds the replica from the shared SQLite file agents used to write to, once."""
+        legacy_path = os.path.join(self.shared_dir, LEGACY_DB_NAME)
+        if get_pipeline_state(self.conn, LEGACY_IMPORT_STATE_KEY) or not os.path.exists(legacy_path):
+            return 0
+        # Read-only, so this agent never takes a lock on the shared file
+        legacy = sqlite3.connect(f"{Path(legacy_path).absolute().as_uri()}?mode=ro", uri=True)
+        try:
+            rows = legacy.execute(
+                "SELECT phone_number, reason, reported_by, CAST(strftime('%s', timestamp) AS REAL) FROM fraudulent_numbers"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Could not read the legacy community database: {e}")
+            return 0
+        finally:
+            legacy.close()
+
+        changed = 0
+        with self.conn:
+            for phone_number, reason, reported_by, reported_at in rows:
+                change = {"phone_number": phone_number, "reason": reason, "reported_by": reported_by,
+                          "reported_at": reported_at or 0, "agent": ""}
+                changed += apply_change(self.conn, change)
+            set_pipeline_state(self.conn, LEGACY_IMPORT_STATE_KEY, time.time())
+        print(f"Imported {len(rows)} fraud report(s) from the legacy community database.")
+        return changed
@@ -0,0 +1,82 @@
+import re
+
+from phone_numbers import normalize_kenyan_number
+
+# Something WhatsApp shows instead of a name: only digits, a leading + and separators.
+PHONE_LIKE_PATTERN = re.compile(r'^\+?[\d\s\-.()]{7,}$')
+# WhatsApp's name for the logged-in user in quoted messages.
+SELF_ALIAS = "You"
+
+def to_e164(raw_number):
+    """
+    Converts a phone number to E.164 (+<country code><number>).
+
+    Kenyan numbers are recognized in any local or international format; other numbers
+    only when written with their + country code.
+
+    Returns:
+        The E.164 number, or None if `raw_number` is not a phone number.
+    """
+    if not raw_number or not PHONE_LIKE_PATTERN.match(raw_number.strip()):
+        return None
+    kenyan = normalize_kenyan_number(raw_number)
+    if kenyan:
+        return kenyan
+    digits = re.sub(r'\D', '', raw_number)
+    if raw_number.strip().startswith('+') and 8 <= len(digits) <= 15:
+        return f'+{digits}'
+    return None
+
+def alias_key(raw_name):
+    """
+    The lookup key of a sender as WhatsApp shows it: the E.164 number for phone numbers, so
+    every formatting of a number finds the same contact, and the case-folded name otherwise.
+    """
+    if not raw_name:
+        return None
+    return to_e164(raw_name) or ' '.join(raw_name.split()).casefold() or None
+
+def get_or_create_contact(conn, raw_name, aliases=()):
+    """
+    Returns the id of the contact a sender name or number refers to, creating it (and its
+    alias) if needed. Extra aliases, such as a saved name for a number, are attached to the
+    same contact. Does not commit.
+    """
+    key = alias_key(raw_name)
+    if key is None:
+        return None
+    row = conn.execute("SELECT contact_id FROM contact_aliases WHERE alias = ?", (key,)).fetchone()
+    if row:
+        contact_id = row[0]
+    else:
+        e164 = to_e164(raw_name)
+        row = conn.execute("SELECT id FROM contacts WHERE e164 = ?", (e164,)).fetchone() if e164 else None
+        if row:
+            contact_id = row[0]
+        else:
+            contact_id = conn.execute(
+                "INSERT INTO contacts (e164, display_name) VALUES (?, ?)", (e164, raw_name.strip())
+            ).lastrowid
+        conn.execute("INSERT INTO contact_aliases (alias, contact_id) VALUES (?, ?)", (key, contact_id))
+    for alias in aliases:
+        row = conn.execute("SELECT contact_id FROM contact_aliases WHERE alias = ?", (alias_key(alias),)).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO contact_aliases (alias, contact_id) VALUES (?, ?)", (alias_key(alias), contact_id))
+        elif row[0] != contact_id:
+            # The alias was seen before it was known to belong to this contact
+            merge_contacts(conn, row[0], contact_id)
+    return contact_id
+
+def merge_contacts(conn, old_id, new_id):
+    """Moves the aliases and messages of contact `old_id` to `new_id` and deletes `old_id`. Does not commit."""
+    old_number = conn.execute("SELECT e164 FROM contacts WHERE id = ?", (old_id,)).fetchone()
+    conn.execute("UPDATE contact_aliases SET contact_id = ? WHERE contact_id = ?", (new_id, old_id))
+    conn.execute("UPDATE messages SET sender_contact_id = ? WHERE sender_contact_id = ?", (new_id, old_id))
+    conn.execute("UPDATE messages SET replied_to_contact_id = ? WHERE replied_to_contact_id = ?", (new_id, old_id))
+    conn.execute("DELETE FROM contacts WHERE id = ?", (old_id,))
+    if old_number and old_number[0]:
+        conn.execute("UPDATE contacts SET e164 = COALESCE(e164, ?) WHERE id = ?", (old_number[0], new_id))
+
+def resolve_contact_ids(conn, raw_names):
+    """Returns {raw name: contact id} for the given sender names and numbers, creating missing contacts. Does not commit."""
+    return {raw_name: get_or_create_contact(conn, raw_name) for raw_name in set(raw_names) if raw_name}
@@ -1,27 +1,159 @@
 
 import sqlite3
 
-def create_connection():
-    """ create a database connection to the local SQLite database """
+from contacts import alias_key, resolve_contact_ids
+from timestamps import parse_whatsapp_timestamp
+
+LOCAL_DB_PATH = 'sales_agent.db'
+# This agent's copy of the community fraud list, kept in step with the others by community_sync
+COMMUNITY_REPLICA_PATH = 'community_fraud.db'
+# Message search: porter stems English plurals ("bumpers"), unicode61 folds accents and case.
+# Swahili phrases and the groups' misspellings are handled on the query side, by message_search.
+MESSAGE_SEARCH_TOKENIZER = "porter unicode61 remove_diacritics 2"
+# How long a connection waits for another thread's write lock before failing, in milliseconds
+BUSY_TIMEOUT_MS = 5000
+# Pragmas for the local database. WAL lets the dashboard read while the scraper writes, and with
+# WAL, synchronous=NORMAL only syncs at checkpoints. Negative cache_size is in KiB (64 MiB).
+LOCAL_PRAGMAS = [
+    # Only takes effect on a new database; retention switches older ones over with one VACUUM
+    ("auto_vacuum", "INCREMENTAL"),
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -64 * 1024),
+    ("temp_store", "MEMORY"),
+]
+
+def tune_connection(conn, pragmas=LOCAL_PRAGMAS):
+    """ apply performance pragmas to a connection and return it """
+    for name, value in pragmas:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def create_connection(db_path=LOCAL_DB_PATH):
+    """ create a tuned database connection to the local SQLite database """
     conn = None
     try:
-        conn = sqlite3.connect('sales_agent.db')
+        conn = tune_connection(sqlite3.connect(db_path))
         print(f"Successfully connected to local SQLite database version: {sqlite3.version}")
     except sqlite3.Error as e:
         print(e)
     return conn
 
-def create_community_connection():
-    """ create a database connection to the shared community SQLite database """
+def create_community_connection(db_path=COMMUNITY_REPLICA_PATH):
+    """ create a database connection to the local replica of the community fraud database """
     conn = None
-    db_path = r'G:\My Drive\Shared Sales Agent\community_fraud.db'
     try:
-        conn = sqlite3.connect(db_path)
+        # A local file: the shared copy on Google Drive is only reached by community_sync
+        conn = tune_connection(sqlite3.connect(db_path))
         print(f"Successfully connected to community SQLite database at {db_path}")
     except sqlite3.Error as e:
         print(f"Error connecting to community database: {e}")
     return conn
 
+def _add_column_if_missing(cursor, table, column, definition):
+    """ add a column to a table created by an older version of the app """
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _add_dashboard_indexes(cursor):
+    """ index the columns the background stages filter and join on """
+    # The dashboard's sender and time indexes are created with their columns by
+    # _add_contact_ids and _add_timestamp_epoch
+    # Pictures and their reposts are looked up by hash
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_picture_hash ON messages(picture_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_duplicate_of ON media(duplicate_of)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_linked ON media(linked)")
+    # Matching: buying requests above a message id
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrichment_classification ON message_enrichment(classification)")
+
+def _add_timestamp_epoch(cursor):
+    """ parse the raw timestamps of existing messages into a sortable, indexed epoch column """
+    _add_column_if_missing(cursor, "messages", "timestamp_epoch", "INTEGER")
+    cursor.connection.create_function("parse_whatsapp_timestamp", 1, parse_whatsapp_timestamp)
+    cursor.execute("UPDATE messages SET timestamp_epoch = parse_whatsapp_timestamp(timestamp) WHERE timestamp_epoch IS NULL")
+    # Popular Products reads the newest rows from the end of this index instead of sorting the
+    # table. The raw text sorts lexically ("9:00" after "10:00"); databases that were given an
+    # index on it by an earlier version of the first migration lose it here.
+    cursor.execute("DROP INDEX IF EXISTS idx_messages_timestamp")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp_epoch ON messages(timestamp_epoch)")
+
+def _add_contact_ids(cursor):
+    """ point existing messages at contacts rows, so senders are compared by id instead of by substring """
+    _add_column_if_missing(cursor, "messages", "sender_contact_id", "INTEGER REFERENCES contacts(id)")
+    _add_column_if_missing(cursor, "messages", "replied_to_contact_id", "INTEGER REFERENCES contacts(id)")
+    conn = cursor.connection
+    names = [row[0] for row in cursor.execute("SELECT sender FROM messages UNION SELECT replied_to_sender FROM messages")]
+    resolve_contact_ids(conn, names)
+    conn.create_function("contact_alias_key", 1, alias_key)
+    cursor.execute("""
+        UPDATE messages SET
+            sender_contact_id = (SELECT contact_id FROM contact_aliases WHERE alias = contact_alias_key(messages.sender)),
+            replied_to_contact_id = (SELECT contact_id FROM contact_aliases WHERE alias = contact_alias_key(messages.replied_to_sender))
+        WHERE sender_contact_id IS NULL
+    """)
+    # Customer Replies filters and sorts entirely inside this index. An earlier version of the
+    # first migration indexed the raw sender names, which the old substring search could not use.
+    cursor.execute("DROP INDEX IF EXISTS idx_messages_reply_sender")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_reply_contact ON messages(is_reply, replied_to_contact_id, timestamp_epoch)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_sender_contact ON messages(sender_contact_id)")
+
+def _add_message_search(cursor):
+    """ index the message texts for full-text search, kept in sync with messages by triggers """
+    # External content: the index reads the texts from messages instead of storing a second copy
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            message_text, content='messages', content_rowid='id',
+            tokenize='{MESSAGE_SEARCH_TOKENIZER}', prefix='3 4'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, message_text) VALUES (new.id, new.message_text);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, message_text) VALUES ('delete', old.id, old.message_text);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF message_text ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, message_text) VALUES ('delete', old.id, old.message_text);
+            INSERT INTO messages_fts (rowid, message_text) VALUES (new.id, new.message_text);
+        END
+    """)
+    cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+# Schema changes to the local database, in order. PRAGMA user_version holds how many of them
+# a database has had, so each one runs exactly once. Only ever append to this list.
+MIGRATIONS = [
+    _add_dashboard_indexes,
+    _add_timestamp_epoch,
+    _add_contact_ids,
+    _add_message_search,
+]
+
+def migrate(conn, migrations=MIGRATIONS):
+    """ apply the migrations a database has not had yet, each in its own transaction """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(migrations[version:], start=version + 1):
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f"Applied database migration {number}: {migration.__name__}")
+    return len(migrations)
+
 def create_tables(conn, is_community=False):
     """ create tables in the SQLite database """
     try:
@@ -33,7 +165,37 @@ def create_tables(conn, is_community=False):
                     phone_number TEXT NOT NULL UNIQUE,
                     reason TEXT,
                     reported_by TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at REAL,
+                    origin_agent TEXT,
+                    change_seq INTEGER
+                )
+            """)
+            # updated_at and origin_agent order the reports of one number; the latest one wins
+            _add_column_if_missing(c, "fraudulent_numbers", "updated_at", "REAL")
+            _add_column_if_missing(c, "fraudulent_numbers", "origin_agent", "TEXT")
+            # Increases with every change to the replica, whatever the report's own time, so
+            # readers can pick up just the rows that changed since they last looked
+            _add_column_if_missing(c, "fraudulent_numbers", "change_seq", "INTEGER")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_fraudulent_numbers_change_seq ON fraudulent_numbers(change_seq)")
+            # Local reports not yet appended to this agent's shared changelog, as JSON
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS pending_changes (
+                    id INTEGER PRIMARY KEY,
+                    change TEXT NOT NULL
+                )
+            """)
+            # How far every agent's changelog has been read, in bytes
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS sync_offsets (
+                    changelog TEXT PRIMARY KEY,
+                    byte_offset INTEGER NOT NULL
+                )
+            """)
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS pipeline_state (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
                 )
             """)
         else:
@@ -61,9 +223,48 @@ def create_tables(conn, is_community=False):
                     is_reply INTEGER DEFAULT 0,
                     replied_to_text TEXT,
                     replied_to_sender TEXT,
+                    picture_hash TEXT REFERENCES media(sha256),
+                    timestamp_epoch INTEGER,
+                    sender_contact_id INTEGER REFERENCES contacts(id),
+                    replied_to_contact_id INTEGER REFERENCES contacts(id),
                     UNIQUE(group_name, sender, message_text, timestamp)
                 )
             """)
+            # picture_blob is only kept for databases from before the media store
+            _add_column_if_missing(c, "messages", "picture_hash", "TEXT REFERENCES media(sha256)")
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS media (
+                    sha256 TEXT PRIMARY KEY,
+                    byte_size INTEGER,
+                    width INTEGER,
+                    height INTEGER,
+                    thumbnail BLOB,
+                    perceptual_hash TEXT,
+                    duplicate_of TEXT,
+                    linked INTEGER DEFAULT 0,
+                    stored_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # duplicate_of points at the first stored near-duplicate; linked marks rows already checked
+            _add_column_if_missing(c, "media", "perceptual_hash", "TEXT")
+            _add_column_if_missing(c, "media", "duplicate_of", "TEXT")
+            _add_column_if_missing(c, "media", "linked", "INTEGER DEFAULT 0")
+            # One row per person; e164 is NULL when WhatsApp only ever showed a saved name
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS contacts (
+                    id INTEGER PRIMARY KEY,
+                    e164 TEXT UNIQUE,
+                    display_name TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Every spelling of a sender seen so far, keyed by contacts.alias_key
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS contact_aliases (
+                    alias TEXT PRIMARY KEY,
+                    contact_id INTEGER NOT NULL REFERENCES contacts(id)
+                )
+            """)
             c.execute("""
                 CREATE TABLE IF NOT EXISTS seller_catalog (
                     id INTEGER PRIMARY KEY,
@@ -75,6 +276,52 @@ def create_tables(conn, is_community=False):
                     other_details TEXT
                 )
             """)
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS message_enrichment (
+                    message_id INTEGER PRIMARY KEY REFERENCES messages(id) ON DELETE CASCADE,
+                    product TEXT,
+                    make TEXT,
+                    type TEXT,
+                    year TEXT,
+                    price_ksh INTEGER,
+                    other_details TEXT,
+                    extraction_failed INTEGER DEFAULT 0,
+                    classification TEXT,
+                    fraud_phone_number TEXT,
+                    fraud_reason TEXT,
+                    enriched_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_matches (
+                    id INTEGER PRIMARY KEY,
+                    message_id INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+                    catalog_item_id INTEGER,
+                    product TEXT,
+                    make TEXT,
+                    type TEXT,
+                    year TEXT,
+                    price_ksh INTEGER,
+                    other_details TEXT,
+                    matched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(message_id, catalog_item_id)
+                )
+            """)
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS pipeline_state (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS group_watermarks (
+                    group_name TEXT PRIMARY KEY,
+                    last_timestamp TEXT NOT NULL,
+                    last_sender TEXT NOT NULL,
+                    last_text_hash TEXT NOT NULL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
             c.execute("""
                 CREATE TABLE IF NOT EXISTS call_logs (
                     id INTEGER PRIMARY KEY,
@@ -85,11 +332,34 @@ def create_tables(conn, is_community=False):
                 )
             """)
         conn.commit()
+        if not is_community:
+            migrate(conn)
         db_type = "Community" if is_community else "Local"
         print(f"{db_type} tables created successfully.")
     except sqlite3.Error as e:
         print(e)
 
+def get_pipeline_state(conn, name, default=None):
+    """ read a value (e.g. a high-water mark) from the pipeline_state table """
+    row = conn.execute("SELECT value FROM pipeline_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else default
+
+def set_pipeline_state(conn, name, value):
+    """ store a value in the pipeline_state table. The caller is responsible for committing. """
+    conn.execute("INSERT OR REPLACE INTO pipeline_state (name, value) VALUES (?, ?)", (name, str(value)))
+
+def get_group_watermarks(conn):
+    """ return {group_name: {"timestamp", "sender", "text_hash"}} for the newest stored message of every group """
+    rows = conn.execute("SELECT group_name, last_timestamp, last_sender, last_text_hash FROM group_watermarks").fetchall()
+    return {row[0]: {"timestamp": row[1], "sender": row[2], "text_hash": row[3]} for row in rows}
+
+def set_group_watermark(conn, group_name, timestamp, sender, text_hash):
+    """ store the newest scraped message of a group. The caller is responsible for committing. """
+    conn.execute("""
+        INSERT OR REPLACE INTO group_watermarks (group_name, last_timestamp, last_sender, last_text_hash, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, (group_name, timestamp, sender, text_hash))
+
 if __name__ == '__main__':
     local_connection = create_connection()
     if local_connection:
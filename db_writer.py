@@ -0,0 +1,87 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from database import create_connection
+from whatsapp_scraper import insert_messages
+
+# How many queued batches are written in one transaction at most.
+MAX_BATCHES_PER_TRANSACTION = 50
+
+class DatabaseWriter:
+    """
+    A single thread that owns the SQLite connection for scraped messages.
+
+    Scraper threads hand their rows over a queue and never write themselves, so several
+    pages can scrape at the same time without sharing a connection or a lock. Batches
+    that queue up while a transaction is running are written together in the next one.
+    """
+    def __init__(self, connect=create_connection):
+        self.connect = connect
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="DatabaseWriter", daemon=True)
+        self.rows_written = 0
+        self.transactions = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def save_messages(self, records, group_name=None, watermark=None, media_items=()):
+        """
+        Queues message records (with their media and the group's new watermark) and waits
+        until they are stored. Same arguments and return value as whatsapp_scraper.save_messages.
+        """
+        return self.submit(records, group_name, watermark, media_items).result()
+
+    def submit(self, records, group_name=None, watermark=None, media_items=()):
+        """Queues message records without waiting. Returns a Future with the number of new rows."""
+        future = Future()
+        self.queue.put((records, group_name, watermark, media_items, future))
+        return future
+
+    def stop(self):
+        """Writes what is still queued, then closes the connection and ends the thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def _run(self):
+        conn = self.connect()
+        try:
+            stopping = False
+            while not stopping:
+                batches = [self.queue.get()]
+                while len(batches) < MAX_BATCHES_PER_TRANSACTION:
+                    try:
+                        batches.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batches:
+                    stopping = True
+                    batches = [batch for batch in batches if batch is not None]
+                if batches:
+                    self._write(conn, batches)
+        finally:
+            if conn:
+                conn.close()
+            print("Database writer stopped.")
+
+    def _write(self, conn, batches):
+        if not conn:
+            for *_, future in batches:
+                future.set_exception(RuntimeError("The database writer has no connection."))
+            return
+        try:
+            with conn:
+                results = [insert_messages(conn, records, group_name, watermark, media_items)
+                           for records, group_name, watermark, media_items, _ in batches]
+        except Exception as e:
+            print(f"Database writer failed to store {len(batches)} batch(es): {e}")
+            for *_, future in batches:
+                future.set_exception(e)
+            return
+        self.transactions += 1
+        for (*_, future), new_rows in zip(batches, results):
+            self.rows_written += new_rows
+            future.set_result(new_rows)
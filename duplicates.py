@@ -0,0 +1,97 @@
+from perceptual_hash import BKTree, dhash_bytes
+
+# Pictures whose dHashes differ in at most this many of 64 bits are treated as the same photo.
+DUPLICATE_DISTANCE = 6
+
+class DuplicateIndex:
+    """
+    Links reposted pictures to the first stored copy of the same photo.
+
+    The perceptual hashes of all linked media rows are kept in a BK-tree, so a new picture
+    is compared with a few candidates instead of every picture seen so far. Every media row
+    gets a canonical hash: its own, or the one in duplicate_of.
+    """
+    def __init__(self, max_distance=DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self.tree = BKTree()
+        self.loaded = False
+
+    def load(self, conn):
+        """Builds the tree from the media rows that were linked on earlier runs."""
+        for sha256, perceptual_hash, duplicate_of in conn.execute(
+            "SELECT sha256, perceptual_hash, duplicate_of FROM media WHERE linked = 1 AND perceptual_hash IS NOT NULL"
+        ):
+            self.tree.add(perceptual_hash, duplicate_of or sha256)
+        self.loaded = True
+
+    def canonical_for(self, perceptual_hash):
+        """Returns the canonical hash of the closest stored near-duplicate, or None."""
+        matches = self.tree.search(perceptual_hash, self.max_distance)
+        return matches[0][2] if matches else None
+
+    def link_new_media(self, conn):
+        """
+        Links media rows stored since the last call to their near-duplicates, oldest first,
+        and adds them to the tree. Does not commit.
+
+        Returns:
+            The number of new rows that turned out to be reposts.
+        """
+        if not self.loaded:
+            self.load(conn)
+        _backfill_perceptual_hashes(conn)
+
+        reposts = 0
+        rows = conn.execute(
+            "SELECT sha256, perceptual_hash FROM media WHERE linked = 0 ORDER BY stored_at, rowid"
+        ).fetchall()
+        for sha256, perceptual_hash in rows:
+            canonical = None
+            if perceptual_hash:
+                canonical = self.canonical_for(perceptual_hash)
+                self.tree.add(perceptual_hash, canonical or sha256)
+            if canonical:
+                reposts += 1
+            conn.execute("UPDATE media SET duplicate_of = ?, linked = 1 WHERE sha256 = ?", (canonical, sha256))
+        return reposts
+
+def _backfill_perceptual_hashes(conn):
+    """Hashes media rows stored before perceptual hashing existed, from their thumbnails."""
+    rows = conn.execute(
+        "SELECT sha256, thumbnail FROM media WHERE perceptual_hash IS NULL AND thumbnail IS NOT NULL AND linked = 0"
+    ).fetchall()
+    for sha256, thumbnail in rows:
+        conn.execute("UPDATE media SET perceptual_hash = ? WHERE sha256 = ?", (dhash_bytes(thumbnail), sha256))
+
+def find_reusable_extractions(conn, message_ids):
+    """
+    Finds successful extractions that can be copied to the given messages because another
+    message already carried the same (or a near-duplicate) picture.
+
+    Returns:
+        {message_id: (product, make, type, year, price_ksh, other_details)}
+    """
+    if not message_ids:
+        return {}
+    placeholders = ",".join("?" * len(message_ids))
+    # SQLite takes the bare columns from the row that produced MIN(), i.e. the oldest copy
+    rows = conn.execute(f"""
+        SELECT m.id, MIN(other.id), e.product, e.make, e.type, e.year, e.price_ksh, e.other_details
+        FROM messages m
+        JOIN media md ON md.sha256 = m.picture_hash
+        JOIN media other_md ON COALESCE(other_md.duplicate_of, other_md.sha256) = COALESCE(md.duplicate_of, md.sha256)
+        JOIN messages other ON other.picture_hash = other_md.sha256 AND other.id != m.id
+        JOIN message_enrichment e ON e.message_id = other.id AND e.extraction_failed = 0
+        WHERE m.id IN ({placeholders})
+        GROUP BY m.id
+    """, list(message_ids)).fetchall()
+    return {row[0]: row[2:] for row in rows}
+
+_index = None
+
+def get_duplicate_index():
+    """Returns the shared DuplicateIndex."""
+    global _index
+    if _index is None:
+        _index = DuplicateIndex()
+    return _index
@@ -0,0 +1,136 @@
+from database import get_pipeline_state, set_pipeline_state
+from duplicates import find_reusable_extractions, get_duplicate_index
+from gemini_processor import triage_messages
+
+# pipeline_state key holding the id of the last message that was enriched
+ENRICHMENT_STATE_KEY = "enrichment_last_message_id"
+# How many messages are enriched and committed together
+ENRICHMENT_CHUNK_SIZE = 100
+# Messages whose extraction failed this many times are no longer retried
+MAX_EXTRACTION_ATTEMPTS = 3
+# The message_enrichment columns filled in by extraction
+EXTRACTION_FIELDS = ["product", "make", "type", "year", "price_ksh", "other_details"]
+# The extracted fields a reposted picture shows by itself; price and details come from each message's text
+PICTURE_FIELDS = ["product", "make", "type"]
+
+def _enrich_rows(conn, model, rows):
+    """
+    Triages (id, message_text) rows (classification, extraction and fraud detection in one
+    Gemini call per batch) and stores the results. Messages whose picture is a repost of an
+    already extracted listing take the part that picture shows from that listing, so reposts
+    stay consistent; their classification, price and fraud check still come from their own text.
+    """
+    triages = triage_messages(model, [text for _, text in rows])
+    reused = find_reusable_extractions(conn, [message_id for message_id, _ in rows])
+    if reused:
+        print(f"Reused the extraction of a reposted picture for {len(reused)} message(s).")
+
+    records = []
+    for (message_id, _), triage in zip(rows, triages):
+        triage = triage or {}
+        extracted = triage.get("extraction") or {}
+        if extracted and message_id in reused:
+            original = dict(zip(EXTRACTION_FIELDS, reused[message_id]))
+            extracted = dict(extracted, **{field: original[field] for field in PICTURE_FIELDS
+                                           if original[field] not in (None, "", "N/A")})
+        classification = triage.get("classification", "OTHER")
+        fraud_report = triage.get("fraud_report") or {}
+        try:
+            price = int(extracted.get("price_ksh") or 0)
+        except (TypeError, ValueError):
+            price = 0
+        records.append((
+            message_id,
+            str(extracted.get("product", "N/A")),
+            str(extracted.get("make", "N/A")),
+            str(extracted.get("type", "N/A")),
+            str(extracted.get("year", "N/A")),
+            price,
+            str(extracted.get("other_details", "N/A")),
+            0 if extracted else 1,
+            classification,
+            fraud_report.get("phone_number"),
+            fraud_report.get("reason"),
+        ))
+
+    # extraction_failed counts the failed attempts, so retries eventually give up
+    conn.executemany("""
+        INSERT INTO message_enrichment (
+            message_id, product, make, type, year, price_ksh, other_details,
+            extraction_failed, classification, fraud_phone_number, fraud_reason
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(message_id) DO UPDATE SET
+            product = excluded.product,
+            make = excluded.make,
+            type = excluded.type,
+            year = excluded.year,
+            price_ksh = excluded.price_ksh,
+            other_details = excluded.other_details,
+            extraction_failed = CASE WHEN excluded.extraction_failed = 0 THEN 0 ELSE extraction_failed + 1 END,
+            classification = excluded.classification,
+            fraud_phone_number = excluded.fraud_phone_number,
+            fraud_reason = excluded.fraud_reason,
+            enriched_at = CURRENT_TIMESTAMP
+    """, records)
+
+def enrich_new_messages(conn, model, should_continue=lambda: True):
+    """
+    Enriches every message above the stored high-water mark, oldest first.
+
+    Each chunk of results is committed together with the new high-water mark,
+    so an interrupted run resumes where it stopped.
+
+    Returns:
+        The number of messages that were enriched.
+    """
+    if not model:
+        print("Cannot enrich messages: Gemini model is not initialized.")
+        return 0
+
+    # Link reposted pictures first, so their messages can reuse earlier extractions
+    reposts = get_duplicate_index().link_new_media(conn)
+    conn.commit()
+    if reposts:
+        print(f"Linked {reposts} reposted picture(s) to earlier copies.")
+
+    last_id = int(get_pipeline_state(conn, ENRICHMENT_STATE_KEY, 0))
+    enriched = 0
+    while should_continue():
+        rows = conn.execute(
+            "SELECT id, message_text FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, ENRICHMENT_CHUNK_SIZE),
+        ).fetchall()
+        if not rows:
+            break
+
+        _enrich_rows(conn, model, rows)
+        last_id = rows[-1][0]
+        set_pipeline_state(conn, ENRICHMENT_STATE_KEY, last_id)
+        conn.commit()
+        enriched += len(rows)
+        print(f"Enriched {enriched} new message(s), up to message id {last_id}.")
+    return enriched
+
+def retry_failed_enrichments(conn, model, limit=ENRICHMENT_CHUNK_SIZE):
+    """
+    Retries messages whose extraction failed on a previous run.
+
+    Returns:
+        The number of messages that were retried.
+    """
+    if not model:
+        return 0
+
+    rows = conn.execute("""
+        SELECT m.id, m.message_text
+        FROM message_enrichment e JOIN messages m ON m.id = e.message_id
+        WHERE e.extraction_failed BETWEEN 1 AND ?
+        ORDER BY m.id
+        LIMIT ?
+    """, (MAX_EXTRACTION_ATTEMPTS - 1, limit)).fetchall()
+    if rows:
+        _enrich_rows(conn, model, rows)
+        conn.commit()
+        print(f"Retried enrichment for {len(rows)} message(s).")
+    return len(rows)
@@ -0,0 +1,80 @@
+import json
+import re
+import threading
+import time
+
+class FakeResponse:
+    """Mimics the `.text` attribute of a Gemini response."""
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiModel:
+    """
+    An offline stand-in for the Gemini model used by the test scripts.
+
+    It answers the batched triage prompts from gemini_processor with simple keyword rules
+    and counts every `generate_content` call, so the number of API round trips
+    can be measured without network access. Any message containing `fail_on`
+    makes the whole request raise, to exercise per-message error isolation.
+    `latency` simulates the time a real API round trip takes.
+    """
+    def __init__(self, fail_on="__FAIL__", latency=0.0):
+        self.model_name = "models/fake-gemini"
+        self.fail_on = fail_on
+        self.latency = latency
+        self.calls = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.prompts.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        messages = self._extract_messages(prompt)
+        if any(self.fail_on in message["text"] for message in messages):
+            raise RuntimeError("Simulated Gemini failure")
+
+        if "response_schema" in (kwargs.get("generation_config") or {}):
+            # A triage request: one object with every field per message
+            items = [dict(index=m["index"], classification=self._classify(m["text"]), **self._extract(m["text"]),
+                          **{f"fraud_{key}": value for key, value in self._detect_fraud(m["text"]).items()})
+                     for m in messages]
+        else:
+            items = [dict(index=m["index"], **self._extract(m["text"])) for m in messages]
+        return FakeResponse(json.dumps(items))
+
+    def _extract_messages(self, prompt):
+        match = re.search(r'---\s*(\[.*?\])\s*---', prompt, re.DOTALL)
+        return json.loads(match.group(1)) if match else []
+
+    def _classify(self, text):
+        lowered = text.lower()
+        if any(word in lowered for word in ["need", "looking for", "can i get", "natafuta"]):
+            return "BUYING_REQUEST"
+        return "OTHER"
+
+    def _extract(self, text):
+        lowered = text.lower()
+        product = "N/A"
+        for part in ["bumper", "headlight", "nosecut", "side mirror", "back lights"]:
+            if part in lowered:
+                product = part.title()
+                break
+        make = "Toyota" if "toyota" in lowered or "toyato" in lowered else "N/A"
+        price = re.search(r'(\d[\d,]*)\s*ksh', lowered)
+        return {
+            "product": product,
+            "make": make,
+            "type": "N/A",
+            "year": "N/A",
+            "price_ksh": int(price.group(1).replace(",", "")) if price else 0,
+            "other_details": "N/A",
+        }
+
+    def _detect_fraud(self, text):
+        number = re.search(r'(?:\+?254|0)(7\d{8}|1\d{8})', text.replace(" ", ""))
+        if number and any(word in text.lower() for word in ["conman", "scam", "fraud", "thief", "don't trust"]):
+            return {"phone_number": f"+254{number.group(1)}", "reason": text}
+        return {"phone_number": None, "reason": None}
@@ -0,0 +1,173 @@
+import hashlib
+import math
+import sqlite3
+import threading
+
+from contacts import to_e164
+from database import COMMUNITY_REPLICA_PATH, tune_connection
+
+# Above this many reported numbers the lookup keeps a Bloom filter instead of every number
+# and reason in memory, and confirms the rare hits against the replica.
+BLOOM_FILTER_THRESHOLD = 200000
+# The share of numbers that are not reported but pass the Bloom filter anyway, and so
+# cost a lookup in the replica.
+BLOOM_FILTER_ERROR_RATE = 0.001
+
+def lookup_key(phone_number):
+    """The form numbers are compared in: E.164, so older entries in other formats still match."""
+    return to_e164(phone_number) or phone_number
+
+class BloomFilter:
+    """
+    A set that answers "maybe" or "definitely not", in about 1.8 bytes per number at a 0.1%
+    error rate. Items cannot be removed.
+    """
+    def __init__(self, capacity, error_rate=BLOOM_FILTER_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Two hashes from one digest, combined into as many as needed (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class FraudLookupService:
+    """
+    The community fraud list, kept in memory for the whole process.
+
+    The first refresh loads every reported number; later refreshes read only the rows whose
+    change_seq grew since, so they cost nothing when nothing changed. Listeners are told
+    which numbers were added or changed, so views can update those rows instead of
+    reloading everything. Safe to use from any thread.
+    """
+    def __init__(self, db_path=COMMUNITY_REPLICA_PATH, bloom_threshold=BLOOM_FILTER_THRESHOLD):
+        self.db_path = db_path
+        self.bloom_threshold = bloom_threshold
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._conn = None
+        self._last_seq = None
+        self._reasons = {}
+        self._bloom = None
+        # In Bloom filter mode: the stored form of numbers not stored in E.164
+        self._stored_numbers = {}
+
+    @property
+    def uses_bloom_filter(self):
+        return self._bloom is not None
+
+    def add_listener(self, callback):
+        """
+        Calls `callback` with a list of (phone_number, reason) tuples after every refresh that
+        found new or changed reports. It is called on the thread that refreshed.
+        """
+        self._listeners.append(callback)
+
+    def _connection(self):
+        if self._conn is None:
+            # Only ever used under the lock, from whichever thread refreshes or looks up
+            self._conn = tune_connection(sqlite3.connect(self.db_path, check_same_thread=False))
+        return self._conn
+
+    def refresh(self):
+        """
+        Reads the reports added or changed in the replica since the last refresh and tells
+        the listeners about them.
+
+        Returns:
+            The new or changed reports, as a list of (phone_number, reason) tuples.
+        """
+        with self._lock:
+            conn = self._connection()
+            if self._last_seq is None:
+                changes = self._load_all(conn)
+            else:
+                changes = conn.execute(
+                    "SELECT phone_number, reason, change_seq FROM fraudulent_numbers WHERE change_seq > ? ORDER BY change_seq",
+                    (self._last_seq,),
+                ).fetchall()
+                self._last_seq = max([self._last_seq] + [seq for _, _, seq in changes])
+                if self._bloom is None:
+                    grown_past = len(self._reasons) + len(changes) > self.bloom_threshold
+                else:
+                    grown_past = self._bloom.count + len(changes) > self._bloom.capacity
+                if grown_past:
+                    # Too many numbers for the dictionary, or for the filter as it was sized
+                    self._load_all(conn)
+                else:
+                    self._remember(changes)
+            changes = [(phone_number, reason) for phone_number, reason, _ in changes]
+
+        if changes:
+            for callback in self._listeners:
+                callback(changes)
+        return changes
+
+    def _load_all(self, conn):
+        rows = conn.execute("SELECT phone_number, reason, COALESCE(change_seq, 0) FROM fraudulent_numbers").fetchall()
+        self._last_seq = max([0] + [seq for _, _, seq in rows])
+        self._reasons, self._stored_numbers = {}, {}
+        # Room for the list to double before the filter has to be rebuilt
+        self._bloom = BloomFilter(2 * len(rows)) if len(rows) > self.bloom_threshold else None
+        self._remember(rows)
+        return rows
+
+    def _remember(self, rows):
+        for phone_number, reason, _ in rows:
+            key = lookup_key(phone_number)
+            if self._bloom is None:
+                # A report without a reason is still a report
+                self._reasons[key] = reason or ""
+            else:
+                self._bloom.add(key)
+                if key != phone_number:
+                    self._stored_numbers[key] = phone_number
+
+    def get_reason(self, phone_number):
+        """
+        Returns the reason a number was reported for, or None if it was not reported.
+        Any formatting of the number is found.
+        """
+        if not phone_number:
+            return None
+        key = lookup_key(phone_number)
+        with self._lock:
+            if self._bloom is None:
+                return self._reasons.get(key)
+            if key not in self._bloom:
+                return None
+            row = self._connection().execute(
+                "SELECT reason FROM fraudulent_numbers WHERE phone_number = ?", (self._stored_numbers.get(key, key),)
+            ).fetchone()
+        return (row[0] or "") if row else None
+
+    def is_fraudulent(self, phone_number):
+        """True if the number, in any formatting, has been reported."""
+        return self.get_reason(phone_number) is not None
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+_service = None
+
+def get_fraud_lookup():
+    """Returns the shared FraudLookupService."""
+    global _service
+    if _service is None:
+        _service = FraudLookupService()
+    return _service
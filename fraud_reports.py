@@ -0,0 +1,77 @@
+from community_sync import report_frauds
+from database import get_pipeline_state, set_pipeline_state
+from enrichment import ENRICHMENT_STATE_KEY
+from gemini_processor import detect_fraud_reports_with_gemini
+
+# pipeline_state key (in the local database) holding the id of the last message checked for fraud reports
+FRAUD_STATE_KEY = "fraud_last_message_id"
+# How many messages are checked, and their reports saved, together
+FRAUD_CHUNK_SIZE = 100
+# Seconds between checks for new messages
+FRAUD_CHECK_INTERVAL = 120
+
+def report_new_fraud(conn, community_conn, model, agent_id, should_continue=lambda: True):
+    """
+    Adds the fraud reports found in the messages enriched since the last run to the
+    community fraud list.
+
+    The enrichment stage already checks every message for fraud reports in its triage call,
+    so only messages up to its high-water mark are read, and their stored results are used.
+    Only messages whose triage failed are checked again, in pre-screened Gemini calls.
+
+    Each chunk's reports are saved in one community transaction before the new high-water
+    mark is committed to the local database. A run interrupted between the two only checks
+    that chunk again, and numbers already on the list are never reported twice.
+
+    Args:
+        conn: A connection to the local database, owned by the calling thread.
+        community_conn: A connection to the community replica, owned by the calling thread.
+        model: The initialized Gemini model.
+        agent_id: The agent the reports are shared as.
+        should_continue: Returning False stops the run after the current chunk.
+
+    Returns:
+        The phone numbers newly added to the community list.
+    """
+    if not model:
+        print("Cannot check for fraud reports: Gemini model is not initialized.")
+        return []
+
+    last_id = int(get_pipeline_state(conn, FRAUD_STATE_KEY, 0))
+    enriched_up_to = int(get_pipeline_state(conn, ENRICHMENT_STATE_KEY, 0))
+    added = []
+    while should_continue():
+        rows = conn.execute("""
+            SELECT m.id, m.sender, m.message_text, e.fraud_phone_number, e.fraud_reason, COALESCE(e.extraction_failed, 1)
+            FROM messages m LEFT JOIN message_enrichment e ON e.message_id = m.id
+            WHERE m.id > ? AND m.id <= ?
+            ORDER BY m.id
+            LIMIT ?
+        """, (last_id, enriched_up_to, FRAUD_CHUNK_SIZE)).fetchall()
+        if not rows:
+            break
+
+        found = {message_id: {"phone_number": phone_number, "reason": reason}
+                 for message_id, _, _, phone_number, reason, _ in rows if phone_number}
+        failed = [(message_id, text) for message_id, _, text, _, _, extraction_failed in rows if extraction_failed]
+        if failed:
+            # Pre-screened, so most of these cost no call
+            rechecked = detect_fraud_reports_with_gemini(model, [text for _, text in failed])
+            found.update((message_id, report) for (message_id, _), report in zip(failed, rechecked) if report)
+
+        reports = []
+        for message_id, sender, *_ in rows:
+            report = found.get(message_id)
+            if report:
+                print(f"AI detected a potential fraud report by {sender} against {report['phone_number']}.")
+                reports.append((report["phone_number"], report.get("reason") or "AI Detected", f"AI ({sender})"))
+        if reports:
+            # Never replaces the reason a person gave
+            added += report_frauds(community_conn, agent_id, reports, only_if_new=True)
+
+        last_id = rows[-1][0]
+        set_pipeline_state(conn, FRAUD_STATE_KEY, last_id)
+        conn.commit()
+    if added:
+        print(f"Added {len(added)} AI-detected fraud report(s) to the community list.")
+    return added
@@ -1,9 +1,23 @@
 import os
 import google.generativeai as genai
 import json
+import random
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from catalog_index import DEFAULT_TOP_K, CatalogIndex
+from llm_cache import get_cache, normalize_message_text
+from phone_numbers import is_possible_fraud_report, normalize_kenyan_number
+from prompts import get_prompt
+from token_usage import record_call
+
+# The prompts live in the prompts registry; their versions keep cached results of older prompts from being reused.
+TRIAGE_PROMPT_VERSION = get_prompt("triage").version
+MATCHING_PROMPT_VERSION = get_prompt("matching").version
+
 def initialize_gemini():
     """Initializes and returns the Gemini Pro model."""
     load_dotenv()  # Load environment variables from .env file
@@ -19,6 +33,358 @@ def initialize_gemini():
     )
     return model
 
+# --- Request executor ---
+# Defaults, can be overridden with GEMINI_RPM / GEMINI_MAX_WORKERS in the .env file.
+DEFAULT_REQUESTS_PER_MINUTE = 15
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_RETRIES = 5
+# Seconds allowed for a single HTTP call, and for a call including all of its retries.
+DEFAULT_CALL_TIMEOUT = 60
+DEFAULT_CALL_DEADLINE = 300
+# HTTP status codes worth retrying: rate limited or a temporary server error.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """A thread-safe token bucket that allows `rate_per_minute` acquisitions per minute, with bursts up to `capacity`."""
+    def __init__(self, rate_per_minute, capacity=1):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """
+        Blocks until a token is available.
+
+        Returns:
+            True once a token was taken, or False if it could not be taken before `deadline` (a time.monotonic() value).
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate_per_second
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+def _is_retryable(error):
+    """Checks if a failed Gemini call is worth retrying (rate limiting, server errors and timeouts)."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    if isinstance(error, TimeoutError):
+        return True
+    message = str(error)
+    # Only whole numbers: "5000 tokens" in an INVALID_ARGUMENT message is not a 500
+    statuses = {int(number) for number in re.findall(r'\b\d{3}\b', message)}
+    return bool(statuses & RETRYABLE_STATUS_CODES) or "quota" in message.lower()
+
+class GeminiExecutor:
+    """
+    Runs Gemini calls for all processor functions.
+
+    Calls are spread over a bounded thread pool, throttled by a token bucket that matches
+    the API quota, and retried with exponential backoff and jitter on 429/5xx errors
+    until their deadline runs out.
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=1.0, max_delay=60.0,
+                 call_timeout=DEFAULT_CALL_TIMEOUT, call_deadline=DEFAULT_CALL_DEADLINE):
+        self.max_workers = max_workers
+        # A falsy requests_per_minute disables rate limiting (e.g. for offline tests)
+        self.rate_limiter = TokenBucket(requests_per_minute, capacity=max_workers) if requests_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.call_timeout = call_timeout
+        self.call_deadline = call_deadline
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+
+    def generate(self, model, prompt, deadline=None, label="gemini", generation_config=None):
+        """
+        Calls model.generate_content in the current thread, respecting the rate limit and retrying
+        retryable errors. The tokens of the successful call are counted under `label`.
+
+        Args:
+            deadline: A time.monotonic() value after which no new attempt is started.
+                Defaults to `call_deadline` seconds from now.
+            label: The processor function the call is made for, e.g. "triage".
+            generation_config: Passed on to generate_content, e.g. to ask for structured output.
+
+        Returns:
+            The Gemini response. Raises the last error if every attempt failed.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.call_deadline
+        options = {"generation_config": generation_config} if generation_config else {}
+        attempt = 0
+        while True:
+            if self.rate_limiter and not self.rate_limiter.acquire(deadline):
+                raise TimeoutError("Deadline reached while waiting for the Gemini rate limit.")
+            remaining = deadline - time.monotonic()
+            try:
+                response = model.generate_content(
+                    prompt, request_options={"timeout": max(1, min(self.call_timeout, remaining))}, **options
+                )
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries or not _is_retryable(e):
+                    raise
+                # Full jitter: sleep a random time up to the exponential backoff
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if time.monotonic() + delay > deadline:
+                    raise
+                print(f"Gemini call failed ({e}), retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries})...")
+                time.sleep(delay)
+                continue
+            record_call(label, prompt, response)
+            return response
+
+    def map(self, function, items):
+        """Runs function(item) for every item on the thread pool and returns the results in order."""
+        items = list(items)
+        if len(items) <= 1:
+            return [function(item) for item in items]
+        return list(self._pool.map(function, items))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Returns the process-wide Gemini executor, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = GeminiExecutor(
+                max_workers=int(os.getenv("GEMINI_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+                requests_per_minute=float(os.getenv("GEMINI_RPM", DEFAULT_REQUESTS_PER_MINUTE)),
+            )
+        return _executor
+
+def set_executor(executor):
+    """Replaces the process-wide Gemini executor (e.g. an unthrottled one for offline tests)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor is not executor:
+            _executor.shutdown()
+        _executor = executor
+
+def _model_name(model):
+    return getattr(model, "model_name", None) or type(model).__name__
+
+def _with_cache(model, kind, prompt_version, message_texts, compute):
+    """
+    Returns one result per message, reading from and writing to the LLM cache.
+
+    `compute` is only called with the messages that are not cached yet, each distinct
+    message once, and must return one result per message it was given.
+    None results are treated as failures and are not cached.
+    """
+    cache = get_cache()
+    if cache is None:
+        return compute(list(message_texts))
+
+    model_name = _model_name(model)
+    cached = cache.get_many(kind, prompt_version, model_name, message_texts)
+    results = [cached.get(i) for i in range(len(message_texts))]
+
+    # Messages that only differ by case or whitespace share a cache entry, so send them once
+    pending = {}
+    for i, text in enumerate(message_texts):
+        if i not in cached:
+            pending.setdefault(normalize_message_text(text), []).append(i)
+
+    if pending:
+        texts_to_compute = [message_texts[indexes[0]] for indexes in pending.values()]
+        computed = compute(texts_to_compute)
+        for indexes, result in zip(pending.values(), computed):
+            for i in indexes:
+                results[i] = result
+        cache.set_many(kind, prompt_version, model_name, [
+            (text, result) for text, result in zip(texts_to_compute, computed) if result is not None
+        ])
+
+    if message_texts:
+        print(f"{kind.capitalize()} cache: {len(cached)} hit(s), {len(message_texts) - len(cached)} miss(es).")
+    return results
+
+# How many messages are sent to Gemini in a single batched request.
+DEFAULT_BATCH_SIZE = 20
+
+def _format_message_batch(message_texts):
+    """Serializes a list of messages into an indexed JSON array for a batch prompt, without spaces that cost tokens."""
+    return json.dumps(
+        [{"index": i, "text": text} for i, text in enumerate(message_texts)],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+def _parse_batch_response(response_text, count):
+    """
+    Parses a batch response into a dictionary of index -> item.
+    Items with a missing or out of range "index" are dropped.
+    """
+    match = re.search(r'\[.*\]', response_text, re.DOTALL)
+    if not match:
+        raise ValueError("Could not find a JSON array in Gemini's response.")
+    items = json.loads(match.group(0))
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index")
+        if isinstance(index, int) and 0 <= index < count:
+            results[index] = item
+    return results
+
+def _run_batched(model, message_texts, build_prompt, parse_item, batch_size, label, generation_config=None):
+    """
+    Sends the messages to Gemini in chunks of `batch_size` and returns one result
+    per message, in the same order as `message_texts`.
+
+    Chunks are sent concurrently through the shared GeminiExecutor.
+    `parse_item` turns a single item of the JSON array into a result, or returns None
+    if the item is unusable. If a whole chunk fails (API error or unparseable
+    response), it is split in half and retried so that one bad message cannot
+    take the rest of the chunk down with it. Messages that still fail get None.
+    """
+    results = [None] * len(message_texts)
+    executor = get_executor()
+
+    def process(offset, chunk):
+        prompt = build_prompt(_format_message_batch(chunk))
+        response = None
+        try:
+            response = executor.generate(model, prompt, label=label, generation_config=generation_config)
+            items = _parse_batch_response(response.text, len(chunk))
+        except Exception as e:
+            print(f"Error during batched {label} call ({len(chunk)} messages): {e}")
+            if response is not None:
+                print(f"Raw response was: {response.text}")
+            if len(chunk) > 1:
+                middle = len(chunk) // 2
+                process(offset, chunk[:middle])
+                process(offset + middle, chunk[middle:])
+            return
+
+        for index, item in items.items():
+            try:
+                results[offset + index] = parse_item(item)
+            except Exception as e:
+                print(f"Warning: Could not parse {label} result for message {offset + index}: {e}")
+
+    # Chunks run concurrently on the executor; the halves of a failed chunk are retried in the same thread
+    offsets = range(0, len(message_texts), batch_size)
+    executor.map(lambda offset: process(offset, message_texts[offset:offset + batch_size]), offsets)
+    return results
+
+# --- Triage ---
+# The fields of one triaged message. The JSON schema Gemini's structured output must follow;
+# _matches_schema checks the same schema on the way back in.
+EXTRACTION_FIELDS = ["product", "make", "type", "year", "price_ksh", "other_details"]
+CLASSIFICATIONS = ["BUYING_REQUEST", "OTHER"]
+TRIAGE_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "index": {"type": "integer"},
+        "classification": {"type": "string", "enum": CLASSIFICATIONS},
+        "product": {"type": "string"},
+        "make": {"type": "string"},
+        "type": {"type": "string"},
+        "year": {"type": "string"},
+        "price_ksh": {"type": "integer"},
+        "other_details": {"type": "string"},
+        "fraud_phone_number": {"type": "string", "nullable": True},
+        "fraud_reason": {"type": "string", "nullable": True},
+    },
+    "required": ["index", "classification", *EXTRACTION_FIELDS, "fraud_phone_number", "fraud_reason"],
+}
+TRIAGE_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {"type": "array", "items": TRIAGE_ITEM_SCHEMA},
+}
+
+def _matches_schema(value, schema):
+    """Checks a decoded JSON value against the subset of JSON schema used by TRIAGE_ITEM_SCHEMA."""
+    if value is None:
+        return schema.get("nullable", False)
+    expected = schema["type"]
+    if expected == "object":
+        return (isinstance(value, dict)
+                and all(key in value for key in schema.get("required", []))
+                and all(_matches_schema(value[key], field) for key, field in schema["properties"].items() if key in value))
+    if expected == "integer":
+        # JSON has no integer type of its own; 1.0 is fine, True is not
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and value == int(value)
+    if expected == "string":
+        return isinstance(value, str) and value in schema.get("enum", [value])
+    return False
+
+def _build_triage_prompt(messages_json):
+    return get_prompt("triage").render(messages=messages_json)
+
+def _parse_triage_item(item):
+    if not _matches_schema(item, TRIAGE_ITEM_SCHEMA):
+        return None
+    extraction = {field: item[field] for field in EXTRACTION_FIELDS}
+    extraction["price_ksh"] = int(extraction["price_ksh"])
+    fraud_report = None
+    if item["fraud_phone_number"]:
+        phone_number = normalize_kenyan_number(item["fraud_phone_number"]) or item["fraud_phone_number"]
+        fraud_report = {"phone_number": phone_number, "reason": item["fraud_reason"]}
+    # Negative fraud verdicts are part of the result, so they are cached too
+    return {"classification": item["classification"], "extraction": extraction, "fraud_report": fraud_report}
+
+def triage_messages(model, message_texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Classifies messages, extracts their auto part details and checks them for fraud reports,
+    all in one Gemini call per `batch_size` messages.
+
+    Gemini answers in JSON mode against TRIAGE_ITEM_SCHEMA, and every item is checked
+    against the schema again, so a malformed item only loses its own message.
+
+    Returns:
+        A list with one entry per message, in the same order: a dictionary with
+        "classification" ("BUYING_REQUEST" or "OTHER"), "extraction" (a dictionary of
+        EXTRACTION_FIELDS) and "fraud_report" (a dictionary with "phone_number", normalized
+        to +254XXXXXXXXX, and "reason", or None if the message is not a fraud report),
+        or None if the message could not be triaged.
+    """
+    if not model:
+        print("Cannot triage messages: Gemini model is not initialized.")
+        return [None] * len(message_texts)
+
+    return _with_cache(
+        model, "triage", TRIAGE_PROMPT_VERSION, list(message_texts),
+        lambda texts: _run_batched(model, texts, _build_triage_prompt, _parse_triage_item, batch_size, "triage",
+                                   generation_config=TRIAGE_GENERATION_CONFIG),
+    )
+
+def analyze_messages_with_gemini(model, message_texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Extracts structured data about auto parts from a list of WhatsApp messages, using
+    triage_messages.
+
+    Args:
+        model: The initialized Gemini model.
+        message_texts: A list of raw WhatsApp message texts.
+        batch_size: The maximum number of messages sent in a single request.
+
+    Returns:
+        A list with one entry per message, in the same order: a dictionary containing
+        the extracted information, or None if extraction failed for that message.
+    """
+    return [triage["extraction"] if triage else None for triage in triage_messages(model, message_texts, batch_size)]
+
 def analyze_message_with_gemini(model, message_text):
     """
     Analyzes a single WhatsApp message to extract structured data about auto parts.
@@ -30,58 +396,17 @@ def analyze_message_with_gemini(model, message_text):
     Returns:
         A dictionary containing the extracted information, or None if parsing fails.
     """
-    if not model:
-        print("Cannot analyze message: Gemini model is not initialized.")
-        return None
+    return analyze_messages_with_gemini(model, [message_text])[0]
 
-    # This is the structured prompt for the AI
-    prompt = f"""
-    You are an expert data extractor for an auto parts sales agent. 
-    Your task is to analyze a WhatsApp message and extract structured information.
-
-    Analyze the following message text:
-    ---
-    {message_text}
-    ---
-
-    Extract the following fields and return the result as a single line of valid JSON:
-    - "product": The specific part being requested or sold (e.g., "Bumper", "Headlight", "Nosecut").
-    - "make": The car brand (e.g., "Toyota", "Nissan", "Mazda"). If not mentioned, use "N/A".
-    - "type": The specific model of the car (e.g., "Harrier", "Belta", "Fielder"). If not mentioned, use "N/A".
-    - "year": The manufacturing year of the car or part. If not mentioned, use "N/A".
-    - "price_ksh": The price in Kenya Shillings. Extract only the number, no commas or currency symbols. If not mentioned, use 0.
-    - "other_details": Any other relevant information like color, side (left/right), condition (new/used), or contact info. If none, use "N/A".
-
-    Example 1:
-    Message: "Hi can i get nosecut for toyato belta?"
-    JSON Output: {{"product": "Nosecut", "make": "Toyota", "type": "Belta", "year": "N/A", "price_ksh": 0, "other_details": "N/A"}}
-
-    Example 2:
-    Message: "Both sides Back lights Bei poa"
-    JSON Output: {{"product": "Back lights", "make": "N/A", "type": "N/A", "year": "N/A", "price_ksh": 0, "other_details": "Both sides, Bei poa"}}
-    
-    Example 3:
-    Message: "I need a front bumper for a 2015 Toyota Harrier, silver. Price?"
-    JSON Output: {{"product": "Bumper", "make": "Toyota", "type": "Harrier", "year": "2015", "price_ksh": 0, "other_details": "Front, silver"}}
-
-    Now, provide the JSON output for the message above.
-    """
-
-    try:
-        response = model.generate_content(prompt)
-        # A more robust regex to find either a JSON object or array
-        match = re.search(r'(\[.*\]|\{.*\})', response.text, re.DOTALL)
-        if match:
-            json_string = match.group(0)
-            return json.loads(json_string)
-        else:
-            print(f"Warning: Could not find a valid JSON object or array in Gemini's response.")
-            print(f"Raw response was: {response.text}")
-            return []
-    except Exception as e:
-        print(f"Error during Gemini matching call or JSON parsing: {e}")
-        print(f"Raw response was: {response.text if 'response' in locals() else 'N/A'}")
-        return []
+def classify_message_types(model, message_texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Classifies a list of messages as either 'BUYING_REQUEST' or 'OTHER', using triage_messages.
+
+    Returns:
+        A list with one classification per message, in the same order.
+        Messages that could not be classified default to 'OTHER'.
+    """
+    return [triage["classification"] if triage else "OTHER" for triage in triage_messages(model, message_texts, batch_size)]
 
 def classify_message_type(model, message_text):
     """
@@ -90,98 +415,95 @@ def classify_message_type(model, message_text):
     Returns:
         A string 'BUYING_REQUEST' or 'OTHER'.
     """
-    if not model:
-        print("Cannot classify message: Gemini model is not initialized.")
-        return "OTHER"
-
-    prompt = f'''
-    You are a message classifier for an auto parts sales group. Your task is to determine if a message is a request to buy a part.
-    - If the message is a request to buy, asking for a part, or inquiring about availability, classify it as "BUYING_REQUEST".
-    - For all other messages (e.g., greetings, sales offers, replies with prices), classify it as "OTHER".
-
-    Analyze the following message:
-    ---
-    {message_text}
-    ---
-
-    Examples:
-    Message: "Hi can i get nosecut for toyato belta?" -> BUYING_REQUEST
-    Message: "I have a bumper for sale, 15000ksh" -> OTHER
-    Message: "Good morning everyone" -> OTHER
-    Message: "Still available" -> OTHER
-    Message: "Looking for side mirror for Honda Fit" -> BUYING_REQUEST
-
-    What is the classification of the message above? Respond with only "BUYING_REQUEST" or "OTHER".
-    '''
-    try:
-        response = model.generate_content(prompt)
-        classification = response.text.strip()
-        if classification in ["BUYING_REQUEST", "OTHER"]:
-            return classification
-        return "OTHER" # Default if the response is unexpected
-    except Exception as e:
-        print(f"Error during message classification: {e}")
-        return "OTHER"
-
-def find_matches_in_catalog(model, buying_request_text, catalog_items):
+    return classify_message_types(model, [message_text])[0]
+
+def find_matches_in_catalog(model, buying_request_text, catalog_items, catalog_index=None, top_k=DEFAULT_TOP_K, local_match_confidence=None):
     """
     Compares a buying request to a list of catalog items and finds matches.
 
+    The catalog is first narrowed down locally with a CatalogIndex, and only the
+    `top_k` best candidates are sent to Gemini.
+
     Args:
         model: The initialized Gemini model.
         buying_request_text: The text of the buyer's message.
         catalog_items: A list of dictionaries, where each dictionary is a catalog item.
+        catalog_index: A CatalogIndex built from `catalog_items`. Pass one in when matching
+            many requests against the same catalog, so it is only built once.
+        top_k: The maximum number of candidates sent to Gemini.
+        local_match_confidence: If set, candidates whose index confidence is at least this
+            value (between 0 and 1) are returned directly, without calling Gemini.
 
     Returns:
         A list of dictionaries of the matching items, or an empty list.
     """
-    if not model:
-        print("Cannot find matches: Gemini model is not initialized.")
-        return []
-    
     if not catalog_items:
         print("Cannot find matches: Seller catalog is empty.")
         return []
 
-    # Format the catalog items for the prompt
-    catalog_string = "\n".join([f"- {json.dumps(item)}" for item in catalog_items])
-
-    prompt = f'''
-    You are an intelligent auto parts matching agent. Your goal is to find relevant items from a seller's catalog that match a customer's buying request.
-
-    This is the seller's catalog:
-    ---
-    {catalog_string}
-    ---
-
-    This is the customer's buying request:
-    ---
-    {buying_request_text}
-    ---
-
-    Your task:
-    1. Analyze the customer's request.
-    2. Compare the request against every item in the catalog. A good match should consider the product, make, type, and year. The "other_details" field should also be considered for relevance.
-    3. Return a single valid JSON array containing ONLY the full JSON objects of the items from the catalog that are a good match.
-    4. If there are no matches, return an empty JSON array `[]`.
-
-    Do not include any other text, explanations, or markdown formatting in your response. Only the JSON array.
-
-    Example:
-    If the catalog contains `{{"id": 1, "product": "Bumper", "make": "Toyota", "type": "Harrier", "price_ksh": 15000}}` and the request is "I need a harrier bumper", your response must be:
-    `[{{"id": 1, "product": "Bumper", "make": "Toyota", "type": "Harrier", "price_ksh": 15000}}]`
-    '''
-
-    try:
-        response = model.generate_content(prompt)
-        # Clean the response to ensure it's valid JSON
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "").strip()
-        return json.loads(cleaned_response)
-    except Exception as e:
-        print(f"Error during Gemini matching call or JSON parsing: {e}")
-        print(f"Raw response was: {response.text if 'response' in locals() else 'N/A'}")
+    if catalog_index is None:
+        catalog_index = CatalogIndex(catalog_items)
+    candidates = catalog_index.search(buying_request_text, top_k)
+    if not candidates:
+        # Nothing in the catalog shares the requested product, so there is nothing to ask Gemini about
+        return []
+
+    if local_match_confidence is not None:
+        confident = [dict(item) for item, _, confidence in candidates if confidence >= local_match_confidence]
+        if confident:
+            return confident
+
+    if not model:
+        print("Cannot find matches: Gemini model is not initialized.")
         return []
 
+    shortlist = [item for item, _, _ in candidates]
+
+    # Format the shortlisted catalog items for the prompt
+    catalog_string = "\n".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")) for item in shortlist)
+    prompt = get_prompt("matching").render(catalog=catalog_string, request=buying_request_text)
+
+    def compute(texts):
+        try:
+            response = get_executor().generate(model, prompt, label="matching")
+            # Clean the response to ensure it's valid JSON
+            cleaned_response = response.text.strip().replace("```json", "").replace("```", "").strip()
+            return [json.loads(cleaned_response)]
+        except Exception as e:
+            print(f"Error during Gemini matching call or JSON parsing: {e}")
+            print(f"Raw response was: {response.text if 'response' in locals() else 'N/A'}")
+            return [None]
+
+    # The same request can match differently once the catalog changes, so the shortlist is part of the key
+    cache_text = f"{buying_request_text}\n{json.dumps(shortlist, sort_keys=True)}"
+    matches = _with_cache(model, "matching", MATCHING_PROMPT_VERSION, [cache_text], compute)[0]
+    return matches if matches is not None else []
+
+def detect_fraud_reports_with_gemini(model, message_texts, batch_size=DEFAULT_BATCH_SIZE, prescreen=True):
+    """
+    Checks a list of messages for fraud reports, using triage_messages.
+
+    Args:
+        prescreen: Only triage messages that contain a Kenyan phone number and a fraud
+            keyword; all other messages are treated as not being fraud reports.
+
+    Returns:
+        A list with one entry per message, in the same order: a dictionary with
+        "phone_number" (normalized to +254XXXXXXXXX) and "reason" if the message
+        is a fraud report, otherwise None.
+    """
+    message_texts = list(message_texts)
+    reports = [None] * len(message_texts)
+    candidates = [i for i, text in enumerate(message_texts) if not prescreen or is_possible_fraud_report(text)]
+    if not candidates:
+        return reports
+
+    results = triage_messages(model, [message_texts[i] for i in candidates], batch_size)
+    for i, triage in zip(candidates, results):
+        if triage:
+            reports[i] = triage["fraud_report"]
+    return reports
+
 def detect_fraud_report_with_gemini(model, message_text):
     """
     Analyzes a message to determine if it's a fraud report and extracts details.
@@ -193,42 +515,4 @@ def detect_fraud_report_with_gemini(model, message_text):
     Returns:
         A dictionary with "phone_number" and "reason" if it's a fraud report, otherwise None.
     """
-    if not model:
-        print("Cannot analyze for fraud: Gemini model is not initialized.")
-        return None
-
-    prompt = f'''
-    You are a security analyst for a sales group. Your task is to determine if a message is reporting a fraudulent number.
-    A fraud report typically contains a phone number and a reason, like "is a conman", "scammer", "don't trust", "stole from me".
-
-    Analyze the following message:
-    ---
-    {message_text}
-    ---
-
-    If this is a fraud report, extract the phone number being reported and the reason.
-    Return the result as a single line of valid JSON with two keys: "phone_number" and "reason".
-    The phone number should be in the format +254XXXXXXXXX.
-
-    If this is NOT a fraud report, return a JSON object with null values: {{"phone_number": null, "reason": null}}
-
-    Examples:
-    Message: "Beware of +254712345678, he is a conman." -> {{"phone_number": "+254712345678", "reason": "He is a conman."}}
-    Message: "That guy 0712345678 is a scammer" -> {{"phone_number": "+254712345678", "reason": "Is a scammer"}}
-    Message: "I have a bumper for sale" -> {{"phone_number": null, "reason": null}}
-    Message: "Thank you for the part" -> {{"phone_number": null, "reason": null}}
-
-    Provide the JSON output for the message above.
-    '''
-    try:
-        response = model.generate_content(prompt)
-        match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if match:
-            json_string = match.group(0)
-            data = json.loads(json_string)
-            if data.get("phone_number"):
-                return data
-        return None
-    except Exception as e:
-        print(f"Error during fraud detection call or JSON parsing: {e}")
-        return None
+    return detect_fraud_reports_with_gemini(model, [message_text])[0]
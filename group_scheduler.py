@@ -0,0 +1,147 @@
+import csv
+import threading
+import time
+
+# A busy group is revisited once it has about this many new messages waiting.
+TARGET_ROWS_PER_VISIT = 5
+# Bounds for the time between two visits of the same group, in seconds.
+MIN_VISIT_INTERVAL = 20
+MAX_VISIT_INTERVAL = 10 * 60
+# Interval for groups whose message rate is not known yet, in seconds.
+DEFAULT_VISIT_INTERVAL = 60
+# Weight of the latest visit in the smoothed message rate.
+RATE_SMOOTHING = 0.3
+
+METRICS_PATH = "group_metrics.csv"
+METRICS_FIELDS = [
+    "group_name", "visits", "new_rows", "skipped_rows", "messages_per_minute", "visit_interval_s",
+    "last_cycle_time_s", "avg_cycle_time_s", "avg_visit_duration_s",
+]
+
+class GroupStats:
+    """What the scheduler knows about one group."""
+    def __init__(self, now):
+        self.visits = 0
+        self.new_rows = 0
+        self.skipped_rows = 0
+        self.rate = None  # new messages per second, smoothed
+        self.interval = DEFAULT_VISIT_INTERVAL
+        self.last_visit = None
+        self.next_due = now
+        self.last_cycle_time = None
+        self.total_cycle_time = 0.0
+        self.cycles = 0
+        self.total_visit_duration = 0.0
+
+class GroupScheduler:
+    """
+    Decides which monitored group to scrape next.
+
+    Every group gets a visit interval from its recent message rate, so that a visit finds
+    about TARGET_ROWS_PER_VISIT new messages: busy groups come round every few seconds,
+    quiet ones every few minutes. Among the groups that are due, the busiest goes first.
+    It can be shared by the pages of a page pool.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+
+    def sync_groups(self, group_names):
+        """Starts tracking newly added groups (due at once) and forgets removed ones."""
+        with self._lock:
+            now = self.clock()
+            for group_name in group_names:
+                self.stats.setdefault(group_name, GroupStats(now))
+            for group_name in list(self.stats):
+                if group_name not in group_names:
+                    del self.stats[group_name]
+
+    def next_group(self, group_names=None):
+        """
+        Returns the due group with the highest message rate, or None if no group is due.
+        `group_names` restricts the choice, e.g. to the groups assigned to one page.
+        """
+        with self._lock:
+            now = self.clock()
+            due = [(name, stats) for name, stats in self._tracked(group_names) if stats.next_due <= now]
+            if not due:
+                return None
+            due.sort(key=lambda item: (-(item[1].rate or 0), item[1].next_due))
+            return due[0][0]
+
+    def seconds_until_next_due(self, group_names=None):
+        with self._lock:
+            tracked = self._tracked(group_names)
+            if not tracked:
+                return None
+            return max(0.0, min(stats.next_due for _, stats in tracked) - self.clock())
+
+    def _tracked(self, group_names):
+        if group_names is None:
+            return list(self.stats.items())
+        return [(name, self.stats[name]) for name in group_names if name in self.stats]
+
+    def record_visit(self, group_name, new_rows, skipped_rows, duration):
+        """Updates a group's message rate and next due time after it was scraped."""
+        with self._lock:
+            self._record_visit(group_name, new_rows, skipped_rows, duration)
+
+    def _record_visit(self, group_name, new_rows, skipped_rows, duration):
+        now = self.clock()
+        stats = self.stats.setdefault(group_name, GroupStats(now))
+        if stats.last_visit is not None:
+            cycle_time = now - stats.last_visit
+            stats.last_cycle_time = cycle_time
+            stats.total_cycle_time += cycle_time
+            stats.cycles += 1
+            # The first visit only shows the backlog, so the rate is measured from the second one on
+            rate = new_rows / max(cycle_time, 1e-6)
+            stats.rate = rate if stats.rate is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * stats.rate
+            stats.interval = self._interval_for(stats.rate)
+        stats.visits += 1
+        stats.new_rows += new_rows
+        stats.skipped_rows += skipped_rows
+        stats.total_visit_duration += duration
+        stats.last_visit = now
+        stats.next_due = now + stats.interval
+
+    def mark_due(self, group_name):
+        """Makes a group due now, e.g. because new messages were seen in it."""
+        with self._lock:
+            if group_name in self.stats:
+                self.stats[group_name].next_due = self.clock()
+
+    @staticmethod
+    def _interval_for(rate):
+        if not rate:
+            return MAX_VISIT_INTERVAL
+        return min(MAX_VISIT_INTERVAL, max(MIN_VISIT_INTERVAL, TARGET_ROWS_PER_VISIT / rate))
+
+    def metrics(self):
+        """Returns one dictionary of METRICS_FIELDS per group, busiest first."""
+        rows = []
+        with self._lock:
+            ranked = sorted(self.stats.items(), key=lambda item: -(item[1].rate or 0))
+        for group_name, stats in ranked:
+            rows.append({
+                "group_name": group_name,
+                "visits": stats.visits,
+                "new_rows": stats.new_rows,
+                "skipped_rows": stats.skipped_rows,
+                "messages_per_minute": round((stats.rate or 0) * 60, 2),
+                "visit_interval_s": round(stats.interval, 1),
+                "last_cycle_time_s": round(stats.last_cycle_time, 1) if stats.last_cycle_time is not None else "",
+                "avg_cycle_time_s": round(stats.total_cycle_time / stats.cycles, 1) if stats.cycles else "",
+                "avg_visit_duration_s": round(stats.total_visit_duration / stats.visits, 2) if stats.visits else "",
+            })
+        return rows
+
+    def export_metrics(self, path=METRICS_PATH):
+        """Writes the per-group metrics to a CSV file, replacing the previous snapshot."""
+        rows = self.metrics()
+        with self._export_lock, open(path, "w", newline="", encoding="utf-8") as metrics_file:
+            writer = csv.DictWriter(metrics_file, fieldnames=METRICS_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
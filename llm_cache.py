@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_DB_PATH = 'llm_cache.db'
+# Defaults, can be overridden with LLM_CACHE_MAX_ENTRIES / LLM_CACHE_MAX_AGE_DAYS in the .env file.
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_MAX_AGE_DAYS = 30
+
+def normalize_message_text(message_text):
+    """Normalizes a message so that trivial whitespace and case differences share a cache entry."""
+    return re.sub(r'\s+', ' ', message_text or '').strip().casefold()
+
+class LLMCache:
+    """
+    A persistent SQLite cache for Gemini results.
+
+    Entries are keyed by (kind, prompt version, model name, normalized message text hash),
+    so changing a prompt or switching models never serves stale results.
+    The cache is shared between the GUI and the background threads, so every
+    access goes through a lock.
+    """
+    def __init__(self, db_path=CACHE_DB_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 60 * 60 if max_age_days else None
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(kind, prompt_version, model_name, message_text):
+        """Builds the cache key for one message."""
+        text_hash = hashlib.sha256(normalize_message_text(message_text).encode('utf-8')).hexdigest()
+        return f"{kind}:{prompt_version}:{model_name}:{text_hash}"
+
+    def get_many(self, kind, prompt_version, model_name, message_texts):
+        """
+        Looks up a list of messages.
+
+        Returns:
+            A dictionary of index -> cached value for the messages that were found.
+        """
+        keys = [self.make_key(kind, prompt_version, model_name, text) for text in message_texts]
+        found = {}
+        now = time.time()
+        with self._lock:
+            unique_keys = list(set(keys))
+            rows = {}
+            # Stay well below SQLite's limit on the number of query parameters
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor = self._conn.execute(
+                    f"SELECT key, value, created_at FROM llm_cache WHERE key IN ({placeholders})", chunk
+                )
+                for key, value, created_at in cursor.fetchall():
+                    if self.max_age_seconds is None or now - created_at <= self.max_age_seconds:
+                        rows[key] = value
+
+            for index, key in enumerate(keys):
+                if key in rows:
+                    found[index] = json.loads(rows[key])
+
+            if rows:
+                self._conn.executemany("UPDATE llm_cache SET last_used = ? WHERE key = ?", [(now, key) for key in rows])
+                self._conn.commit()
+
+            self.hits[kind] = self.hits.get(kind, 0) + len(found)
+            self.misses[kind] = self.misses.get(kind, 0) + len(keys) - len(found)
+        return found
+
+    def get(self, kind, prompt_version, model_name, message_text):
+        """Looks up a single message. Returns the cached value, or None on a miss."""
+        return self.get_many(kind, prompt_version, model_name, [message_text]).get(0)
+
+    def set_many(self, kind, prompt_version, model_name, entries):
+        """Stores a list of (message_text, value) pairs. Values must be JSON serializable."""
+        if not entries:
+            return
+        now = time.time()
+        rows = [
+            (self.make_key(kind, prompt_version, model_name, text), kind, json.dumps(value), now, now)
+            for text, value in entries
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO llm_cache (key, kind, value, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        self.evict()
+
+    def set(self, kind, prompt_version, model_name, message_text, value):
+        """Stores the value for a single message."""
+        self.set_many(kind, prompt_version, model_name, [(message_text, value)])
+
+    def evict(self):
+        """Removes entries older than the maximum age, then the least recently used entries above the size limit."""
+        with self._lock:
+            if self.max_age_seconds is not None:
+                self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            if self.max_entries:
+                count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute("""
+                        DELETE FROM llm_cache WHERE key IN (
+                            SELECT key FROM llm_cache ORDER BY last_used ASC LIMIT ?
+                        )
+                    """, (count - self.max_entries,))
+            self._conn.commit()
+
+    def stats(self):
+        """Returns the hit/miss counters per kind, plus the number of stored entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        kinds = set(self.hits) | set(self.misses)
+        return {
+            "entries": entries,
+            "kinds": {kind: {"hits": self.hits.get(kind, 0), "misses": self.misses.get(kind, 0)} for kind in kinds},
+        }
+
+    def clear(self):
+        """Removes every entry and resets the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self.hits = {}
+            self.misses = {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_UNSET = object()
+_cache = _UNSET
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Returns the process-wide cache, creating it on first use. Returns None if caching is disabled."""
+    global _cache
+    with _cache_lock:
+        if _cache is _UNSET:
+            try:
+                _cache = LLMCache(
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                    max_age_days=float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS)),
+                )
+            except (sqlite3.Error, ValueError) as e:
+                print(f"Error opening the LLM cache, continuing without it: {e}")
+                _cache = None
+        return _cache
+
+def set_cache(cache):
+    """Replaces the process-wide cache. Pass None to disable caching (e.g. in tests)."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,103 @@
+from catalog_index import CatalogIndex, normalize_tokens
+from database import get_pipeline_state, set_pipeline_state
+from enrichment import ENRICHMENT_STATE_KEY
+from gemini_processor import find_matches_in_catalog, get_executor
+from message_search import build_catalog_query
+
+# pipeline_state key holding the id of the last message that was matched against the catalog
+MATCH_STATE_KEY = "match_last_message_id"
+
+def load_catalog_items(conn):
+    """Returns the seller catalog as a list of dictionaries."""
+    cursor = conn.execute("SELECT id, product, make, type, year, price_ksh, other_details FROM seller_catalog")
+    return [dict(zip([c[0] for c in cursor.description], row)) for row in cursor.fetchall()]
+
+def reset_match_state(conn):
+    """Makes the next matching run re-check every buying request, e.g. after the catalog changed."""
+    set_pipeline_state(conn, MATCH_STATE_KEY, 0)
+    conn.commit()
+
+def match_new_buying_requests(conn, model, on_match=None, on_progress=None, should_continue=lambda: True):
+    """
+    Matches the buying requests that arrived since the last run against the seller catalog.
+
+    Only messages the enrichment stage has already classified are considered, and of those
+    only the ones that mention a catalog product, in their text or their extracted product. Matches are
+    stored in catalog_matches and committed together with the new high-water mark after
+    every request, so a cancelled run resumes where it stopped.
+
+    Args:
+        conn: A database connection owned by the calling thread.
+        model: The initialized Gemini model.
+        on_match: Called with a list of match dictionaries (each with a "buyer_request" key) as they are found.
+        on_progress: Called with (done, total) after every request.
+        should_continue: Returning False cancels the run after the current request.
+
+    Returns:
+        The number of new matches found.
+    """
+    catalog_items = load_catalog_items(conn)
+    if not catalog_items:
+        return 0
+    catalog_index = CatalogIndex(catalog_items)
+
+    last_id = int(get_pipeline_state(conn, MATCH_STATE_KEY, 0))
+    enriched_up_to = int(get_pipeline_state(conn, ENRICHMENT_STATE_KEY, 0))
+    catalog_query = build_catalog_query(catalog_items)
+    catalog_products = {token for item in catalog_items for token in normalize_tokens(str(item.get("product") or ""))}
+    mentions_product = "m.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)" if catalog_query else "0"
+    rows = conn.execute(f"""
+        SELECT m.id, m.message_text, e.product, {mentions_product}
+        FROM messages m JOIN message_enrichment e ON e.message_id = m.id
+        WHERE e.classification = 'BUYING_REQUEST' AND m.id > ? AND m.id <= ?
+        ORDER BY m.id
+    """, ((catalog_query,) if catalog_query else ()) + (last_id, enriched_up_to)).fetchall()
+    # Only the buying requests that mention a catalog product: in their text, as the full-text
+    # index finds it, or in the product the enrichment stage extracted, which Gemini spell-corrects
+    # (e.g. "noscut", which the index cannot find)
+    requests = [(message_id, message_text) for message_id, message_text, product, mentioned in rows
+                if mentioned or catalog_products.intersection(normalize_tokens(product))]
+
+    def find_matches(request):
+        # Exact matches on every key field skip the AI call
+        return find_matches_in_catalog(model, request[1], catalog_items, catalog_index=catalog_index, local_match_confidence=1.0)
+
+    # Requests are matched concurrently, one window at a time, and stored in order
+    executor = get_executor()
+    window_size = executor.max_workers * 2
+    found = 0
+    done = 0
+    for start in range(0, len(requests), window_size):
+        if not should_continue():
+            return found
+        window = requests[start:start + window_size]
+        for (message_id, message_text), matches in zip(window, executor.map(find_matches, window)):
+            done += 1
+            found += _store_matches(conn, message_id, message_text, matches, on_match)
+            if on_progress:
+                on_progress(done, len(requests))
+
+    # Everything up to the enrichment mark has been looked at, including non-buying messages
+    set_pipeline_state(conn, MATCH_STATE_KEY, max(last_id, enriched_up_to))
+    conn.commit()
+    return found
+
+def _store_matches(conn, message_id, message_text, matches, on_match):
+    """Stores the matches for one request together with the new high-water mark, and reports the new ones."""
+    new_matches = []
+    for match in matches:
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO catalog_matches (message_id, catalog_item_id, product, make, type, year, price_ksh, other_details)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (message_id, match.get('id'), match.get('product'), match.get('make'), match.get('type'),
+              match.get('year'), match.get('price_ksh'), match.get('other_details')))
+        # Matches already stored by an earlier run (e.g. before a catalog change) are not reported again
+        if cursor.rowcount:
+            match['buyer_request'] = message_text
+            new_matches.append(match)
+    set_pipeline_state(conn, MATCH_STATE_KEY, message_id)
+    conn.commit()
+
+    if new_matches and on_match:
+        on_match(new_matches)
+    return len(new_matches)
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import tempfile
+
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PyQt6.QtGui import QImage
+
+from perceptual_hash import dhash
+
+# Originals live in files named after their SHA-256, under MEDIA_DIR/<first two hex digits>/.
+MEDIA_DIR = "media"
+# Longest side of the thumbnails shown in the table icon cells, in pixels.
+THUMBNAIL_SIZE = 64
+
+class MediaItem:
+    """A captured image, ready to be referenced from the messages table."""
+    def __init__(self, sha256, byte_size, width, height, thumbnail, perceptual_hash=None):
+        self.sha256 = sha256
+        self.byte_size = byte_size
+        self.width = width
+        self.height = height
+        self.thumbnail = thumbnail
+        self.perceptual_hash = perceptual_hash
+
+    def as_row(self):
+        return (self.sha256, self.byte_size, self.width, self.height, self.thumbnail, self.perceptual_hash)
+
+def make_thumbnail(image, size=THUMBNAIL_SIZE):
+    """Scales a QImage down so its longest side is `size` pixels."""
+    return image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+def encode_png(image):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return bytes(data)
+
+class MediaStore:
+    """
+    Content-addressed storage for captured images.
+
+    The same picture forwarded to several groups is written once: files are keyed by the
+    SHA-256 of their bytes, and the media table holds one row per hash with a small
+    thumbnail, so the dashboard never has to read the originals.
+    """
+    def __init__(self, root=MEDIA_DIR):
+        self.root = root
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], f"{sha256}.png")
+
+    def prepare(self, image_bytes):
+        """
+        Stores the original file (unless it is already there) and makes its thumbnail and
+        perceptual hash. Safe to call from several threads; the media row is written by insert_media.
+        """
+        sha256 = hashlib.sha256(image_bytes).hexdigest()
+        path = self.path_for(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first, so a crash never leaves a truncated image under the final name
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(image_bytes)
+            os.replace(temp_path, path)
+        image = QImage.fromData(image_bytes)
+        if image.isNull():
+            return MediaItem(sha256, len(image_bytes), None, None, None)
+        thumbnail = make_thumbnail(image)
+        # Hashing the thumbnail instead of the original is faster and averages out scaling noise
+        return MediaItem(sha256, len(image_bytes), image.width(), image.height(), encode_png(thumbnail), dhash(thumbnail))
+
+    def read(self, sha256):
+        """Returns the original image bytes, or None if the file is missing."""
+        try:
+            with open(self.path_for(sha256), "rb") as image_file:
+                return image_file.read()
+        except FileNotFoundError:
+            return None
+
+def insert_media(conn, items):
+    """Adds media rows for the given MediaItems, skipping hashes that are already stored. Does not commit."""
+    conn.executemany("""
+        INSERT OR IGNORE INTO media (sha256, byte_size, width, height, thumbnail, perceptual_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [item.as_row() for item in items])
+
+def get_thumbnail(conn, sha256):
+    """Returns the PNG thumbnail stored for an image hash, or None."""
+    row = conn.execute("SELECT thumbnail FROM media WHERE sha256 = ?", (sha256,)).fetchone()
+    return row[0] if row else None
+
+def migrate_picture_blobs(conn, store, batch_size=100):
+    """
+    Moves pictures stored inline in messages.picture_blob into the media store, replacing
+    them with a picture_hash reference. Returns the number of messages migrated.
+    """
+    migrated = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, picture_blob FROM messages WHERE picture_blob IS NOT NULL LIMIT ?", (batch_size,)
+        ).fetchall()
+        if not rows:
+            return migrated
+        with conn:
+            for message_id, picture_blob in rows:
+                item = store.prepare(picture_blob)
+                insert_media(conn, [item])
+                conn.execute(
+                    "UPDATE messages SET picture_hash = ?, picture_blob = NULL WHERE id = ?", (item.sha256, message_id)
+                )
+        migrated += len(rows)
+
+_store = None
+
+def get_media_store():
+    """Returns the shared MediaStore."""
+    global _store
+    if _store is None:
+        _store = MediaStore()
+    return _store
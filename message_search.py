@@ -0,0 +1,98 @@
+import sqlite3
+
+from catalog_index import SYNONYMS, normalize_tokens
+
+# Shortest prefix searched for when a catalog product may be misspelt further into the word.
+PREFIX_LENGTH = 4
+# Snippet markers around the matched words, and how many tokens a snippet shows.
+HIGHLIGHT_START = "["
+HIGHLIGHT_END = "]"
+SNIPPET_TOKENS = 12
+
+# The spellings catalog_index joins into one token, so an indexed "head lamp" is found by "headlight".
+PHRASE_VARIANTS = {
+    'nosecut': ['nose cut'],
+    'headlight': ['head light', 'head lamp', 'taa za mbele'],
+    'taillight': ['tail light', 'tail lamp', 'back light', 'rear light', 'taa za nyuma'],
+    'foglight': ['fog light', 'fog lamp'],
+    'sidemirror': ['side mirror', 'wing mirror'],
+}
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def expand_token(token):
+    """Returns the normalized token with the synonyms, misspellings and phrases it stands for."""
+    variants = {token} | {spelling for spelling, target in SYNONYMS.items() if target == token}
+    variants.update(PHRASE_VARIANTS.get(token, []))
+    return sorted(variants)
+
+def build_match_query(text, any_term=False, prefixes=False):
+    """
+    Turns free text into an FTS5 MATCH expression over messages_fts.
+
+    The text is normalized like catalog requests are (phrases joined, synonyms mapped,
+    English and Swahili stopwords dropped), and every token matches any of its spellings.
+
+    Args:
+        text: The words to search for.
+        any_term: Match messages containing any token, instead of all of them.
+        prefixes: Also match words that start with the first PREFIX_LENGTH letters of a
+            longer token, so a misspelt ending still matches.
+
+    Returns:
+        The MATCH expression, or an empty string if no searchable words are left.
+    """
+    groups = []
+    for token in dict.fromkeys(normalize_tokens(text)):
+        terms = [_quote(variant) for variant in expand_token(token)]
+        if prefixes and token.isalpha() and len(token) > PREFIX_LENGTH:
+            terms.append(_quote(token[:PREFIX_LENGTH]) + "*")
+        groups.append("(" + " OR ".join(terms) + ")")
+    return (" OR " if any_term else " AND ").join(groups)
+
+def search_messages(conn, text, limit=50):
+    """
+    Searches the stored messages, best match first.
+
+    Returns:
+        A list of dictionaries with the keys id, group_name, sender, timestamp, snippet
+        (the matching part of the message, with matches in brackets) and rank (lower is better).
+    """
+    query = build_match_query(text)
+    if not query:
+        return []
+    cursor = conn.execute(f"""
+        SELECT m.id, m.group_name, m.sender, m.timestamp,
+               snippet(messages_fts, 0, ?, ?, '...', {SNIPPET_TOKENS}) AS snippet,
+               bm25(messages_fts) AS rank
+        FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (HIGHLIGHT_START, HIGHLIGHT_END, query, limit))
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def search_archives(archive_paths, text, limit=50):
+    """
+    Searches archived messages (see retention.list_archives) like search_messages, best match
+    first. Every hit also has an "archive" key with the path of its archive database.
+    """
+    hits = []
+    for path in archive_paths:
+        conn = sqlite3.connect(path)
+        try:
+            hits.extend(dict(hit, archive=path) for hit in search_messages(conn, text, limit))
+        finally:
+            conn.close()
+    hits.sort(key=lambda hit: hit["rank"])
+    return hits[:limit]
+
+def build_catalog_query(catalog_items):
+    """
+    An FTS5 MATCH expression for messages that mention any catalog product. Catalog matching
+    needs the product in the request, so other messages cannot match.
+    """
+    products = " ".join(str(item.get("product") or "") for item in catalog_items)
+    return build_match_query(products, any_term=True, prefixes=True)
@@ -0,0 +1,50 @@
+import os
+
+# How many WhatsApp Web tabs scrape in parallel (polling mode). WhatsApp Web may ask extra
+# tabs to "Use here", which takes over the session, so more than one is opt-in.
+DEFAULT_PAGE_POOL_SIZE = 1
+# With more than one page, the persistent browser context is launched with this debugging port
+# (WHATSAPP_CDP_PORT overrides it) and the extra pages attach through it. The port gives full
+# control of the logged-in session to anything on this machine, so it is only opened when needed.
+DEFAULT_CDP_PORT = 9223
+WHATSAPP_URL = "https://web.whatsapp.com/"
+
+def get_page_pool_size():
+    """Reads the pool size from WHATSAPP_PAGE_POOL_SIZE, falling back to DEFAULT_PAGE_POOL_SIZE."""
+    try:
+        return max(1, int(os.getenv("WHATSAPP_PAGE_POOL_SIZE", DEFAULT_PAGE_POOL_SIZE)))
+    except ValueError:
+        return DEFAULT_PAGE_POOL_SIZE
+
+def get_cdp_port():
+    """Reads the debugging port from WHATSAPP_CDP_PORT, falling back to DEFAULT_CDP_PORT."""
+    try:
+        return int(os.getenv("WHATSAPP_CDP_PORT", DEFAULT_CDP_PORT))
+    except ValueError:
+        return DEFAULT_CDP_PORT
+
+def browser_launch_args(page_count):
+    """The extra browser arguments the page pool needs: the debugging port, only if there are extra pages."""
+    if page_count <= 1:
+        return []
+    return [f"--remote-debugging-port={get_cdp_port()}"]
+
+def assign_groups(group_names, page_index, page_count):
+    """Returns the monitored groups that the page with `page_index` is responsible for."""
+    return sorted(group_names)[page_index::page_count]
+
+def open_pool_page(playwright, cdp_url=None):
+    """
+    Opens one more WhatsApp Web tab in the running persistent context.
+
+    Sync Playwright objects belong to the thread that created them, so every pool page is
+    opened by its own thread, with its own Playwright instance attached over CDP.
+
+    Returns:
+        A tuple (browser, page). Closing the browser only disconnects; the context keeps running.
+    """
+    browser = playwright.chromium.connect_over_cdp(cdp_url or f"http://localhost:{get_cdp_port()}")
+    context = browser.contexts[0]
+    page = context.new_page()
+    page.goto(WHATSAPP_URL, wait_until="domcontentloaded")
+    return browser, page
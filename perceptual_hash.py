@@ -0,0 +1,72 @@
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, qGray
+
+# dHash compares each pixel of a 9x8 grayscale version of the picture with its right neighbour.
+DHASH_WIDTH = 9
+DHASH_HEIGHT = 8
+
+def dhash(image):
+    """
+    Computes the 64-bit difference hash of a QImage, as 16 hex digits.
+
+    Resized, recompressed or re-screenshotted copies of a picture get hashes that differ
+    in only a few bits, unlike their SHA-256.
+    """
+    small = image.scaled(DHASH_WIDTH, DHASH_HEIGHT, Qt.AspectRatioMode.IgnoreAspectRatio,
+                         Qt.TransformationMode.SmoothTransformation)
+    value = 0
+    for y in range(DHASH_HEIGHT):
+        row = [qGray(small.pixel(x, y)) for x in range(DHASH_WIDTH)]
+        for x in range(DHASH_WIDTH - 1):
+            value = (value << 1) | (1 if row[x] > row[x + 1] else 0)
+    return f"{value:016x}"
+
+def dhash_bytes(image_bytes):
+    """dHash of encoded image bytes, or None if they are not a readable image."""
+    image = QImage.fromData(image_bytes)
+    return None if image.isNull() else dhash(image)
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hex hashes."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+class BKTree:
+    """
+    A Burkhard-Keller tree over perceptual hashes, for finding all hashes within a
+    Hamming distance of a query without comparing against every stored hash.
+    """
+    def __init__(self):
+        # Each node is [hash, value, {distance: child node}]
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value, value):
+        node = [hash_value, value, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(hash_value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, hash_value, max_distance):
+        """Returns (distance, hash, value) for every stored hash within `max_distance`, closest first."""
+        results = []
+        pending = [self.root] if self.root else []
+        while pending:
+            node = pending.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= max_distance:
+                results.append((distance, node[0], node[1]))
+            # By the triangle inequality, only children at distance d +/- max_distance can match
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+        results.sort(key=lambda result: result[0])
+        return results
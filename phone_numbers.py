@@ -0,0 +1,63 @@
+import re
+
+# A Kenyan mobile number: 07XX/01XX XXX XXX, or the same without the leading 0 after 254/+254
+# (optionally written as +254 (0)7XX...). Digit groups may be separated by spaces, dashes, dots or brackets.
+_SEPARATORS = r'[\s\-.()]*'
+PHONE_PATTERN = re.compile(
+    r'(?<![\d+])'
+    r'(?:\+' + _SEPARATORS + r'254|254|0)'
+    + _SEPARATORS + r'(?:0' + _SEPARATORS + r')?'
+    r'[17](?:' + _SEPARATORS + r'\d){8}'
+    r'(?!\d)'
+)
+
+# Words that show up in fraud reports, in English, Swahili and Sheng.
+FRAUD_KEYWORD_PATTERN = re.compile(
+    r'\b(?:'
+    r'con\s?-?m[ae]n|conned|scam\w*|fraud\w*|thie(?:f|ves)|stole|stolen|steal\w*|fake|'
+    r'beware|warning|blacklist\w*|don\'?t trust|do not trust|not genuine|'
+    r'mwizi|wezi|wizi|tapeli|matapeli|utapeli|mkora|wakora|ameniibia|ameibia|kuibiwa|amenikula|jihadhari'
+    r')\b',
+    re.IGNORECASE,
+)
+
+def normalize_kenyan_number(raw_number):
+    """
+    Converts a Kenyan mobile number in any common format to +254XXXXXXXXX.
+
+    Returns:
+        The normalized number, or None if `raw_number` is not a Kenyan mobile number.
+    """
+    digits = re.sub(r'\D', '', raw_number or '')
+    if digits.startswith('2540') and len(digits) == 13:
+        digits = '254' + digits[4:]
+    if digits.startswith('254') and len(digits) == 12:
+        local = digits[3:]
+    elif digits.startswith('0') and len(digits) == 10:
+        local = digits[1:]
+    elif len(digits) == 9:
+        local = digits
+    else:
+        return None
+    if local[0] not in '17':
+        return None
+    return f'+254{local}'
+
+def find_kenyan_numbers(text):
+    """Returns the normalized Kenyan mobile numbers found in a text, in order of appearance, without duplicates."""
+    numbers = []
+    for match in PHONE_PATTERN.finditer(text or ''):
+        number = normalize_kenyan_number(match.group(0))
+        if number and number not in numbers:
+            numbers.append(number)
+    return numbers
+
+def is_possible_fraud_report(text):
+    """
+    Cheap local pre-screen for fraud reports: the message must contain a Kenyan
+    mobile number and at least one fraud keyword. Only messages that pass are
+    worth sending to Gemini.
+    """
+    if not text or not FRAUD_KEYWORD_PATTERN.search(text):
+        return False
+    return bool(find_kenyan_numbers(text))
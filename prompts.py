@@ -0,0 +1,58 @@
+import textwrap
+
+class PromptTemplate:
+    """
+    A versioned Gemini prompt.
+
+    The version is part of every LLM cache key, so bump it whenever the text changes and
+    results of the old text are not reused.
+    """
+    def __init__(self, name, version, text):
+        self.name = name
+        self.version = version
+        self.text = textwrap.dedent(text).strip()
+
+    def render(self, **values):
+        """Fills in the template's {placeholders}."""
+        return self.text.format(**values)
+
+# Every prompt the app sends, by name. The triage prompt takes {messages}, a JSON array of
+# {"index", "text"} objects; the matching prompt takes {catalog} and {request}.
+#
+# The instructions and examples are kept short because they are resent with every call.
+# A system instruction would not help: Gemini bills it as input tokens on every call too,
+# and context caching only starts at 32k tokens, far more than these prompts.
+PROMPTS = {}
+
+def register_prompt(name, version, text):
+    PROMPTS[name] = PromptTemplate(name, version, text)
+    return PROMPTS[name]
+
+def get_prompt(name):
+    return PROMPTS[name]
+
+register_prompt("triage", "triage-v1", """
+    Triage each message from an auto parts WhatsApp group. Messages, as a JSON array of {{"index","text"}} objects:
+    ---
+    {messages}
+    ---
+    For every message give:
+    - "classification": BUYING_REQUEST if it asks to buy a part or whether one is available, otherwise OTHER (e.g. greetings, parts for sale, prices, "Still available").
+    - The part it asks for or offers: "product" (e.g. "Bumper"), "make" (car brand), "type" (car model), "year", "price_ksh" (number only, 0 if none), "other_details" (color, side, condition, contact). Use "N/A" for other missing fields and fix misspellings.
+    - If it reports a fraudulent phone number (e.g. "0712345678 is a conman"): "fraud_phone_number" as +254XXXXXXXXX and a short "fraud_reason"; otherwise null for both.
+    Example: "Hi can i get nosecut for toyato belta?" -> {{"index":0,"classification":"BUYING_REQUEST","product":"Nosecut","make":"Toyota","type":"Belta","year":"N/A","price_ksh":0,"other_details":"N/A","fraud_phone_number":null,"fraud_reason":null}}
+    Reply with a JSON array, one object per message.
+""")
+
+register_prompt("matching", "matching-v2", """
+    Find the seller's catalog items that match a customer's buying request by product, make, type and year; other_details may also matter.
+    Catalog:
+    ---
+    {catalog}
+    ---
+    Request:
+    ---
+    {request}
+    ---
+    Reply with only a JSON array of the matching catalog objects, copied in full, or [] if none match.
+""")
@@ -0,0 +1,259 @@
+import glob
+import os
+import sqlite3
+import time
+
+from database import MESSAGE_SEARCH_TOKENIZER, get_pipeline_state, set_pipeline_state
+from enrichment import ENRICHMENT_STATE_KEY
+from fraud_reports import FRAUD_STATE_KEY
+from media_store import MediaStore, get_media_store
+
+# Archived messages go to one database per month, ARCHIVE_DIR/messages-YYYY-MM.db, and their
+# original pictures to ARCHIVE_DIR/media.
+ARCHIVE_DIR = "archive"
+# Defaults for the retention policy, overridable with MESSAGE_RETENTION_DAYS and
+# MESSAGE_RETENTION_ROWS_PER_GROUP (0 turns a limit off).
+DEFAULT_MAX_AGE_DAYS = 180
+DEFAULT_MAX_ROWS_PER_GROUP = 50000
+# How often the enrichment thread applies the policy, in seconds.
+RETENTION_INTERVAL = 24 * 60 * 60
+# pipeline_state key holding when the policy was last applied (epoch seconds)
+RETENTION_STATE_KEY = "retention_last_run"
+# Free pages returned to the file system per retention run; the rest follow on the next runs.
+VACUUM_PAGES_PER_RUN = 10000
+
+# The archive keeps what the dashboard shows and searches. Contacts stay in the main database.
+ARCHIVE_MESSAGE_COLUMNS = [
+    "id", "group_name", "sender", "message_text", "timestamp", "timestamp_epoch", "is_reply",
+    "replied_to_text", "replied_to_sender", "picture_hash", "sender_contact_id", "replied_to_contact_id",
+]
+ARCHIVE_ENRICHMENT_COLUMNS = [
+    "message_id", "product", "make", "type", "year", "price_ksh", "other_details",
+    "extraction_failed", "classification", "fraud_phone_number", "fraud_reason", "enriched_at",
+]
+ARCHIVE_MATCH_COLUMNS = [
+    "id", "message_id", "catalog_item_id", "product", "make", "type", "year", "price_ksh", "other_details", "matched_at",
+]
+ARCHIVE_MEDIA_COLUMNS = [
+    "sha256", "byte_size", "width", "height", "thumbnail", "perceptual_hash", "duplicate_of", "linked", "stored_at",
+]
+
+class RetentionPolicy:
+    """
+    Which messages stay in the main database: those newer than `max_age_days`, and at most
+    the newest `max_rows_per_group` of every group. None turns a limit off.
+    """
+    def __init__(self, max_age_days=DEFAULT_MAX_AGE_DAYS, max_rows_per_group=DEFAULT_MAX_ROWS_PER_GROUP):
+        self.max_age_days = max_age_days
+        self.max_rows_per_group = max_rows_per_group
+
+    @classmethod
+    def from_environment(cls):
+        def limit(name, default):
+            try:
+                value = int(os.getenv(name, default))
+            except ValueError:
+                value = default
+            return value if value > 0 else None
+        return cls(limit("MESSAGE_RETENTION_DAYS", DEFAULT_MAX_AGE_DAYS),
+                   limit("MESSAGE_RETENTION_ROWS_PER_GROUP", DEFAULT_MAX_ROWS_PER_GROUP))
+
+    def expired_message_ids(self, conn, now=None, up_to_id=None):
+        """
+        Returns the ids of the messages the policy moves out, oldest first. Only messages up to
+        `up_to_id` (the ones every background stage has processed) are considered.
+        """
+        now = time.time() if now is None else now
+        up_to_id = up_to_id if up_to_id is not None else conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        expired = set()
+        if self.max_age_days:
+            cutoff = int(now - self.max_age_days * 24 * 60 * 60)
+            expired.update(row[0] for row in conn.execute(
+                "SELECT id FROM messages WHERE timestamp_epoch < ? AND id <= ?", (cutoff, up_to_id)
+            ))
+        if self.max_rows_per_group:
+            expired.update(row[0] for row in conn.execute("""
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY group_name ORDER BY timestamp_epoch DESC, id DESC
+                    ) AS position
+                    FROM messages
+                )
+                WHERE position > ? AND id <= ?
+            """, (self.max_rows_per_group, up_to_id)))
+        return sorted(expired)
+
+def archive_path(archive_dir, month):
+    return os.path.join(archive_dir, f"messages-{month}.db")
+
+def list_archives(archive_dir=ARCHIVE_DIR):
+    """Returns the archive database paths, oldest month first."""
+    return sorted(glob.glob(os.path.join(archive_dir, "messages-*.db")))
+
+def _create_archive_tables(conn, schema):
+    """Creates the archive tables in an attached database. Ids are kept, so archiving twice is harmless."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.messages (
+            id INTEGER PRIMARY KEY, group_name TEXT NOT NULL, sender TEXT NOT NULL, message_text TEXT NOT NULL,
+            timestamp TEXT NOT NULL, timestamp_epoch INTEGER, is_reply INTEGER DEFAULT 0, replied_to_text TEXT,
+            replied_to_sender TEXT, picture_hash TEXT, sender_contact_id INTEGER, replied_to_contact_id INTEGER
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.message_enrichment (
+            message_id INTEGER PRIMARY KEY, product TEXT, make TEXT, type TEXT, year TEXT, price_ksh INTEGER,
+            other_details TEXT, extraction_failed INTEGER, classification TEXT, fraud_phone_number TEXT,
+            fraud_reason TEXT, enriched_at DATETIME
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.catalog_matches (
+            id INTEGER PRIMARY KEY, message_id INTEGER NOT NULL, catalog_item_id INTEGER, product TEXT, make TEXT,
+            type TEXT, year TEXT, price_ksh INTEGER, other_details TEXT, matched_at DATETIME
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.media (
+            sha256 TEXT PRIMARY KEY, byte_size INTEGER, width INTEGER, height INTEGER, thumbnail BLOB,
+            perceptual_hash TEXT, duplicate_of TEXT, linked INTEGER, stored_at DATETIME
+        )
+    """)
+    # The same search index as the main database, so message_search works on an archive too
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.messages_fts USING fts5(
+            message_text, content='messages', content_rowid='id', tokenize='{MESSAGE_SEARCH_TOKENIZER}', prefix='3 4'
+        )
+    """)
+
+def _copy_rows(conn, table, columns, where):
+    column_list = ", ".join(columns)
+    conn.execute(f"INSERT OR IGNORE INTO archive.{table} ({column_list}) SELECT {column_list} FROM main.{table} WHERE {where}")
+
+def _archive_month(conn, archive_dir, month, store, archive_store):
+    """Moves the expired messages of one month into that month's archive. Returns the hashes of the pictures moved along."""
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path(archive_dir, month),))
+    try:
+        _create_archive_tables(conn, "archive")
+        conn.execute("BEGIN")
+        try:
+            conn.execute("DELETE FROM temp.retention_month")
+            conn.execute("INSERT INTO temp.retention_month SELECT id FROM temp.retention_ids WHERE month = ?", (month,))
+            selected = "IN (SELECT id FROM temp.retention_month)"
+
+            # Index first: the index reads its rows from archive.messages, so this skips rows a
+            # previous, interrupted run already archived
+            conn.execute(f"""
+                INSERT INTO archive.messages_fts (rowid, message_text)
+                SELECT id, message_text FROM main.messages
+                WHERE id {selected} AND id NOT IN (SELECT id FROM archive.messages)
+            """)
+            _copy_rows(conn, "messages", ARCHIVE_MESSAGE_COLUMNS, f"id {selected}")
+            _copy_rows(conn, "message_enrichment", ARCHIVE_ENRICHMENT_COLUMNS, f"message_id {selected}")
+            _copy_rows(conn, "catalog_matches", ARCHIVE_MATCH_COLUMNS, f"message_id {selected}")
+
+            # Pictures go along once no remaining message shows them
+            conn.execute("DELETE FROM temp.retention_media")
+            conn.execute(f"""
+                INSERT OR IGNORE INTO temp.retention_media
+                SELECT m.picture_hash FROM main.messages m
+                WHERE m.id {selected} AND m.picture_hash IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM main.messages other WHERE other.picture_hash = m.picture_hash AND other.id NOT {selected}
+                )
+            """)
+            _copy_rows(conn, "media", ARCHIVE_MEDIA_COLUMNS, "sha256 IN (SELECT sha256 FROM temp.retention_media)")
+
+            conn.execute(f"DELETE FROM main.catalog_matches WHERE message_id {selected}")
+            conn.execute(f"DELETE FROM main.message_enrichment WHERE message_id {selected}")
+            conn.execute(f"DELETE FROM main.messages WHERE id {selected}")
+            conn.execute("DELETE FROM main.media WHERE sha256 IN (SELECT sha256 FROM temp.retention_media)")
+            moved_hashes = [row[0] for row in conn.execute("SELECT sha256 FROM temp.retention_media")]
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+    # Originals are moved after the commit; a crash in between only leaves a file in the old place
+    for sha256 in moved_hashes:
+        source = store.path_for(sha256)
+        if os.path.exists(source):
+            target = archive_store.path_for(sha256)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+    return moved_hashes
+
+def ensure_incremental_vacuum(conn):
+    """
+    Switches a database created before incremental vacuuming to it. This needs one full
+    VACUUM, so it is only done when the database is not already in that mode.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        print("Enabling incremental vacuum (one-time full VACUUM)...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES_PER_RUN):
+    """Returns up to `pages` free pages to the file system. Returns the number of free pages left."""
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def apply_retention(conn, policy=None, archive_dir=ARCHIVE_DIR, store=None, now=None, wait_for_fraud=False):
+    """
+    Moves the messages the policy expires, with their enrichment, matches and pictures, into
+    monthly archive databases, then compacts the main database.
+
+    Only messages that enrichment has already processed are moved, and with `wait_for_fraud`
+    (while the fraud job runs) only those it has checked too. Matching is not waited for:
+    it only runs when asked to, and a catalog change restarts it from the first message,
+    so its mark would hold retention back indefinitely. Every month is moved in one transaction. In WAL mode SQLite does not
+    make transactions atomic across files, so rows are copied with INSERT OR IGNORE and
+    an interrupted run is completed by the next one.
+
+    Returns:
+        The number of messages archived.
+    """
+    policy = policy or RetentionPolicy.from_environment()
+    store = store or get_media_store()
+    archive_store = MediaStore(os.path.join(archive_dir, "media"))
+    stage_keys = [ENRICHMENT_STATE_KEY, FRAUD_STATE_KEY] if wait_for_fraud else [ENRICHMENT_STATE_KEY]
+    processed_up_to = min(int(get_pipeline_state(conn, key, 0)) for key in stage_keys)
+    expired = policy.expired_message_ids(conn, now=now, up_to_id=processed_up_to)
+
+    if expired:
+        os.makedirs(archive_dir, exist_ok=True)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS retention_ids (id INTEGER PRIMARY KEY, month TEXT)")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS retention_month (id INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS retention_media (sha256 TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.retention_ids")
+        conn.executemany("INSERT INTO temp.retention_ids (id) VALUES (?)", [(message_id,) for message_id in expired])
+        # Messages without a parsed time are filed under the month they were archived
+        conn.execute("""
+            UPDATE temp.retention_ids SET month = COALESCE(
+                (SELECT strftime('%Y-%m', timestamp_epoch, 'unixepoch', 'localtime') FROM messages WHERE messages.id = retention_ids.id),
+                strftime('%Y-%m', 'now', 'localtime')
+            )
+        """)
+        conn.commit()
+        months = [row[0] for row in conn.execute("SELECT DISTINCT month FROM temp.retention_ids ORDER BY month")]
+        for month in months:
+            moved_pictures = _archive_month(conn, archive_dir, month, store, archive_store)
+            print(f"Archived messages from {month} ({len(moved_pictures)} picture(s)) to {archive_path(archive_dir, month)}.")
+        conn.execute("DELETE FROM temp.retention_ids")
+        conn.commit()
+
+    ensure_incremental_vacuum(conn)
+    free_pages = incremental_vacuum(conn)
+    print(f"Retention: archived {len(expired)} message(s); {free_pages} free page(s) left to reclaim.")
+    return len(expired)
+
+def run_retention_if_due(conn, policy=None, interval=RETENTION_INTERVAL, now=None, wait_for_fraud=False):
+    """Applies the retention policy if it has not run for `interval` seconds. Returns the number of messages archived."""
+    now = time.time() if now is None else now
+    last_run = float(get_pipeline_state(conn, RETENTION_STATE_KEY, 0))
+    if now - last_run < interval:
+        return 0
+    archived = apply_retention(conn, policy, now=now, wait_for_fraud=wait_for_fraud)
+    set_pipeline_state(conn, RETENTION_STATE_KEY, now)
+    conn.commit()
+    return archived
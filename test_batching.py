@@ -0,0 +1,63 @@
+from fake_gemini import FakeGeminiModel
+from gemini_processor import (
+    GeminiExecutor,
+    analyze_message_with_gemini,
+    analyze_messages_with_gemini,
+    classify_message_type,
+    classify_message_types,
+    set_executor,
+)
+from llm_cache import set_cache
+from token_usage import set_token_usage
+
+SAMPLE_MESSAGES = [
+    "Hi can i get nosecut for toyato belta?",
+    "I have a bumper for sale, 15000ksh",
+    "Good morning everyone",
+    "Still available",
+    "Looking for side mirror for Honda Fit",
+    "Both sides Back lights Bei poa",
+    "I need a front bumper for a 2015 Toyota Harrier, silver. Price?",
+] * 6  # 42 messages
+
+def main():
+    """
+    Compares the number of Gemini calls made by the single-message functions
+    with their batched variants, using an offline fake model.
+    """
+    # Measure the raw number of calls, without the LLM cache answering repeats
+    set_cache(None)
+    set_token_usage(None)
+    set_executor(GeminiExecutor(requests_per_minute=None))
+
+    print("--- Single-message calls ---")
+    single_model = FakeGeminiModel()
+    single_extractions = [analyze_message_with_gemini(single_model, text) for text in SAMPLE_MESSAGES]
+    single_classifications = [classify_message_type(single_model, text) for text in SAMPLE_MESSAGES]
+    print(f"{len(SAMPLE_MESSAGES)} messages -> {single_model.calls} calls")
+
+    print("\n--- Batched calls ---")
+    batch_model = FakeGeminiModel()
+    batch_extractions = analyze_messages_with_gemini(batch_model, SAMPLE_MESSAGES)
+    batch_classifications = classify_message_types(batch_model, SAMPLE_MESSAGES)
+    print(f"{len(SAMPLE_MESSAGES)} messages -> {batch_model.calls} calls")
+
+    assert batch_extractions == single_extractions, "Batched extraction results differ from single-message results."
+    assert batch_classifications == single_classifications, "Batched classifications differ from single-message results."
+    print("Batched results match the single-message results, in the same order.")
+
+    print("\n--- Error isolation ---")
+    poisoned = list(SAMPLE_MESSAGES[:7])
+    poisoned[3] = "__FAIL__ this message breaks the request"
+    failing_model = FakeGeminiModel()
+    results = analyze_messages_with_gemini(failing_model, poisoned)
+    for text, result in zip(poisoned, results):
+        print(f"  \"{text}\" -> {result}")
+    assert results[3] is None
+    assert all(result is not None for i, result in enumerate(results) if i != 3)
+    print(f"Only the failing message lost its result ({failing_model.calls} calls).")
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import random
+
+from catalog_index import CatalogIndex
+from fake_gemini import FakeGeminiModel
+from gemini_processor import GeminiExecutor, find_matches_in_catalog, set_executor
+from llm_cache import set_cache
+from token_usage import set_token_usage
+
+CATALOG = [
+    {"id": 1, "product": "Bumper", "make": "Toyota", "type": "Harrier", "year": "2015", "price_ksh": 15000, "other_details": "Front, silver"},
+    {"id": 2, "product": "Nosecut", "make": "Toyota", "type": "Belta", "year": "", "price_ksh": 45000, "other_details": "Complete"},
+    {"id": 3, "product": "Headlight", "make": "Nissan", "type": "Note", "year": "2012", "price_ksh": 8000, "other_details": "Left side"},
+    {"id": 4, "product": "Side mirror", "make": "Honda", "type": "Fit", "year": "", "price_ksh": 3500, "other_details": "Right"},
+    {"id": 5, "product": "Back lights", "make": "Mazda", "type": "Demio", "year": "2010", "price_ksh": 6000, "other_details": "Pair"},
+]
+
+REQUESTS = [
+    "Hi can i get nosecut for toyato belta?",
+    "Natafuta nose cut ya belta",
+    "I need a front bumper for a 2015 Toyota Harrier, silver. Price?",
+    "Looking for side mirror for Honda Fit",
+    "Anyone with tail lamps for mazda demio",
+    "Good morning everyone",
+]
+
+def build_large_catalog(size):
+    makes = ["Toyota", "Nissan", "Mazda", "Honda", "Subaru", "Mitsubishi"]
+    types = ["Harrier", "Belta", "Fielder", "Note", "Demio", "Fit", "Forester", "Outlander", "Axio", "Premio"]
+    products = ["Bumper", "Nosecut", "Headlight", "Side mirror", "Back lights", "Bonnet", "Radiator", "Door"]
+    rng = random.Random(42)
+    return [
+        {
+            "id": i,
+            "product": rng.choice(products),
+            "make": rng.choice(makes),
+            "type": rng.choice(types),
+            "year": str(rng.randint(2005, 2020)),
+            "price_ksh": rng.randint(10, 500) * 100,
+            "other_details": "N/A",
+        }
+        for i in range(size)
+    ]
+
+def main():
+    """
+    Shows the shortlist the catalog index produces for sample buying requests,
+    and how much smaller the matching prompt gets for a large catalog.
+    """
+    set_cache(None)
+    set_token_usage(None)
+    set_executor(GeminiExecutor(requests_per_minute=None))
+    index = CatalogIndex(CATALOG)
+
+    print("--- Shortlists ---")
+    for request in REQUESTS:
+        print(f"\nRequest: \"{request}\"")
+        for item, score, confidence in index.search(request, top_k=3):
+            print(f"  -> {item['product']} / {item['make']} / {item['type']} (score {score:.1f}, confidence {confidence:.2f})")
+
+    assert index.search("Hi can i get nosecut for toyato belta?")[0][0]["id"] == 2
+    assert index.search("Natafuta nose cut ya belta")[0][0]["id"] == 2
+    assert index.search("Good morning everyone") == []
+
+    print("\n--- Local-only matching ---")
+    model = FakeGeminiModel()
+    matches = find_matches_in_catalog(model, "Looking for side mirror for Honda Fit", CATALOG, catalog_index=index, local_match_confidence=1.0)
+    print(f"Matches: {[match['id'] for match in matches]}, Gemini calls: {model.calls}")
+    assert model.calls == 0
+
+    print("\n--- Prompt size with a 3000 item catalog ---")
+    large_catalog = build_large_catalog(3000)
+    large_index = CatalogIndex(large_catalog)
+    model = FakeGeminiModel()
+    find_matches_in_catalog(model, "I need a bumper for a 2015 Toyota Harrier", large_catalog, catalog_index=large_index)
+    full_catalog_chars = sum(len(str(item)) for item in large_catalog)
+    print(f"Catalog size: ~{full_catalog_chars} characters, prompt sent: {len(model.prompts[0])} characters")
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
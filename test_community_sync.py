@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import tempfile
+
+from community_sync import CHANGELOG_DIR, LEGACY_DB_NAME, CommunitySync, changelog_name, report_fraud
+from database import create_community_connection, create_tables
+
+def open_replica(path):
+    conn = create_community_connection(path)
+    create_tables(conn, is_community=True)
+    return conn
+
+def fraud_list(conn):
+    return conn.execute("SELECT phone_number, reason FROM fraudulent_numbers ORDER BY phone_number").fetchall()
+
+def main():
+    """
+    Checks that agents sharing a folder end up with the same fraud list: the union of all
+    reports, with the latest report of a number winning, whatever order they sync in.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shared_dir = os.path.join(temp_dir, "shared")
+        os.makedirs(shared_dir)
+
+        # The old shared database, which is imported once and never written again
+        legacy = sqlite3.connect(os.path.join(shared_dir, LEGACY_DB_NAME))
+        create_tables(legacy, is_community=True)
+        legacy.execute("""
+            INSERT INTO fraudulent_numbers (phone_number, reason, reported_by, timestamp)
+            VALUES ('+254711000000', 'Old report', 'Agent Zero', '2024-01-01 10:00:00'),
+                   ('0766000000', 'Typed before numbers were normalized', 'Agent Zero', '2024-01-01 11:00:00')
+        """)
+        legacy.commit()
+        legacy.close()
+        legacy_size = os.path.getsize(os.path.join(shared_dir, LEGACY_DB_NAME))
+
+        alice_db, bob_db = open_replica(os.path.join(temp_dir, "alice.db")), open_replica(os.path.join(temp_dir, "bob.db"))
+        alice = CommunitySync(alice_db, "+254700000001", shared_dir)
+        bob = CommunitySync(bob_db, "+254700000002", shared_dir)
+
+        print("--- Local reports ---")
+        assert report_fraud(alice_db, alice.agent_id, "+254722000000", "Took a deposit, no parts", "Alice", reported_at=1000)
+        assert report_fraud(bob_db, bob.agent_id, "+254733000000", "Fake M-Pesa message", "Bob", reported_at=1100)
+        # Bob learns more about Alice's number later; his report is newer, so it wins everywhere
+        report_fraud(bob_db, bob.agent_id, "+254722000000", "Conman, sells stolen parts", "Bob", reported_at=2000)
+        # An automatic report never replaces an existing one
+        assert not report_fraud(alice_db, alice.agent_id, "+254722000000", "AI detected", "AI", only_if_new=True)
+        print(f"Alice before syncing: {fraud_list(alice_db)}")
+        assert not os.path.exists(os.path.join(shared_dir, CHANGELOG_DIR))
+
+        print("\n--- Syncing ---")
+        print(f"Alice: pushed/merged {alice.sync()}")
+        print(f"Bob:   pushed/merged {bob.sync()}")
+        print(f"Alice: pushed/merged {alice.sync()}")
+        print(f"Alice: {fraud_list(alice_db)}")
+        print(f"Bob:   {fraud_list(bob_db)}")
+        assert fraud_list(alice_db) == fraud_list(bob_db) == [
+            ("+254711000000", "Old report"),
+            ("+254722000000", "Conman, sells stolen parts"),
+            ("+254733000000", "Fake M-Pesa message"),
+            ("0766000000", "Typed before numbers were normalized"),
+        ]
+        assert os.path.getsize(os.path.join(shared_dir, LEGACY_DB_NAME)) == legacy_size
+
+        print("\n--- Numbers stored in another format ---")
+        # An automatic report of a number the legacy database has as 07... does not add a second row
+        assert not report_fraud(alice_db, alice.agent_id, "+254766000000", "AI detected", "AI", only_if_new=True)
+        assert not report_fraud(alice_db, alice.agent_id, "0766 000 000", "AI detected", "AI", only_if_new=True)
+        assert ("0766000000", "Typed before numbers were normalized") in fraud_list(alice_db)
+        assert not any(number == "+254766000000" for number, _ in fraud_list(alice_db))
+        print("Automatic reports never replace the reason a person gave, whatever the number's format")
+
+        print("\n--- Late, repeated and partly synced changes ---")
+        bob_log = os.path.join(shared_dir, CHANGELOG_DIR, changelog_name(bob.agent_id))
+        with open(bob_log, "a", encoding="utf-8") as changelog:
+            # An old report arriving late, the same line twice, and a line Drive has not finished syncing
+            line = '{"phone_number": "+254722000000", "reason": "Stale", "reported_by": "Carol", "reported_at": 1500, "agent": "carol"}\n'
+            changelog.write(line + line + '{"phone_number": "+2547440')
+        print(f"Alice: pushed/merged {alice.sync()}")
+        assert fraud_list(alice_db)[1] == ("+254722000000", "Conman, sells stolen parts")
+        with open(bob_log, "a", encoding="utf-8") as changelog:
+            changelog.write('00000", "reason": "Ghost seller", "reported_by": "Bob", "reported_at": 3000, "agent": "+254700000002"}\n')
+        print(f"Alice: pushed/merged {alice.sync()}")
+        assert ("+254744000000", "Ghost seller") in fraud_list(alice_db)
+
+        print("\n--- Shared folder unavailable ---")
+        offline = CommunitySync(alice_db, alice.agent_id, os.path.join(temp_dir, "not mounted"))
+        report_fraud(alice_db, alice.agent_id, "+254755000000", "Reported offline", "Alice")
+        assert offline.sync() == (0, 0)
+        assert alice_db.execute("SELECT COUNT(*) FROM pending_changes").fetchone()[0] == 1
+        alice.sync()
+        bob.sync()
+        assert ("+254755000000", "Reported offline") in fraud_list(bob_db)
+        print("Reports made while offline are shared on the next sync")
+
+        alice_db.close()
+        bob_db.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import tempfile
+
+from contacts import SELF_ALIAS, alias_key, get_or_create_contact, to_e164
+from database import MIGRATIONS, create_tables
+from whatsapp_scraper import save_messages
+
+def main():
+    """
+    Checks that sender numbers in any format resolve to one contact, that older databases get
+    contact ids, and that replies to the user are found by id through an index.
+    """
+    print("--- E.164 numbers ---")
+    for raw in ["0712 345 678", "+254 712-345-678", "254712345678", "+254 (0)712 345678", "712345678"]:
+        print(f"{raw!r} -> {to_e164(raw)}")
+        assert to_e164(raw) == "+254712345678"
+    assert to_e164("+1 (555) 010-0199") == "+15550100199"
+    assert to_e164("John Doe") is None and to_e164("Toyota 2015") is None
+    assert alias_key("  John   DOE ") == alias_key("john doe")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print("\n--- Backfilling an older database ---")
+        conn = sqlite3.connect(os.path.join(temp_dir, "sales_agent.db"))
+        conn.execute("""
+            CREATE TABLE messages (
+                id INTEGER PRIMARY KEY, group_name TEXT NOT NULL, sender TEXT NOT NULL, message_text TEXT NOT NULL,
+                timestamp TEXT NOT NULL, picture_blob BLOB, is_reply INTEGER DEFAULT 0, replied_to_text TEXT,
+                replied_to_sender TEXT, picture_hash TEXT, timestamp_epoch INTEGER,
+                UNIQUE(group_name, sender, message_text, timestamp)
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO messages (group_name, sender, message_text, timestamp, timestamp_epoch, is_reply, replied_to_sender)
+            VALUES ('Group A', ?, ?, ?, ?, ?, ?)
+        """, [
+            ("+254 700 000 001", "Selling a Premio", "9:00, 1/7/2024", 1, 0, None),
+            ("0712 345 678", "Is it available?", "9:05, 1/7/2024", 2, 1, "You"),
+            ("+254712345678", "What's the last price?", "9:10, 1/7/2024", 3, 1, "+254 700 000 001"),
+            ("Jane", "Looking for a Demio", "9:20, 1/7/2024", 4, 0, None),
+        ])
+        conn.execute("PRAGMA user_version = 2")
+        conn.commit()
+        create_tables(conn)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        missing = conn.execute("SELECT COUNT(*) FROM messages WHERE sender_contact_id IS NULL").fetchone()[0]
+        buyers = conn.execute("SELECT COUNT(DISTINCT sender_contact_id) FROM messages WHERE sender != 'Jane' AND is_reply = 1").fetchone()[0]
+        print(f"Messages without a sender contact: {missing}; contacts for the two spellings of one number: {buyers}")
+        assert missing == 0 and buyers == 1
+
+        print("\n--- Replies to the user ---")
+        # What the dashboard does at startup: "You" was seen first and is merged into the user's contact
+        user_contact_id = get_or_create_contact(conn, "0700000001", aliases=(SELF_ALIAS,))
+        save_messages(conn, [("Group B", "+254 733 111 222", "Still available?", "10:00, 2/7/2024", None, 1, "Premio", "You")])
+        replies = conn.execute("""
+            SELECT m.message_text, c.e164 FROM messages m JOIN contacts c ON c.id = m.sender_contact_id
+            WHERE m.is_reply = 1 AND m.replied_to_contact_id = ?
+            ORDER BY m.timestamp_epoch DESC, m.id DESC
+        """, (user_contact_id,)).fetchall()
+        print(f"Replies: {replies}")
+        assert [text for text, _ in replies] == ["Still available?", "What's the last price?", "Is it available?"]
+        assert replies[1][1] == "+254712345678"
+
+        plan = " ".join(row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN SELECT m.message_text FROM messages m
+            WHERE m.is_reply = 1 AND m.replied_to_contact_id = ? ORDER BY m.timestamp_epoch DESC
+        """, (user_contact_id,)))
+        print(f"Query plan: {plan}")
+        assert "idx_messages_reply_contact" in plan and "TEMP B-TREE" not in plan
+
+        print("\n--- Fraud flags ---")
+        # A community entry typed in local format still flags the sender
+        fraudulent_numbers = {to_e164(number) or number for number in ["0712-345-678", "scammer name"]}
+        flagged = [e164 for _, e164 in replies if e164 in fraudulent_numbers]
+        print(f"Flagged senders: {flagged}")
+        assert flagged == ["+254712345678", "+254712345678"]
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
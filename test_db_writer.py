@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from database import create_tables, get_group_watermarks
+from db_writer import DatabaseWriter
+
+PAGES = 4
+BATCHES_PER_PAGE = 25
+ROWS_PER_BATCH = 10
+
+def scrape_page(writer, page_index, results):
+    """Stands in for one pool page: hands batches of rows to the writer and collects the new-row counts."""
+    group_name = f"Group {page_index}"
+    for batch in range(BATCHES_PER_PAGE):
+        records = [
+            (group_name, "Seller", f"Bumper for sale {batch}-{row}", f"10:{batch:02d}, 3/7/2024", None, 0, None, None)
+            for row in range(ROWS_PER_BATCH)
+        ]
+        # Every batch is sent twice, like a re-scrape before the watermark moved
+        for _ in range(2):
+            results.append(writer.save_messages(records, group_name, (f"10:{batch:02d}, 3/7/2024", "Seller", "hash")))
+
+def main():
+    """
+    Has several scraper threads write through one DatabaseWriter at the same time and checks
+    that every row is stored exactly once, with the watermarks, in fewer transactions than batches.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "sales_agent.db")
+        conn = sqlite3.connect(db_path)
+        create_tables(conn)
+
+        writer = DatabaseWriter(connect=lambda: sqlite3.connect(db_path)).start()
+        results = []
+        threads = [threading.Thread(target=scrape_page, args=(writer, i, results)) for i in range(PAGES)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.stop()
+
+        stored = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        batches = PAGES * BATCHES_PER_PAGE * 2
+        print(f"{batches} batches from {PAGES} threads: {stored} rows stored in {writer.transactions} transactions")
+        assert stored == PAGES * BATCHES_PER_PAGE * ROWS_PER_BATCH
+        assert sum(results) == stored and writer.rows_written == stored
+        assert writer.transactions <= batches
+        assert len(get_group_watermarks(conn)) == PAGES
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import random
+import sqlite3
+import tempfile
+
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QRect, Qt
+from PyQt6.QtGui import QColor, QImage, QPainter
+
+from database import create_tables
+from duplicates import DUPLICATE_DISTANCE
+from enrichment import enrich_new_messages
+from fake_gemini import FakeGeminiModel
+from gemini_processor import GeminiExecutor, set_executor
+from llm_cache import set_cache
+from token_usage import set_token_usage
+from media_store import MediaStore
+from perceptual_hash import BKTree, hamming_distance
+from whatsapp_scraper import save_messages
+
+def make_photo(seed, width=640, height=480):
+    """A random 'photo': a few coloured blocks on a gradient."""
+    rng = random.Random(seed)
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    painter = QPainter(image)
+    for x in range(0, width, 8):
+        painter.fillRect(QRect(x, 0, 8, height), QColor(rng.randrange(256), 80, 120))
+    for _ in range(6):
+        painter.fillRect(QRect(rng.randrange(width), rng.randrange(height), 150, 120), QColor(rng.randrange(0xFFFFFF)))
+    painter.end()
+    return image
+
+def encode(image, image_format="PNG", quality=-1):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, image_format, quality)
+    return bytes(data)
+
+def repost_of(image):
+    """The same photo as another screenshot would capture it: a different size, recompressed as JPEG."""
+    resized = image.scaled(500, 375, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    return encode(resized, "JPG", 70)
+
+def main():
+    """
+    Checks that reposted photos are found in the BK-tree and linked, and that their messages
+    reuse the first copy's extraction instead of calling Gemini again.
+    """
+    set_cache(None)
+    set_token_usage(None)
+    set_executor(GeminiExecutor(requests_per_minute=None))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = MediaStore(os.path.join(temp_dir, "media"))
+        photos = [make_photo(seed) for seed in range(40)]
+
+        print("--- Perceptual hashes ---")
+        originals = [store.prepare(encode(photo)) for photo in photos]
+        reposts = [store.prepare(repost_of(photo)) for photo in photos[:10]]
+        same = [hamming_distance(a.perceptual_hash, b.perceptual_hash) for a, b in zip(originals, reposts)]
+        different = [hamming_distance(a.perceptual_hash, b.perceptual_hash)
+                     for i, a in enumerate(originals) for b in originals[i + 1:]]
+        print(f"Reposts differ in at most {max(same)} bits; different photos in at least {min(different)} bits")
+        assert max(same) <= DUPLICATE_DISTANCE < min(different)
+
+        print("\n--- BK-tree ---")
+        tree = BKTree()
+        for item in originals:
+            tree.add(item.perceptual_hash, item.sha256)
+        for original, repost in zip(originals, reposts):
+            matches = tree.search(repost.perceptual_hash, DUPLICATE_DISTANCE)
+            assert matches and matches[0][2] == original.sha256
+        print(f"Every repost found its original among {tree.size} hashes")
+
+        print("\n--- Reusing extractions ---")
+        conn = sqlite3.connect(os.path.join(temp_dir, "sales_agent.db"))
+        create_tables(conn)
+        save_messages(conn, [
+            ("Group A", "Seller", f"Selling a Toyota Premio nosecut, photo {i}", "10:00, 3/7/2024", item.sha256, 0, None, None)
+            for i, item in enumerate(originals[:10])
+        ], media_items=originals[:10])
+        model = FakeGeminiModel()
+        enrich_new_messages(conn, model)
+
+        # The same photos reposted a day later with different wording
+        repost_records = [
+            ("Group B", "Seller", f"Still available, call me {i}", "11:00, 4/7/2024", item.sha256, 0, None, None)
+            for i, item in enumerate(reposts)
+        ]
+        repost_records[0] = ("Group B", "Buyer", "Beware 0722 000 000 is a conman, he stole this photo",
+                             "11:00, 4/7/2024", reposts[0].sha256, 0, None, None)
+        # Someone asking for the part in the photo
+        repost_records[1] = ("Group B", "Buyer", "Anyone selling this? I need it by Friday",
+                             "11:05, 4/7/2024", reposts[1].sha256, 0, None, None)
+        save_messages(conn, repost_records, media_items=reposts)
+        model = FakeGeminiModel()
+        enrich_new_messages(conn, model)
+
+        linked = conn.execute("SELECT COUNT(*) FROM media WHERE duplicate_of IS NOT NULL").fetchone()[0]
+        copied = conn.execute("""
+            SELECT COUNT(*) FROM messages m JOIN message_enrichment e ON e.message_id = m.id
+            WHERE m.group_name = 'Group B' AND e.product = 'Nosecut'
+        """).fetchone()[0]
+        # The reposts' own text names no product; they keep the one extracted from the original
+        print(f"Linked reposts: {linked}; reposts with the original's product: {copied}; Gemini calls: {model.calls}")
+        assert linked == 10 and copied == 10
+        # Each repost's own text is still triaged, all ten in one call
+        assert model.calls == 1
+        fraud = conn.execute("""
+            SELECT e.fraud_phone_number FROM messages m JOIN message_enrichment e ON e.message_id = m.id
+            WHERE m.group_name = 'Group B' AND e.fraud_phone_number IS NOT NULL
+        """).fetchall()
+        assert fraud == [("+254722000000",)]
+        # The buying request is classified from its own text, and asks for the part in the photo
+        requests = conn.execute("""
+            SELECT m.message_text, e.product, e.make FROM messages m JOIN message_enrichment e ON e.message_id = m.id
+            WHERE m.group_name = 'Group B' AND e.classification = 'BUYING_REQUEST'
+        """).fetchall()
+        print(f"Buying requests among the reposts: {requests}")
+        assert requests == [("Anyone selling this? I need it by Friday", "Nosecut", "Toyota")]
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+from community_sync import apply_change, report_fraud
+from database import create_community_connection, create_tables
+from fraud_lookup import BloomFilter, FraudLookupService
+
+AGENT = "+254700000001"
+
+def main():
+    """
+    Checks that the fraud lookup finds reported numbers in any format, picks up only the
+    reports that changed since its last refresh, and gives the same answers with a Bloom filter.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        replica_path = os.path.join(temp_dir, "community_fraud.db")
+        conn = create_community_connection(replica_path)
+        create_tables(conn, is_community=True)
+        report_fraud(conn, AGENT, "+254722000000", "Took a deposit, no parts", "Alice", reported_at=1000)
+        # Written before numbers were normalized
+        conn.execute("INSERT INTO fraudulent_numbers (phone_number, reason) VALUES ('0733 000 000', 'Fake M-Pesa message')")
+        conn.commit()
+
+        print("--- First load ---")
+        lookup = FraudLookupService(replica_path)
+        notifications = []
+        lookup.add_listener(notifications.append)
+        print(f"Loaded: {lookup.refresh()}")
+        for number in ("0722000000", "+254 722 000 000", "+254733000000", "0744000000", None):
+            print(f"  {number!r}: {lookup.get_reason(number)!r}")
+        assert lookup.is_fraudulent("0722 000 000") and lookup.is_fraudulent("254733000000")
+        assert not lookup.is_fraudulent("0744000000") and not lookup.is_fraudulent(None)
+        assert len(notifications) == 1 and len(notifications[0]) == 2
+
+        print("\n--- Incremental refresh ---")
+        assert lookup.refresh() == [] and len(notifications) == 1
+        report_fraud(conn, AGENT, "+254744000000", "Ghost seller", "Bob", reported_at=3000)
+        # A report merged late from another agent, older than everything already loaded
+        with conn:
+            apply_change(conn, {"phone_number": "+254755000000", "reason": "Stolen phone", "reported_by": "Carol",
+                                "reported_at": 500, "agent": "carol"})
+            apply_change(conn, {"phone_number": "+254722000000", "reason": "Conman", "reported_by": "Dan",
+                                "reported_at": 4000, "agent": "dan"})
+        changes = lookup.refresh()
+        print(f"Changed since the last refresh: {changes}")
+        assert sorted(changes) == [("+254722000000", "Conman"), ("+254744000000", "Ghost seller"), ("+254755000000", "Stolen phone")]
+        assert notifications[-1] == changes
+        assert lookup.get_reason("0722000000") == "Conman" and lookup.is_fraudulent("0755000000")
+
+        print("\n--- Bloom filter ---")
+        bloom = BloomFilter(10000)
+        for i in range(10000):
+            bloom.add(f"+2547{i:08d}")
+        assert all(f"+2547{i:08d}" in bloom for i in range(10000))
+        false_positives = sum(f"+2541{i:08d}" in bloom for i in range(100000))
+        print(f"{bloom.size // 8} bytes for 10000 numbers, {false_positives} false positives in 100000")
+        assert false_positives < 300
+
+        large = FraudLookupService(replica_path, bloom_threshold=2)
+        large.refresh()
+        assert large.uses_bloom_filter
+        assert large.get_reason("0733000000") == "Fake M-Pesa message" and large.get_reason("0722000000") == "Conman"
+        assert not large.is_fraudulent("0766000000")
+        # Growing past what the filter was sized for rebuilds it
+        for i in range(5):
+            report_fraud(conn, AGENT, f"+25477700000{i}", "Ring of fake sellers", "Alice")
+        assert len(large.refresh()) == 5 and large.is_fraudulent("0777000004")
+        assert large._bloom.capacity >= 2 * 9
+        print("Answers match with the Bloom filter")
+
+        lookup.close()
+        large.close()
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
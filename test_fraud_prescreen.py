@@ -0,0 +1,62 @@
+import json
+import os
+
+from phone_numbers import find_kenyan_numbers, is_possible_fraud_report, normalize_kenyan_number
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "fraud_messages.json")
+
+NORMALIZATION_CASES = {
+    "0712345678": "+254712345678",
+    "0712 345 678": "+254712345678",
+    "0712-345-678": "+254712345678",
+    "+254712345678": "+254712345678",
+    "+254 712 345 678": "+254712345678",
+    "254712345678": "+254712345678",
+    "+254 (0)712 345 678": "+254712345678",
+    "0110 987 654": "+254110987654",
+    "712345678": "+254712345678",
+    "0812345678": None,
+    "12345": None,
+}
+
+def main():
+    """
+    Reports the precision and recall of the local fraud pre-screen on a labeled
+    fixture set, and how many Gemini calls it saves.
+    """
+    print("--- Phone number normalization ---")
+    for raw, expected in NORMALIZATION_CASES.items():
+        normalized = normalize_kenyan_number(raw)
+        print(f"  '{raw}' -> {normalized}")
+        assert normalized == expected, f"Expected {expected}"
+    assert find_kenyan_numbers("Call 0712 345 678 or +254712345678, paybill 247247") == ["+254712345678"]
+
+    with open(FIXTURE_PATH, encoding="utf-8") as f:
+        messages = json.load(f)
+
+    true_positives = false_positives = false_negatives = 0
+    print("\n--- Misclassified messages ---")
+    for message in messages:
+        predicted = is_possible_fraud_report(message["text"])
+        if predicted and message["is_fraud_report"]:
+            true_positives += 1
+        elif predicted:
+            false_positives += 1
+            print(f"  False positive: \"{message['text']}\"")
+        elif message["is_fraud_report"]:
+            false_negatives += 1
+            print(f"  False negative: \"{message['text']}\"")
+
+    precision = true_positives / (true_positives + false_positives)
+    recall = true_positives / (true_positives + false_negatives)
+    sent = true_positives + false_positives
+    print("\n--- Results ---")
+    print(f"Messages: {len(messages)} ({true_positives + false_negatives} fraud reports)")
+    print(f"Precision: {precision:.2f}")
+    print(f"Recall: {recall:.2f}")
+    print(f"Sent to Gemini: {sent} of {len(messages)} messages ({len(messages) / sent:.1f}x fewer)")
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+
+from community_sync import report_fraud
+from database import create_community_connection, create_tables, get_pipeline_state
+from enrichment import enrich_new_messages
+from fake_gemini import FakeGeminiModel
+from fraud_reports import FRAUD_CHUNK_SIZE, FRAUD_STATE_KEY, report_new_fraud
+from gemini_processor import GeminiExecutor, set_executor
+from llm_cache import set_cache
+from token_usage import set_token_usage
+from whatsapp_scraper import save_messages
+
+AGENT = "+254700000001"
+
+def main():
+    """
+    Checks that the fraud reports enrichment found reach the community list without more
+    Gemini calls, that the progress survives a restart, and that a reason given by a person
+    is never replaced.
+    """
+    # Count the calls a fresh run makes, without the LLM cache answering repeats
+    set_cache(None)
+    set_token_usage(None)
+    set_executor(GeminiExecutor(requests_per_minute=None))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = sqlite3.connect(os.path.join(temp_dir, "sales_agent.db"))
+        create_tables(conn)
+        community_conn = create_community_connection(os.path.join(temp_dir, "community_fraud.db"))
+        create_tables(community_conn, is_community=True)
+
+        records = [("Group A", f"+2547110000{i:02d}", f"Selling Premio radiator, lot {i}", f"10:{i % 60:02d}, 1/9/2024", None, 0, None, None)
+                   for i in range(2 * FRAUD_CHUNK_SIZE)]
+        records[10] = ("Group A", "+254711000100", "Beware 0722 000 000 is a conman, took my deposit", "10:10, 1/9/2024", None, 0, None, None)
+        records[150] = ("Group A", "+254711000101", "Scam alert: 0733000000 sends fake M-Pesa messages", "11:30, 1/9/2024", None, 0, None, None)
+        save_messages(conn, records)
+        conn.commit()
+        # Already reported by hand, with the agent's own reason
+        report_fraud(community_conn, AGENT, "+254733000000", "Fake M-Pesa, confirmed by phone", AGENT)
+
+        print("--- Before enrichment ---")
+        model = FakeGeminiModel()
+        assert report_new_fraud(conn, community_conn, model, AGENT) == [] and model.calls == 0
+        assert get_pipeline_state(conn, FRAUD_STATE_KEY) is None
+        print("Messages are only read once they have been enriched")
+
+        print("\n--- First run ---")
+        enrich_new_messages(conn, FakeGeminiModel())
+        model = FakeGeminiModel()
+        added = report_new_fraud(conn, community_conn, model, AGENT)
+        print(f"Added {added} with {model.calls} Gemini call(s)")
+        assert added == ["+254722000000"]
+        # The reports come from the enrichment results; nothing is sent to Gemini again
+        assert model.calls == 0
+        assert int(get_pipeline_state(conn, FRAUD_STATE_KEY)) == len(records)
+        reports = dict(community_conn.execute("SELECT phone_number, reported_by FROM fraudulent_numbers"))
+        print(f"Community list: {reports}")
+        assert reports == {"+254722000000": "AI (+254711000100)", "+254733000000": AGENT}
+        assert community_conn.execute("SELECT COUNT(*) FROM pending_changes").fetchone()[0] == 2
+
+        print("\n--- After a restart ---")
+        assert report_new_fraud(conn, community_conn, model, AGENT) == [] and model.calls == 0
+        save_messages(conn, [
+            ("Group A", "+254711000102", "Don't trust 0744000000, thief", "12:00, 1/9/2024", None, 0, None, None),
+            ("Group A", "+254711000103", "Beware 0755000000 is a conman __FAIL__", "12:01, 1/9/2024", None, 0, None, None),
+            ("Group A", "+254711000104", "Selling Premio radiator __FAIL__", "12:02, 1/9/2024", None, 0, None, None),
+        ])
+        conn.commit()
+        enrich_new_messages(conn, FakeGeminiModel())
+        # Messages whose triage failed are checked again, if they pass the pre-screen
+        model = FakeGeminiModel(fail_on="__NEVER__")
+        assert report_new_fraud(conn, community_conn, model, AGENT) == ["+254744000000", "+254755000000"]
+        assert model.calls == 1
+        print("Only messages that arrived since the last run are checked, and failed triages again")
+
+        print("\n--- Stopping ---")
+        conn.execute("DELETE FROM pipeline_state WHERE name = ?", (FRAUD_STATE_KEY,))
+        conn.commit()
+        assert report_new_fraud(conn, community_conn, model, AGENT, should_continue=lambda: False) == []
+        assert get_pipeline_state(conn, FRAUD_STATE_KEY) is None
+
+        conn.close()
+        community_conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import time
+
+from fake_gemini import FakeGeminiModel
+from gemini_processor import GeminiExecutor, _is_retryable, analyze_messages_with_gemini, set_executor
+from llm_cache import set_cache
+from token_usage import set_token_usage
+
+class RateLimitError(Exception):
+    """Mimics google.api_core.exceptions.ResourceExhausted, which carries the HTTP status in `code`."""
+    code = 429
+
+class FlakyModel(FakeGeminiModel):
+    """Fails the first `failures` calls with a 429 error, then behaves like FakeGeminiModel."""
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def generate_content(self, prompt, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            self.calls += 1
+            raise RateLimitError("429 Resource has been exhausted (e.g. check quota).")
+        return super().generate_content(prompt, **kwargs)
+
+MESSAGES = [f"I need a bumper for a Toyota, request {i}" for i in range(160)]
+
+def main():
+    """
+    Checks the shared Gemini executor offline: concurrency, rate limiting and retries.
+    """
+    set_cache(None)
+    set_token_usage(None)
+
+    print("--- Concurrency (8 batches, 0.2s per call) ---")
+    for workers in [1, 4]:
+        set_executor(GeminiExecutor(max_workers=workers, requests_per_minute=None))
+        model = FakeGeminiModel(latency=0.2)
+        started = time.perf_counter()
+        results = analyze_messages_with_gemini(model, MESSAGES)
+        elapsed = time.perf_counter() - started
+        assert all(result is not None for result in results)
+        print(f"{workers} worker(s): {model.calls} calls in {elapsed:.2f}s")
+
+    print("\n--- Rate limiting (120 requests per minute) ---")
+    set_executor(GeminiExecutor(max_workers=4, requests_per_minute=120))
+    model = FakeGeminiModel()
+    started = time.perf_counter()
+    analyze_messages_with_gemini(model, MESSAGES, batch_size=20)
+    elapsed = time.perf_counter() - started
+    # 4 calls fit in the initial burst, the other 4 have to wait 0.5s each
+    print(f"{model.calls} calls in {elapsed:.2f}s")
+    assert elapsed >= 1.5
+
+    print("\n--- Retry on 429 ---")
+    executor = GeminiExecutor(max_workers=1, requests_per_minute=None, base_delay=0.05)
+    set_executor(executor)
+    model = FlakyModel(failures=2)
+    results = analyze_messages_with_gemini(model, MESSAGES[:5])
+    print(f"Calls including retries: {model.calls}, all results present: {all(results)}")
+    assert model.calls == 3 and all(results)
+
+    print("\n--- Deadline ---")
+    model = FlakyModel(failures=100)
+    started = time.perf_counter()
+    try:
+        executor.generate(model, "prompt", deadline=time.monotonic() + 0.5)
+    except RateLimitError:
+        print(f"Gave up after {model.calls} attempts and {time.perf_counter() - started:.2f}s")
+
+    print("\n--- Retryable errors ---")
+    assert _is_retryable(RuntimeError("503 The service is currently unavailable."))
+    assert _is_retryable(RuntimeError("Resource has been exhausted (e.g. check quota)."))
+    # Numbers that only contain a status code are not one
+    assert not _is_retryable(ValueError("400 INVALID_ARGUMENT: the prompt is over the 5000 tokens limit"))
+    assert not _is_retryable(ValueError("Message 14290 could not be parsed"))
+    print("Only whole status codes are retried")
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import re
+import time
+
+from whatsapp_navigation import MIN_STRATEGY_TRIALS, GroupNavigator, chat_title_selector
+
+class FakeHandle:
+    def __init__(self, page, group_name):
+        self.page = page
+        self.group_name = group_name
+
+    def evaluate(self, script, group_name):
+        # Handles go stale when the chat list re-renders
+        return self.page.list_version == 0 and self.group_name == group_name
+
+    def click(self):
+        self.page.open_chat = self.group_name
+
+def css_unescape(text):
+    """Reads a quoted CSS string's contents the way a browser does: \\<hex> is a code point, \\<char> the char."""
+    return re.sub(r'\\([0-9a-fA-F]{1,6}) ?|\\(.)',
+                  lambda match: chr(int(match.group(1), 16)) if match.group(1) else match.group(2), text, flags=re.DOTALL)
+
+class FakePage:
+    """Just enough of a Playwright page for GroupNavigator: chats open instantly."""
+    def __init__(self, chats=()):
+        self.chats = list(chats)
+        self.open_chat = None
+        self.list_version = 0
+
+    def wait_for_selector(self, selector, timeout=None):
+        pass
+
+    def wait_for_function(self, script, arg=None, timeout=None):
+        if self.open_chat != arg[2]:
+            raise TimeoutError("chat did not open")
+
+    def query_selector(self, selector):
+        # Matches [title="..."] like a browser: the CSS string must equal a chat's title exactly
+        match = re.search(r'\[title="((?:[^"\\]|\\.)*)"\]', selector, re.DOTALL)
+        title = css_unescape(match.group(1))
+        return FakeHandle(self, title) if title in self.chats else None
+
+def slow_scroll(page, group_name, should_continue=lambda: True):
+    time.sleep(0.05)
+    page.open_chat = group_name
+    return True
+
+def broken_search(page, group_name, should_continue=lambda: True):
+    # The search field selector no longer matches in this WhatsApp build
+    raise Exception("search box not found")
+
+def fast_search(page, group_name, should_continue=lambda: True):
+    time.sleep(0.01)
+    page.open_chat = group_name
+    return True
+
+GROUPS = [f"Spares group {i}" for i in range(6)] + ["Magari 🚗 Kenya", 'Vipuri "Original" Ñairobi \\ Mombasa']
+
+def main():
+    """
+    Checks offline that chat titles are selected exactly, including names with emoji and
+    accents, and that the navigator falls back when a strategy fails, prefers the strategy
+    that works, reuses cached handles, and drops stale ones.
+    """
+    print("--- Selecting a chat by its title ---")
+    page = FakePage(GROUPS)
+    for group_name in GROUPS:
+        selector = chat_title_selector(group_name)
+        print(f"  {selector}")
+        assert page.query_selector(selector).group_name == group_name
+    assert page.query_selector(chat_title_selector("Magari Kenya")) is None
+
+    print("\n--- Search broken, scrolling works ---")
+    navigator = GroupNavigator(page, {"search": broken_search, "scroll": slow_scroll})
+    for group_name in GROUPS:
+        assert navigator.open_group(group_name)
+    for row in navigator.metrics():
+        print(row)
+    stats = navigator.stats
+    assert stats["search"].attempts == MIN_STRATEGY_TRIALS and stats["search"].successes == 0
+    assert stats["scroll"].successes == len(GROUPS)
+    assert navigator.ranked_strategies()[0] == "scroll"
+    # Names with emoji, accents and quotes are found in the chat list too
+    assert set(navigator.handles) == set(GROUPS)
+
+    print("\n--- Second round: cached handles ---")
+    for group_name in GROUPS:
+        assert navigator.open_group(group_name)
+    print(navigator.metrics()[0])
+    assert stats["cached_handle"].successes == len(GROUPS)
+
+    print("\n--- Stale handles after the chat list re-rendered ---")
+    page.list_version = 1
+    assert navigator.open_group(GROUPS[0])
+    print(navigator.metrics()[0])
+    assert stats["cached_handle"].attempts == len(GROUPS) + 1
+
+    print("\n--- Both strategies work: the faster one wins ---")
+    navigator = GroupNavigator(FakePage(GROUPS), {"scroll": slow_scroll, "search": fast_search})
+    for group_name in GROUPS:
+        navigator.handles.clear()
+        navigator.open_group(group_name)
+    for row in navigator.metrics():
+        print(row)
+    assert navigator.ranked_strategies()[0] == "search"
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+from group_scheduler import DEFAULT_VISIT_INTERVAL, MAX_VISIT_INTERVAL, GroupScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+# New messages per minute in each simulated group.
+GROUP_RATES = {"Busy Spares": 12, "Nairobi Parts": 2, "Quiet Group": 0}
+SIMULATED_SECONDS = 2 * 60 * 60
+VISIT_DURATION = 3
+
+def simulate(scheduler, clock, pick_next):
+    """Runs the groups for SIMULATED_SECONDS. Returns {group: [delays between message and visit]}."""
+    last_visit = {name: 0.0 for name in GROUP_RATES}
+    delays = {name: [] for name in GROUP_RATES}
+    while clock.now < SIMULATED_SECONDS:
+        group_name = pick_next()
+        if group_name is None:
+            clock.now += scheduler.seconds_until_next_due()
+            continue
+        clock.now += VISIT_DURATION
+        waited = clock.now - last_visit[group_name]
+        new_rows = int(GROUP_RATES[group_name] * waited / 60)
+        # On average a message waits half the time since the last visit
+        delays[group_name].extend([waited / 2] * new_rows)
+        last_visit[group_name] = clock.now
+        scheduler.record_visit(group_name, new_rows, 0, VISIT_DURATION)
+    return delays
+
+def main():
+    """
+    Simulates two hours of three groups with different message rates, and compares the
+    adaptive scheduler with the old round robin (every group, 10s apart, 60s between cycles).
+    """
+    clock = FakeClock()
+    scheduler = GroupScheduler(clock=clock)
+    scheduler.sync_groups(list(GROUP_RATES))
+    adaptive = simulate(scheduler, clock, scheduler.next_group)
+
+    stats = scheduler.stats
+    print("--- Adaptive scheduler ---")
+    for row in scheduler.metrics():
+        print(f"{row['group_name']}: {row['visits']} visits, {row['messages_per_minute']}/min, "
+              f"every {row['visit_interval_s']}s")
+    assert scheduler.metrics()[0]["group_name"] == "Busy Spares"
+    assert stats["Busy Spares"].interval < DEFAULT_VISIT_INTERVAL
+    assert stats["Quiet Group"].interval == MAX_VISIT_INTERVAL
+    assert stats["Busy Spares"].visits > stats["Nairobi Parts"].visits > stats["Quiet Group"].visits
+
+    # The old loop: visit every group in order, 10s between groups, 60s between cycles
+    clock = FakeClock()
+    round_robin_scheduler = GroupScheduler(clock=clock)
+    order = []
+    def round_robin():
+        if not order:
+            order.extend(GROUP_RATES)
+            clock.now += 60
+        clock.now += 10
+        return order.pop(0)
+    round_robin_delays = simulate(round_robin_scheduler, clock, round_robin)
+
+    print("\n--- Average delay from message to visit ---")
+    for name in GROUP_RATES:
+        if adaptive[name]:
+            before = sum(round_robin_delays[name]) / len(round_robin_delays[name])
+            after = sum(adaptive[name]) / len(adaptive[name])
+            print(f"{name}: round robin {before:.0f}s, adaptive {after:.0f}s")
+    all_before = sum(map(sum, round_robin_delays.values())) / sum(map(len, round_robin_delays.values()))
+    all_after = sum(map(sum, adaptive.values())) / sum(map(len, adaptive.values()))
+    print(f"All messages: round robin {all_before:.0f}s, adaptive {all_after:.0f}s")
+    assert all_after < all_before
+
+    print("\n--- Metrics export ---")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "group_metrics.csv")
+        scheduler.export_metrics(path)
+        with open(path, encoding="utf-8") as metrics_file:
+            print(metrics_file.read())
+
+    print("--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+from fake_gemini import FakeGeminiModel
+from gemini_processor import (
+    TRIAGE_PROMPT_VERSION,
+    GeminiExecutor,
+    analyze_messages_with_gemini,
+    classify_message_types,
+    detect_fraud_report_with_gemini,
+    set_executor,
+)
+from llm_cache import LLMCache, set_cache
+from token_usage import set_token_usage
+
+SAMPLE_MESSAGES = [
+    "Hi can i get nosecut for toyato belta?",
+    "I have a bumper for sale, 15000ksh",
+    "Good morning everyone",
+    "Looking for side mirror for Honda Fit",
+]
+
+def main():
+    """
+    Simulates two app startups against the same cache file and checks that the
+    second one is answered entirely from the cache.
+    """
+    set_executor(GeminiExecutor(requests_per_minute=None))
+    set_token_usage(None)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "llm_cache.db")
+
+        print("--- First startup (cold cache) ---")
+        cache = LLMCache(db_path)
+        set_cache(cache)
+        model = FakeGeminiModel()
+        first = analyze_messages_with_gemini(model, SAMPLE_MESSAGES)
+        classify_message_types(model, SAMPLE_MESSAGES)
+        print(f"Gemini calls: {model.calls}")
+        cache.close()
+
+        print("\n--- Second startup (warm cache) ---")
+        cache = LLMCache(db_path)
+        set_cache(cache)
+        model = FakeGeminiModel()
+        # Whitespace and case differences should still hit the cache
+        second = analyze_messages_with_gemini(model, [f"  {text.upper()} " for text in SAMPLE_MESSAGES])
+        classify_message_types(model, SAMPLE_MESSAGES)
+        print(f"Gemini calls: {model.calls}")
+        print(f"Cache stats: {cache.stats()}")
+        assert model.calls == 0, "Expected every result to come from the cache."
+        assert first == second, "Cached results differ from the original results."
+        cache.close()
+
+        print("\n--- Size eviction ---")
+        cache = LLMCache(os.path.join(temp_dir, "small_cache.db"), max_entries=2)
+        set_cache(cache)
+        analyze_messages_with_gemini(FakeGeminiModel(), SAMPLE_MESSAGES)
+        print(f"Entries after storing {len(SAMPLE_MESSAGES)} results with max_entries=2: {cache.stats()['entries']}")
+        assert cache.stats()["entries"] == 2
+        cache.close()
+
+        print("\n--- Fraud verdicts are cached, including negative ones ---")
+        cache = LLMCache(os.path.join(temp_dir, "fraud_cache.db"))
+        set_cache(cache)
+        message = "0712345678 thank you for the part, no scam here"
+        cache.set("triage", TRIAGE_PROMPT_VERSION, "models/fake-gemini", message,
+                  {"classification": "OTHER", "extraction": {"product": "N/A"}, "fraud_report": None})
+        model = FakeGeminiModel()
+        print(f"Negative verdict from cache: {detect_fraud_report_with_gemini(model, message)}")
+        assert detect_fraud_report_with_gemini(model, message) is None and model.calls == 0
+        cache.close()
+
+    set_cache(None)
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
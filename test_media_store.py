@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import tempfile
+
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice
+from PyQt6.QtGui import QColor, QImage
+
+from database import create_tables
+from media_store import THUMBNAIL_SIZE, MediaStore, get_thumbnail, migrate_picture_blobs
+from whatsapp_scraper import save_messages
+
+def make_png(width, height, color):
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    image.fill(QColor(color))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(data)
+
+def main():
+    """
+    Stores the same forwarded picture from three groups plus one other picture, and checks
+    that the original is written once, thumbnails are small, and old inline blobs migrate.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = MediaStore(os.path.join(temp_dir, "media"))
+        conn = sqlite3.connect(os.path.join(temp_dir, "sales_agent.db"))
+        create_tables(conn)
+
+        bumper = make_png(800, 600, "red")
+        headlight = make_png(400, 900, "blue")
+
+        print("--- Forwarded picture ---")
+        for group_name in ["Group A", "Group B", "Group C"]:
+            item = store.prepare(bumper)
+            record = (group_name, "Seller", "[Image Post]", "10:42, 3/7/2024", item.sha256, 0, None, None)
+            save_messages(conn, [record], media_items=[item])
+        item = store.prepare(headlight)
+        save_messages(conn, [("Group A", "Seller", "Headlight", "10:43, 3/7/2024", item.sha256, 0, None, None)], media_items=[item])
+
+        files = [name for _, _, names in os.walk(store.root) for name in names]
+        media_rows = conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+        messages = conn.execute("SELECT COUNT(*) FROM messages WHERE picture_hash IS NOT NULL").fetchone()[0]
+        print(f"{messages} messages with pictures, {media_rows} media rows, {len(files)} files")
+        assert messages == 4 and media_rows == 2 and len(files) == 2
+
+        print("\n--- Thumbnails ---")
+        for sha256, width, height in conn.execute("SELECT sha256, width, height FROM media"):
+            thumbnail = QImage.fromData(get_thumbnail(conn, sha256))
+            print(f"{width}x{height} -> {thumbnail.width()}x{thumbnail.height()}, {len(get_thumbnail(conn, sha256))} bytes")
+            assert max(thumbnail.width(), thumbnail.height()) == THUMBNAIL_SIZE
+        assert store.read(item.sha256) == headlight
+
+        print("\n--- Migrating inline blobs ---")
+        conn.execute("""
+            INSERT INTO messages (group_name, sender, message_text, timestamp, picture_blob)
+            VALUES ('Group D', 'Seller', 'Old post', '09:00, 1/7/2024', ?)
+        """, (bumper,))
+        conn.commit()
+        print(f"Migrated: {migrate_picture_blobs(conn, store)}")
+        assert conn.execute("SELECT COUNT(*) FROM messages WHERE picture_blob IS NOT NULL").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM media").fetchone()[0] == 2
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
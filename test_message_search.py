@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import tempfile
+
+from database import create_tables, set_pipeline_state
+from enrichment import ENRICHMENT_STATE_KEY
+from fake_gemini import FakeGeminiModel
+from gemini_processor import GeminiExecutor, set_executor
+from llm_cache import set_cache
+from token_usage import set_token_usage
+from matching import match_new_buying_requests
+from message_search import build_catalog_query, build_match_query, search_messages
+from whatsapp_scraper import save_messages
+
+CATALOG = [
+    ("Nosecut", "Toyota", "Belta", "", 45000, "Complete"),
+    ("Headlight", "Nissan", "Note", "2012", 8000, "Left side"),
+    ("Back lights", "Mazda", "Demio", "2010", 6000, "Pair"),
+]
+
+MESSAGES = [
+    ("Natafuta nose cut ya belta", "BUYING_REQUEST"),
+    ("I need head lamps for a Nissan Note 2012", "BUYING_REQUEST"),
+    ("Looking for headlihgt nissan note", "BUYING_REQUEST"),
+    ("Anyone with tail lamps for mazda demio", "BUYING_REQUEST"),
+    ("Natafuta taa za mbele za Note", "BUYING_REQUEST"),
+    ("Looking for a mechanic in Nairobi", "BUYING_REQUEST"),
+    ("Need a radiator for Subaru Forester", "BUYING_REQUEST"),
+    ("Selling bumpers for Toyota Premio", "OTHER"),
+    # Misspelt past what the index can find
+    ("Hi can i get noscut for toyato belta?", "BUYING_REQUEST"),
+]
+MISSPELT = MESSAGES[-1][0]
+
+def main():
+    """
+    Checks that the full-text index follows inserts, edits and deletes, that searches find
+    other spellings of a part, and that matching only reads requests mentioning a catalog product.
+    """
+    set_cache(None)
+    set_token_usage(None)
+    set_executor(GeminiExecutor(requests_per_minute=None))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = sqlite3.connect(os.path.join(temp_dir, "sales_agent.db"))
+        create_tables(conn)
+        save_messages(conn, [
+            ("Spares KE", f"+2547000000{i:02d}", text, f"10:{i:02d}, 3/7/2024", None, 0, None, None)
+            for i, (text, _) in enumerate(MESSAGES)
+        ])
+
+        print("--- Search ---")
+        print(f"Query for 'headlights': {build_match_query('headlights')}")
+        cases = [
+            ("headlights", ["I need head lamps for a Nissan Note 2012", "Natafuta taa za mbele za Note"]),
+            ("nose-cut belta", ["Natafuta nose cut ya belta"]),
+            ("bumper premio", ["Selling bumpers for Toyota Premio"]),
+            ("taa za nyuma", ["Anyone with tail lamps for mazda demio"]),
+            ("the", []),
+        ]
+        for text, expected in cases:
+            hits = search_messages(conn, text)
+            print(f"{text!r}: {[hit['snippet'] for hit in hits]}")
+            assert sorted(MESSAGES[hit["id"] - 1][0] for hit in hits) == sorted(expected)
+        assert "[" in search_messages(conn, "mechanic")[0]["snippet"]
+
+        print("\n--- Keeping the index in sync ---")
+        conn.execute("UPDATE messages SET message_text = 'Looking for a welder' WHERE message_text LIKE '%mechanic%'")
+        conn.execute("DELETE FROM messages WHERE message_text LIKE '%radiator%'")
+        conn.commit()
+        assert not search_messages(conn, "mechanic") and search_messages(conn, "welder")
+        assert not search_messages(conn, "radiator")
+        print("Edited and deleted messages are re-indexed")
+
+        print("\n--- Catalog matching ---")
+        conn.executemany(
+            "INSERT INTO seller_catalog (product, make, type, year, price_ksh, other_details) VALUES (?, ?, ?, ?, ?, ?)", CATALOG
+        )
+        conn.executemany(
+            "INSERT INTO message_enrichment (message_id, classification) SELECT id, ? FROM messages WHERE message_text = ?",
+            [(classification, text) for text, classification in MESSAGES],
+        )
+        # The product enrichment extracted, spelt correctly
+        conn.execute("""
+            UPDATE message_enrichment SET product = 'Nosecut', make = 'Toyota', type = 'Belta'
+            WHERE message_id = (SELECT id FROM messages WHERE message_text = ?)
+        """, (MISSPELT,))
+        set_pipeline_state(conn, ENRICHMENT_STATE_KEY, len(MESSAGES))
+        conn.commit()
+        retrieved = [row[0] for row in conn.execute(
+            "SELECT m.message_text FROM messages m WHERE m.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?) ORDER BY m.id",
+            (build_catalog_query([{"product": product} for product, *_ in CATALOG]),),
+        )]
+        print("Retrieved for matching:")
+        for text in retrieved:
+            print(f"  {text}")
+        # A misspelt product is still found through its prefix; the welder request and the
+        # selling post are not candidates
+        assert retrieved == [text for text, _ in MESSAGES[:5]]
+
+        progress = []
+        found = match_new_buying_requests(conn, FakeGeminiModel(), on_progress=lambda done, total: progress.append(total))
+        print(f"Requests read by matching: {progress[-1]} of 7 buying requests; matches: {found}")
+        # The request the index misses is still read, through its extracted product
+        assert progress[-1] == 6
+        matched = [row[0] for row in conn.execute(
+            "SELECT cm.product FROM catalog_matches cm JOIN messages m ON m.id = cm.message_id WHERE m.message_text = ?",
+            (MISSPELT,),
+        )]
+        print(f"{MISSPELT!r} matched: {matched}")
+        assert matched == ["Nosecut"]
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+
+from PyQt6.QtGui import QColor, QImage
+
+from database import create_tables, set_pipeline_state
+from enrichment import ENRICHMENT_STATE_KEY
+from fraud_reports import FRAUD_STATE_KEY
+from matching import MATCH_STATE_KEY
+from media_store import MediaStore, encode_png
+from message_search import search_archives, search_messages
+from retention import RetentionPolicy, apply_retention, list_archives
+from whatsapp_scraper import save_messages
+
+NOW = datetime(2024, 9, 15, 12, 0).timestamp()
+
+def picture(color):
+    image = QImage(32, 32, QImage.Format.Format_RGB32)
+    image.fill(QColor(color))
+    return encode_png(image)
+
+def main():
+    """
+    Checks that expired messages move to monthly archives with their enrichment, matches and
+    pictures, stay searchable there, and that the main database is compacted.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = MediaStore(os.path.join(temp_dir, "media"))
+        archive_dir = os.path.join(temp_dir, "archive")
+        conn = sqlite3.connect(os.path.join(temp_dir, "sales_agent.db"))
+        create_tables(conn)
+
+        old_picture, shared_picture = store.prepare(picture("red")), store.prepare(picture("blue"))
+        records = []
+        for month in (5, 6, 9):
+            for day in range(1, 11):
+                text = f"Selling a Premio radiator, lot {month}-{day}" if day == 1 else f"Message {month}-{day} about spares"
+                picture_hash = old_picture.sha256 if (month, day) == (5, 1) else shared_picture.sha256 if day == 2 else None
+                records.append(("Group A", "+254700000001", text, f"10:00, {day}/{month}/2024", picture_hash, 0, None, None))
+        # A busy group that only keeps its newest rows
+        records += [("Group B", "+254700000002", f"Busy {i}", f"11:{i:02d}, 14/9/2024", None, 0, None, None) for i in range(30)]
+        save_messages(conn, records, media_items=[old_picture, shared_picture])
+        conn.execute("INSERT INTO message_enrichment (message_id, product) SELECT id, 'Radiator' FROM messages")
+        conn.execute("INSERT INTO catalog_matches (message_id, product) SELECT id, 'Radiator' FROM messages WHERE message_text LIKE '%radiator%'")
+        set_pipeline_state(conn, ENRICHMENT_STATE_KEY, 1000)
+        # Matching has not run since the catalog last changed; it does not hold retention back
+        set_pipeline_state(conn, MATCH_STATE_KEY, 0)
+        set_pipeline_state(conn, FRAUD_STATE_KEY, 0)
+        conn.commit()
+        policy = RetentionPolicy(max_age_days=60, max_rows_per_group=20)
+
+        print("--- Waiting for the fraud job ---")
+        # While the fraud job runs, messages it has not checked yet stay
+        assert apply_retention(conn, policy, archive_dir=archive_dir, store=store, now=NOW, wait_for_fraud=True) == 0
+        set_pipeline_state(conn, FRAUD_STATE_KEY, 1000)
+        conn.commit()
+        print("Nothing is archived before the fraud job has checked it")
+
+        print("\n--- Applying the policy ---")
+        expired = len(policy.expired_message_ids(conn, now=NOW))
+        archived = apply_retention(conn, policy, archive_dir=archive_dir, store=store, now=NOW, wait_for_fraud=True)
+        left = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        archives = [os.path.basename(path) for path in list_archives(archive_dir)]
+        print(f"Archived {archived} of {len(records)} messages into {archives}; {left} left")
+        # May and June are older than 60 days, and Group B keeps its newest 20 of 30
+        assert archived == expired == 20 + 10 and left == len(records) - 30
+        assert archives == ["messages-2024-05.db", "messages-2024-06.db", "messages-2024-09.db"]
+        orphaned = conn.execute("SELECT COUNT(*) FROM message_enrichment WHERE message_id NOT IN (SELECT id FROM messages)").fetchone()[0]
+        assert orphaned == 0 and conn.execute("SELECT COUNT(*) FROM catalog_matches").fetchone()[0] == 1
+
+        print("\n--- Pictures ---")
+        kept = {row[0] for row in conn.execute("SELECT sha256 FROM media")}
+        print(f"Pictures still in the main database: {len(kept)}")
+        # The shared picture is still shown by September's message, the old one went along
+        assert kept == {shared_picture.sha256}
+        assert not os.path.exists(store.path_for(old_picture.sha256))
+        assert os.path.exists(MediaStore(os.path.join(archive_dir, "media")).path_for(old_picture.sha256))
+
+        print("\n--- Searching the archives ---")
+        assert [hit["id"] for hit in search_messages(conn, "radiator")] == [21]
+        hits = search_archives(list_archives(archive_dir), "radiator")
+        for hit in hits:
+            print(f"  {os.path.basename(hit['archive'])}: {hit['snippet']}")
+        assert len(hits) == 2
+        may = sqlite3.connect(list_archives(archive_dir)[0])
+        assert may.execute("SELECT COUNT(*) FROM catalog_matches").fetchone()[0] == 1
+        assert may.execute("SELECT COUNT(*) FROM media").fetchone()[0] == 1
+        may.close()
+
+        print("\n--- Running again ---")
+        assert apply_retention(conn, policy, archive_dir=archive_dir, store=store, now=NOW) == 0
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        print(f"auto_vacuum mode: {auto_vacuum}, free pages left: {free_pages}")
+        assert auto_vacuum == 2 and free_pages == 0
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import re
+import sqlite3
+import tempfile
+
+from PyQt6.QtGui import QColor, QImage
+
+from database import create_tables, get_group_watermarks
+from media_store import MediaStore, encode_png
+from whatsapp_scraper import build_message_records, newest_watermark, save_messages, text_hash
+
+GROUP = "Spares KE"
+
+def picture(color):
+    image = QImage(32, 32, QImage.Format.Format_RGB32)
+    image.fill(QColor(color))
+    return encode_png(image)
+
+class FakeMessage:
+    """The rows a `row:has([data-id="..."])` locator finds, and the picture in them."""
+    def __init__(self, page, message_id):
+        self.page = page
+        self.message_id = message_id
+
+    def count(self):
+        return 1 if self.message_id in self.page.pictures else 0
+
+    def locator(self, selector):
+        return self
+
+    @property
+    def first(self):
+        return self
+
+    def screenshot(self):
+        if self.message_id in self.page.failing:
+            raise TimeoutError("image still loading")
+        return self.page.pictures[self.message_id]
+
+class FakePage:
+    """Just enough of a Playwright page to capture the pictures of message rows, by data-id."""
+    def __init__(self, pictures, failing=()):
+        self.pictures = pictures
+        self.failing = set(failing)
+
+    def locator(self, selector):
+        return FakeMessage(self, re.search(r'\[data-id="([^"]*)"\]', selector).group(1))
+
+def row(index, text, minute, has_image=False):
+    """A row as EXTRACT_MESSAGES_SCRIPT returns it."""
+    return {"index": index, "key": f'[data-id="msg-{index}"]', "text": text, "meta": f"[10:{minute:02d}, 3/7/2024] Seller: ", "is_reply": False,
+            "quoted_sender": None, "quoted_text": None, "has_image": has_image}
+
+def chat_rows():
+    """The open chat, as every pass reads it afresh."""
+    return [
+        row(0, "Selling a Premio nosecut", 0),
+        row(1, None, 1, has_image=True),
+        row(2, "Headlights, see photo", 2, has_image=True),
+        row(3, "Still available", 3),
+    ]
+
+def main():
+    """
+    Checks that the group watermark never moves past an image-only message whose picture
+    could not be captured, so the next pass stores it once the picture has loaded, and that
+    pictures are captured from the message they were read with.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = MediaStore(os.path.join(temp_dir, "media"))
+        conn = sqlite3.connect(os.path.join(temp_dir, "sales_agent.db"))
+        create_tables(conn)
+        pictures = {"msg-1": picture("red"), "msg-2": picture("blue")}
+        rows = chat_rows()
+
+        print("--- A picture fails to load ---")
+        page = FakePage(pictures, failing={"msg-1"})
+        records, media_items = build_message_records(page, GROUP, rows, media_store=store)
+        watermark = newest_watermark(rows)
+        new_rows = save_messages(conn, records, GROUP, watermark, media_items)
+        print(f"Stored {new_rows} of {len(rows)} rows; watermark: {watermark}")
+        assert new_rows == 3 and "[Image Post]" not in [record[2] for record in records]
+        # The watermark stays at the last row before the failed one
+        assert watermark == ("10:00, 3/7/2024", "Seller", text_hash("Selling a Premio nosecut"))
+
+        print("\n--- The next pass ---")
+        # The extraction script walks back to the watermark, so the failed row is read again
+        known = get_group_watermarks(conn)[GROUP]
+        assert known["text_hash"] == text_hash("Selling a Premio nosecut")
+        rows = chat_rows()[1:]
+        page = FakePage(pictures)
+        records, media_items = build_message_records(page, GROUP, rows, media_store=store)
+        watermark = newest_watermark(rows)
+        new_rows = save_messages(conn, records, GROUP, watermark, media_items)
+        print(f"Stored {new_rows} new row(s); watermark: {watermark}")
+        assert new_rows == 1 and watermark == ("10:03, 3/7/2024", "Seller", text_hash("Still available"))
+        stored = conn.execute("SELECT COUNT(*) FROM messages WHERE message_text = '[Image Post]' AND picture_hash IS NOT NULL").fetchone()[0]
+        assert stored == 1
+        print("The image-only message is stored once its picture loads")
+
+        print("\n--- Rows that changed since they were read ---")
+        # A new message shifted the rows: the picture still comes from the message that was read
+        shifted = {"msg-9": picture("green"), **pictures}
+        rows = [dict(row(0, None, 5, has_image=True), key='[data-id="msg-2"]')]
+        records, media_items = build_message_records(FakePage(shifted), "Other group", rows, media_store=store)
+        assert [item.sha256 for item in media_items] == [store.prepare(pictures["msg-2"]).sha256]
+        # A message that is no longer rendered is skipped, and read again on the next pass
+        rows = [dict(row(0, None, 6, has_image=True), key='[data-id="msg-7"]')]
+        records, media_items = build_message_records(FakePage(shifted), "Other group", rows, media_store=store)
+        assert records == [] and newest_watermark(rows) is None
+        print("Pictures are captured from the message they were read with, or not at all")
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+
+from database import MIGRATIONS, create_tables
+from timestamps import parse_whatsapp_timestamp
+from whatsapp_scraper import save_messages
+
+def epoch(*args):
+    return int(datetime(*args).timestamp())
+
+def main():
+    """
+    Checks that WhatsApp timestamps are parsed in the locale's date order, that old databases
+    are backfilled once, and that messages come back in time order instead of text order.
+    """
+    print("--- Parsing ---")
+    cases = [
+        ("10:42, 3/7/2024", "DMY", epoch(2024, 7, 3, 10, 42)),
+        ("10:42, 3/7/2024", "MDY", epoch(2024, 3, 7, 10, 42)),
+        ("9:05 pm, 7/3/24", "MDY", epoch(2024, 7, 3, 21, 5)),
+        ("12:15 AM, 25/12/2023", "DMY", epoch(2023, 12, 25, 0, 15)),
+        ("10:42, 2024-07-03", "DMY", epoch(2024, 7, 3, 10, 42)),
+        # 13/3 can only be 13 March, even with a US date order
+        ("08:00, 13/3/2024", "MDY", epoch(2024, 3, 13, 8, 0)),
+        ("[Image Post]", "DMY", None),
+        ("25:00, 3/7/2024", "DMY", None),
+    ]
+    for text, order, expected in cases:
+        result = parse_whatsapp_timestamp(text, order)
+        print(f"{text!r} ({order}) -> {result}")
+        assert result == expected, f"{text!r}: expected {expected}, got {result}"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print("\n--- Backfilling an older database ---")
+        db_path = os.path.join(temp_dir, "sales_agent.db")
+        conn = sqlite3.connect(db_path)
+        # A messages table from before the epoch column, already at the first migration
+        conn.execute("""
+            CREATE TABLE messages (
+                id INTEGER PRIMARY KEY, group_name TEXT NOT NULL, sender TEXT NOT NULL, message_text TEXT NOT NULL,
+                timestamp TEXT NOT NULL, picture_blob BLOB, is_reply INTEGER DEFAULT 0, replied_to_text TEXT,
+                replied_to_sender TEXT, picture_hash TEXT, UNIQUE(group_name, sender, message_text, timestamp)
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO messages (group_name, sender, message_text, timestamp) VALUES ('Group A', 'Seller', ?, ?)",
+            [("Morning", "9:30, 2/7/2024"), ("Late", "10:15, 1/7/2024"), ("Next day", "08:00, 10/7/2024")],
+        )
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        create_tables(conn)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        missing = conn.execute("SELECT COUNT(*) FROM messages WHERE timestamp_epoch IS NULL").fetchone()[0]
+        print(f"Schema version {version}, rows without an epoch: {missing}")
+        assert version == len(MIGRATIONS) and missing == 0
+
+        print("\n--- Ordering ---")
+        save_messages(conn, [("Group A", "Seller", "Evening", "7:45 pm, 2/7/2024", None, 0, None, None)])
+        lexical = [row[0] for row in conn.execute("SELECT message_text FROM messages ORDER BY timestamp DESC")]
+        by_epoch = [row[0] for row in conn.execute("SELECT message_text FROM messages ORDER BY timestamp_epoch DESC, id DESC")]
+        print(f"By text:  {lexical}")
+        print(f"By epoch: {by_epoch}")
+        assert by_epoch == ["Next day", "Evening", "Morning", "Late"]
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT message_text FROM messages ORDER BY timestamp_epoch DESC, id DESC LIMIT 50"
+        ))
+        print(f"Query plan: {plan}")
+        assert "idx_messages_timestamp_epoch" in plan
+        conn.close()
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+from fake_gemini import FakeGeminiModel
+from gemini_processor import GeminiExecutor, find_matches_in_catalog, set_executor, triage_messages
+from llm_cache import set_cache
+from prompts import PROMPTS
+from token_usage import TokenUsage, count_call_tokens, estimate_tokens, set_token_usage
+
+class UsageMetadata:
+    """Mimics the `usage_metadata` of a Gemini response."""
+    prompt_token_count = 120
+    candidates_token_count = 30
+
+class MeteredResponse:
+    text = "[]"
+    usage_metadata = UsageMetadata()
+
+def main():
+    """
+    Checks that every Gemini call is counted per function and per day, from the response's
+    usage metadata when there is some and estimated otherwise.
+    """
+    set_cache(None)
+    set_executor(GeminiExecutor(requests_per_minute=None))
+
+    print("--- Prompt registry ---")
+    for name, prompt in PROMPTS.items():
+        print(f"  {name}: {prompt.version}, ~{estimate_tokens(prompt.text)} tokens of instructions")
+    batch_prompt = PROMPTS["triage"].render(messages='[{"index":0,"text":"0712345678 is a conman"}]')
+    assert "0712345678 is a conman" in batch_prompt and "{" not in PROMPTS["triage"].version
+
+    print("\n--- Counting a call ---")
+    assert count_call_tokens("prompt", MeteredResponse()) == (120, 30, False)
+    estimated = count_call_tokens("x" * 400, FakeGeminiModel().generate_content("Hello"))
+    print(f"Without usage metadata: {estimated}")
+    assert estimated[0] == 100 and estimated[2]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "token_usage.db")
+        usage = TokenUsage(db_path)
+        set_token_usage(usage)
+
+        print("\n--- Counting a run ---")
+        model = FakeGeminiModel()
+        texts = [f"Looking for a bumper for Toyota Premio, lot {i}" for i in range(30)]
+        triage_messages(model, texts, batch_size=20)
+        catalog = [{"id": 1, "product": "Bumper", "make": "Toyota", "type": "Premio", "year": "2012", "price_ksh": 9000, "other_details": "N/A"}]
+        find_matches_in_catalog(model, texts[0], catalog)
+        today = usage.by_function()
+        for function, counters in today.items():
+            print(f"  {function}: {counters}")
+        assert today["triage"]["calls"] == 2 and today["matching"]["calls"] == 1
+        assert today["triage"]["estimated_calls"] == 2
+        assert today["triage"]["input_tokens"] > 0 and today["triage"]["output_tokens"] > 0
+        assert sum(counters["calls"] for counters in today.values()) == model.calls
+
+        print("\n--- Per day ---")
+        usage.record("matching", 120, 30, day="2024-09-14")
+        usage.close()
+        # The counters outlive the app
+        usage = TokenUsage(db_path)
+        days = usage.by_day()
+        for day, counters in days.items():
+            print(f"  {day}: {counters['calls']} calls, {counters['input_tokens']} in, "
+                  f"{counters['output_tokens']} out, ${counters['cost_usd']:.6f}")
+        assert list(days)[0] == "2024-09-14" and days["2024-09-14"]["calls"] == 1
+        assert usage.by_function(day="2024-09-14") == {"matching": days["2024-09-14"]}
+        usage.close()
+        set_token_usage(None)
+
+    print("\n--- Test Complete ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import re
+from datetime import datetime
+
+# Order of the day, month and year in the dates WhatsApp Web shows, which follows the browser's
+# locale: "DMY" for Kenya and the UK ("10:42, 3/7/2024" is 3 July), "MDY" for the US, "YMD" for ISO.
+DEFAULT_DATE_ORDER = "DMY"
+
+# "10:42, 3/7/2024", "9:05 pm, 7/3/24", "10:42, 2024-07-03", "10.42, 03.07.2024"
+TIMESTAMP_PATTERN = re.compile(
+    r'^\s*(\d{1,2})[:.](\d{2})(?:[:.](\d{2}))?\s*([ap]\.?\s?m\.?)?\s*,\s*'
+    r'(\d{1,4})[/.\-](\d{1,2})[/.\-](\d{1,4})\.?\s*$',
+    re.IGNORECASE,
+)
+
+def get_date_order():
+    """The date order from the WHATSAPP_DATE_ORDER environment variable, or DEFAULT_DATE_ORDER."""
+    order = os.getenv("WHATSAPP_DATE_ORDER", DEFAULT_DATE_ORDER).strip().upper()
+    return order if sorted(order) == ["D", "M", "Y"] else DEFAULT_DATE_ORDER
+
+def parse_whatsapp_timestamp(timestamp, date_order=None):
+    """
+    Converts a timestamp from a data-pre-plain-text prefix, such as "10:42, 3/7/2024",
+    to seconds since the epoch. WhatsApp shows local time, so it is read as local time.
+
+    Args:
+        timestamp: The raw timestamp text.
+        date_order: "DMY", "MDY" or "YMD". Defaults to get_date_order(). A four-digit first
+            field is always read as a year, and a day above 12 overrides the day/month order.
+
+    Returns:
+        The epoch as an int, or None if the text is not a timestamp.
+    """
+    match = TIMESTAMP_PATTERN.match(timestamp or "")
+    if not match:
+        return None
+    hour, minute, second, meridiem, first, second_field, third = match.groups()
+    hour, minute = int(hour), int(minute)
+    if meridiem:
+        is_pm = meridiem.lower().startswith("p")
+        hour = hour % 12 + (12 if is_pm else 0)
+
+    order = date_order or get_date_order()
+    if len(first) == 4:
+        order = "YMD"
+    fields = dict(zip(order, (int(first), int(second_field), int(third))))
+    day, month, year = fields["D"], fields["M"], fields["Y"]
+    # A "month" above 12 can only be the day, whatever the locale says
+    if month > 12 and day <= 12:
+        day, month = month, day
+    if year < 100:
+        year += 2000
+
+    try:
+        return int(datetime(year, month, day, hour, minute, int(second or 0)).timestamp())
+    except (ValueError, OverflowError):
+        return None
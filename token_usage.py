@@ -0,0 +1,142 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+TOKEN_USAGE_DB_PATH = 'token_usage.db'
+# US dollars per million tokens: gemini-1.5-flash prices for prompts up to 128k tokens.
+# Can be overridden with GEMINI_INPUT_PRICE / GEMINI_OUTPUT_PRICE in the .env file.
+DEFAULT_INPUT_PRICE_PER_MILLION = 0.075
+DEFAULT_OUTPUT_PRICE_PER_MILLION = 0.30
+# Average characters per token of English and Swahili text, for responses without usage metadata.
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Estimates the number of tokens in a text without calling the API."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def count_call_tokens(prompt, response):
+    """
+    Returns (input_tokens, output_tokens, estimated) for one Gemini call: the counts the API
+    reported in the response's usage metadata, or local estimates if it reported none.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "prompt_token_count", None):
+        return usage.prompt_token_count, getattr(usage, "candidates_token_count", 0) or 0, False
+    try:
+        response_text = response.text
+    except (AttributeError, ValueError):
+        # A blocked or empty response has no text
+        response_text = ""
+    return estimate_tokens(prompt), estimate_tokens(response_text), True
+
+def estimate_cost(input_tokens, output_tokens):
+    """Returns what the tokens cost in US dollars."""
+    input_price = float(os.getenv("GEMINI_INPUT_PRICE", DEFAULT_INPUT_PRICE_PER_MILLION))
+    output_price = float(os.getenv("GEMINI_OUTPUT_PRICE", DEFAULT_OUTPUT_PRICE_PER_MILLION))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+class TokenUsage:
+    """
+    Persistent counters of the Gemini calls and tokens used, per day and per function.
+    Shared by the GUI and the background threads, so every access goes through a lock.
+    """
+    def __init__(self, db_path=TOKEN_USAGE_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS token_usage (
+                day TEXT NOT NULL,
+                function TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                estimated_calls INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, function)
+            )
+        """)
+        self._conn.commit()
+
+    def record(self, function, input_tokens, output_tokens, estimated=False, day=None):
+        """Adds one call of `function` to the counters of `day` (a YYYY-MM-DD string, today by default)."""
+        day = day or time.strftime("%Y-%m-%d")
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO token_usage (day, function, calls, input_tokens, output_tokens, estimated_calls)
+                VALUES (?, ?, 1, ?, ?, ?)
+                ON CONFLICT(day, function) DO UPDATE SET
+                    calls = calls + 1,
+                    input_tokens = input_tokens + excluded.input_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens,
+                    estimated_calls = estimated_calls + excluded.estimated_calls
+            """, (day, function, input_tokens, output_tokens, 1 if estimated else 0))
+            self._conn.commit()
+
+    def by_function(self, day=None):
+        """
+        Returns the counters per function, for one day or for all days: a dictionary of
+        function -> {"calls", "input_tokens", "output_tokens", "estimated_calls", "cost_usd"}.
+        """
+        return self._totals("function", day)
+
+    def by_day(self):
+        """Returns the counters per day, like by_function, oldest day first."""
+        return self._totals("day")
+
+    def _totals(self, group_by, day=None):
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT {group_by}, SUM(calls), SUM(input_tokens), SUM(output_tokens), SUM(estimated_calls)
+                FROM token_usage
+                WHERE ? IS NULL OR day = ?
+                GROUP BY {group_by}
+                ORDER BY {group_by}
+            """, (day, day)).fetchall()
+        return {
+            key: {
+                "calls": calls,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "estimated_calls": estimated_calls,
+                "cost_usd": estimate_cost(input_tokens, output_tokens),
+            }
+            for key, calls, input_tokens, output_tokens, estimated_calls in rows
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_UNSET = object()
+_usage = _UNSET
+_usage_lock = threading.Lock()
+
+def get_token_usage():
+    """Returns the process-wide token counters, creating them on first use. Returns None if counting is disabled."""
+    global _usage
+    with _usage_lock:
+        if _usage is _UNSET:
+            try:
+                _usage = TokenUsage()
+            except sqlite3.Error as e:
+                print(f"Error opening the token usage counters, continuing without them: {e}")
+                _usage = None
+        return _usage
+
+def set_token_usage(usage):
+    """Replaces the process-wide token counters. Pass None to stop counting (e.g. in tests)."""
+    global _usage
+    with _usage_lock:
+        _usage = usage
+
+def record_call(function, prompt, response):
+    """Counts one successful Gemini call of `function`. Counting errors never fail the call."""
+    usage = get_token_usage()
+    if usage is None:
+        return
+    try:
+        usage.record(function, *count_call_tokens(prompt, response))
+    except sqlite3.Error as e:
+        print(f"Error counting the tokens of a {function} call: {e}")
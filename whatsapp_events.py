@@ -0,0 +1,128 @@
+import json
+import time
+
+from whatsapp_scraper import CHAT_LIST_SELECTOR, GROUP_HEADER_SELECTOR, MESSAGE_ROW_SELECTOR
+
+# The rows of the chat list on the left of WhatsApp Web, and the unread counter on a row.
+CHAT_LIST_ROW_SELECTOR = f'{CHAT_LIST_SELECTOR} [role="listitem"]'
+CHAT_TITLE_SELECTOR = 'span[title]'
+UNREAD_BADGE_SELECTOR = 'span[aria-label*="unread message"]'
+
+# In event-driven mode, every group is still scraped this often (in seconds), in case an event was missed.
+FULL_SWEEP_INTERVAL = 15 * 60
+
+# How long the page waits for the DOM to settle before reporting, in milliseconds.
+SCAN_DEBOUNCE_MS = 300
+
+# Installs one MutationObserver on the page. After every burst of DOM changes it reports
+#  - chat list rows whose unread counter went up, through window.salesAgentUnread([names]);
+#  - a new last message in the open chat, through window.salesAgentChatActivity(name).
+WATCH_CHAT_EVENTS_SCRIPT = """
+(config) => {
+    if (window.__salesAgentWatcher) return;
+    window.__salesAgentWatcher = true;
+    let unreadCounts = {};
+    let openChatSignature = null;
+    let scheduled = null;
+
+    const scan = () => {
+        scheduled = null;
+        const counts = {};
+        const increased = [];
+        document.querySelectorAll(config.chatListRowSelector).forEach((row) => {
+            const title = row.querySelector(config.chatTitleSelector);
+            const badge = row.querySelector(config.unreadBadgeSelector);
+            if (!title || !badge) return;
+            const name = title.getAttribute('title');
+            counts[name] = parseInt(badge.innerText, 10) || 1;
+            if (counts[name] > (unreadCounts[name] || 0)) increased.push(name);
+        });
+        unreadCounts = counts;
+        if (increased.length && window.salesAgentUnread) window.salesAgentUnread(increased);
+
+        const header = document.querySelector(config.headerSelector);
+        const rows = document.querySelectorAll(config.rowSelector);
+        if (!header || !rows.length) return;
+        const last = rows[rows.length - 1];
+        const meta = last.querySelector('div[data-pre-plain-text]');
+        const signature = [header.innerText, meta ? meta.getAttribute('data-pre-plain-text') : '', last.innerText].join('\\n');
+        if (signature !== openChatSignature) {
+            openChatSignature = signature;
+            if (window.salesAgentChatActivity) window.salesAgentChatActivity(header.innerText);
+        }
+    };
+
+    const start = () => {
+        new MutationObserver(() => {
+            if (!scheduled) scheduled = setTimeout(scan, config.debounceMs);
+        }).observe(document.body, {childList: true, subtree: true, characterData: true});
+        scan();
+    };
+    if (document.body) start();
+    else document.addEventListener('DOMContentLoaded', start);
+}
+"""
+
+class ChatEventWatcher:
+    """
+    Collects chat activity pushed from WhatsApp Web by an injected MutationObserver.
+
+    The callbacks only run while Playwright is dispatching events, i.e. during a call on
+    the page; wait_for_activity keeps the page busy with short waits so they arrive promptly.
+    """
+    def __init__(self, page):
+        self.page = page
+        # group name -> time.monotonic() of the first event not yet handled
+        self.unread_groups = {}
+        self.active_groups = {}
+
+    def install(self):
+        """Exposes the callbacks and starts the observer, now and after every reload."""
+        self.page.expose_function("salesAgentUnread", self._on_unread)
+        self.page.expose_function("salesAgentChatActivity", self._on_chat_activity)
+        config = {
+            "chatListRowSelector": CHAT_LIST_ROW_SELECTOR,
+            "chatTitleSelector": CHAT_TITLE_SELECTOR,
+            "unreadBadgeSelector": UNREAD_BADGE_SELECTOR,
+            "headerSelector": GROUP_HEADER_SELECTOR,
+            "rowSelector": MESSAGE_ROW_SELECTOR,
+            "debounceMs": SCAN_DEBOUNCE_MS,
+        }
+        script = f"({WATCH_CHAT_EVENTS_SCRIPT})({json.dumps(config)})"
+        self.page.add_init_script(script)
+        self.page.evaluate(script)
+
+    def _on_unread(self, group_names):
+        now = time.monotonic()
+        for group_name in group_names:
+            self.unread_groups.setdefault(group_name, now)
+
+    def _on_chat_activity(self, group_name):
+        self.active_groups.setdefault(group_name, time.monotonic())
+
+    def has_activity(self):
+        return bool(self.unread_groups or self.active_groups)
+
+    def take_activity(self):
+        """
+        Returns and clears the pending events.
+
+        Returns:
+            A tuple (unread, active) of {group_name: event time} dictionaries: groups in the chat
+            list with new unread messages, and the open chat if a new message appeared in it.
+        """
+        unread, active = self.unread_groups, self.active_groups
+        self.unread_groups, self.active_groups = {}, {}
+        return unread, active
+
+    def discard(self, group_name):
+        """Forgets events for a group that has just been scraped, e.g. the one caused by opening it."""
+        self.unread_groups.pop(group_name, None)
+        self.active_groups.pop(group_name, None)
+
+    def wait_for_activity(self, timeout, should_continue=lambda: True, poll_interval=0.25):
+        """Waits up to `timeout` seconds for an event. Returns True if there is one."""
+        deadline = time.monotonic() + timeout
+        while not self.has_activity() and should_continue() and time.monotonic() < deadline:
+            self.page.wait_for_timeout(poll_interval * 1000)
+        return self.has_activity()
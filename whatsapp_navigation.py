@@ -0,0 +1,236 @@
+import csv
+import re
+import time
+
+from whatsapp_scraper import APP_PANEL_SELECTOR, CHAT_LIST_SELECTOR, GROUP_HEADER_SELECTOR, MESSAGE_ROW_SELECTOR
+
+# The search field above the chat list.
+SEARCH_BOX_SELECTOR = '#side div[contenteditable="true"][role="textbox"]'
+# How many screens of the chat list the scroll strategy searches for a group.
+MAX_CHAT_LIST_SCROLLS = 10
+# How long the search results may take to show the group, in milliseconds.
+SEARCH_RESULT_TIMEOUT = 5000
+# How long an opened chat may take to show its header and messages, in milliseconds.
+CHAT_READY_TIMEOUT = 15000
+# Every strategy is tried this many times before the navigator relies on its statistics.
+MIN_STRATEGY_TRIALS = 3
+
+NAVIGATION_METRICS_PATH = "navigation_metrics.csv"
+NAVIGATION_METRICS_FIELDS = ["strategy", "attempts", "successes", "success_rate", "avg_latency_s"]
+
+# Resolves after the browser has rendered the next frame, i.e. after a scroll has been laid out.
+NEXT_FRAME_SCRIPT = "() => new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)))"
+
+# True once the header shows the given group and its message rows are in the DOM.
+CHAT_READY_SCRIPT = """
+([headerSelector, rowSelector, groupName]) => {
+    const header = document.querySelector(headerSelector);
+    return !!header && header.innerText === groupName && !!document.querySelector(rowSelector);
+}
+"""
+
+# True if a cached chat list element is still attached and still shows the given group;
+# the chat list is virtualized and reuses its nodes for other chats.
+HANDLE_VALID_SCRIPT = "(element, groupName) => element.isConnected && element.getAttribute('title') === groupName"
+
+def css_string(value):
+    """
+    Quotes a value as a CSS string. Unlike JSON, CSS has no \\uXXXX escapes, so emoji and
+    accented letters (common in group names) are kept as they are.
+    """
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    escaped = re.sub(r'[\x00-\x1f\x7f]', lambda match: f"\\{ord(match.group()):x} ", escaped)
+    return f'"{escaped}"'
+
+def chat_title_selector(group_name):
+    """Selects the chat list entry whose title is exactly `group_name`."""
+    return f'{CHAT_LIST_SELECTOR} span[title={css_string(group_name)}]'
+
+def wait_for_chat_ready(page, group_name, timeout=CHAT_READY_TIMEOUT):
+    """Waits until the open chat is `group_name` and its messages have rendered."""
+    page.wait_for_function(CHAT_READY_SCRIPT, arg=[GROUP_HEADER_SELECTOR, MESSAGE_ROW_SELECTOR, group_name], timeout=timeout)
+
+def _scroll_chat_list(page, to_top=False):
+    """Scrolls the chat list to the top or one screen down. Returns False at the end of the list."""
+    moved = page.eval_on_selector(CHAT_LIST_SELECTOR, """(pane, toTop) => {
+        const before = pane.scrollTop;
+        pane.scrollTop = toTop ? 0 : before + pane.clientHeight;
+        return pane.scrollTop !== before;
+    }""", to_top)
+    # The list is virtualized: wait for the rows that scrolled into view to render
+    page.evaluate(NEXT_FRAME_SCRIPT)
+    return moved
+
+def open_by_scrolling(page, group_name, should_continue=lambda: True):
+    """
+    Pages through the chat list until the group's title shows up and clicks it.
+
+    Returns:
+        True once the group was clicked, False if `should_continue` stopped the search.
+
+    Raises:
+        Exception: If the group is not found.
+    """
+    chat = page.locator(chat_title_selector(group_name))
+    if not chat.count():
+        _scroll_chat_list(page, to_top=True)
+    for _ in range(MAX_CHAT_LIST_SCROLLS):
+        if not should_continue():
+            return False
+        if chat.count():
+            chat.first.click()
+            return True
+        if not _scroll_chat_list(page):
+            break
+    raise Exception(f"Group '{group_name}' not found in chat list.")
+
+def open_by_search(page, group_name, should_continue=lambda: True):
+    """
+    Types the group name into the chat search field and clicks the result with exactly that title.
+
+    Raises:
+        Exception: If no result has exactly that title.
+    """
+    search_box = page.locator(SEARCH_BOX_SELECTOR).first
+    search_box.click()
+    search_box.fill(group_name)
+    try:
+        result = page.locator(chat_title_selector(group_name)).first
+        result.wait_for(timeout=SEARCH_RESULT_TIMEOUT)
+        result.click()
+    finally:
+        # Clear the search so the chat list (and its unread badges) is back
+        search_box.fill("")
+    return True
+
+# Strategies in order of preference while there are no statistics yet.
+NAVIGATION_STRATEGIES = {
+    "search": open_by_search,
+    "scroll": open_by_scrolling,
+}
+
+class StrategyStats:
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.total_latency = 0.0
+
+    @property
+    def success_rate(self):
+        return self.successes / self.attempts if self.attempts else 0.0
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.successes if self.successes else float("inf")
+
+class GroupNavigator:
+    """
+    Opens WhatsApp groups for the session, picking the navigation strategy that works best.
+
+    The chat list element of every group that was opened is cached and clicked directly next
+    time, as long as it still shows that group. Otherwise the strategies are tried, best
+    success rate first and then fastest, falling back to the next one when a strategy fails.
+    Latency and success are recorded per strategy, including the cached handles.
+    """
+    def __init__(self, page, strategies=None, metrics_path=NAVIGATION_METRICS_PATH):
+        self.page = page
+        self.metrics_path = metrics_path
+        self.strategies = dict(strategies or NAVIGATION_STRATEGIES)
+        self.stats = {name: StrategyStats() for name in ["cached_handle", *self.strategies]}
+        self.handles = {}
+
+    def ranked_strategies(self):
+        """Strategy names, untried ones first (in preference order), then by success rate and latency."""
+        def rank(item):
+            position, name = item
+            stats = self.stats[name]
+            if stats.attempts < MIN_STRATEGY_TRIALS:
+                return (0, position, 0, 0)
+            return (1, -stats.success_rate, stats.average_latency, position)
+        return [name for _, name in sorted(enumerate(self.strategies), key=rank)]
+
+    def open_group(self, group_name, should_continue=lambda: True):
+        """
+        Opens a group and waits for its chat to render.
+
+        Returns:
+            True once the group is open, False if `should_continue` stopped the navigation.
+
+        Raises:
+            Exception: If no strategy could open the group.
+        """
+        self.page.wait_for_selector(APP_PANEL_SELECTOR, timeout=30000)
+
+        handle = self.handles.get(group_name)
+        if handle is not None:
+            if self._attempt("cached_handle", group_name, lambda: self._click_handle(handle, group_name)):
+                return True
+            self.handles.pop(group_name, None)
+
+        errors = []
+        for name in self.ranked_strategies():
+            if not should_continue():
+                return False
+            strategy = self.strategies[name]
+            try:
+                if self._attempt(name, group_name, lambda: strategy(self.page, group_name, should_continue), errors):
+                    self._remember(group_name)
+                    return True
+            except _Cancelled:
+                return False
+        raise Exception(f"Could not open group '{group_name}': " + "; ".join(errors))
+
+    def _attempt(self, name, group_name, open_chat, errors=None):
+        """Runs one strategy and records its outcome. Returns True if the chat is open and ready."""
+        started = time.monotonic()
+        try:
+            if not open_chat():
+                raise _Cancelled()
+            wait_for_chat_ready(self.page, group_name)
+        except _Cancelled:
+            raise
+        except Exception as e:
+            self.stats[name].attempts += 1
+            if errors is not None:
+                errors.append(f"{name}: {e}")
+            print(f"Navigation strategy '{name}' failed for '{group_name}': {e}")
+            return False
+        stats = self.stats[name]
+        stats.attempts += 1
+        stats.successes += 1
+        stats.total_latency += time.monotonic() - started
+        return True
+
+    def _click_handle(self, handle, group_name):
+        if not handle.evaluate(HANDLE_VALID_SCRIPT, group_name):
+            raise Exception("cached element no longer shows this group")
+        handle.click()
+        return True
+
+    def _remember(self, group_name):
+        handle = self.page.query_selector(chat_title_selector(group_name))
+        if handle is not None:
+            self.handles[group_name] = handle
+
+    def metrics(self):
+        """Returns one dictionary of NAVIGATION_METRICS_FIELDS per strategy."""
+        rows = []
+        for name, stats in self.stats.items():
+            rows.append({
+                "strategy": name,
+                "attempts": stats.attempts,
+                "successes": stats.successes,
+                "success_rate": round(stats.success_rate, 3),
+                "avg_latency_s": round(stats.average_latency, 2) if stats.successes else "",
+            })
+        return rows
+
+    def export_metrics(self):
+        """Writes the per-strategy metrics to this navigator's CSV file, replacing the previous snapshot."""
+        with open(self.metrics_path, "w", newline="", encoding="utf-8") as metrics_file:
+            writer = csv.DictWriter(metrics_file, fieldnames=NAVIGATION_METRICS_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.metrics())
+
+class _Cancelled(Exception):
+    """Raised inside GroupNavigator when `should_continue` stopped a strategy."""
@@ -0,0 +1,242 @@
+from functools import partial
+
+from contacts import resolve_contact_ids
+from database import get_group_watermarks, set_group_watermark
+from media_store import get_media_store, insert_media
+from timestamps import parse_whatsapp_timestamp
+
+# WhatsApp Web selectors used by the scraper.
+CHAT_LIST_SELECTOR = '#pane-side'
+APP_PANEL_SELECTOR = '#app > div > div.x78zum5.xdt5ytf.x5yr21d > div > div.x9f619.x1n2onr6.xyw6214.x5yr21d.x6ikm8r.x10wlt62.x17dzmu4.x1i1dayz.x2ipvbc.x1w8yi2h.xyyilfv.x1iyjqo2.xpilrb4.x1t7ytsu.x1m2ixmg'
+CONVERSATION_PANEL_SELECTOR = '#main > div.x1n2onr6.x1vjfegm.x1cqoux5.x14yy4lh'
+MESSAGE_ROW_SELECTOR = f'{CONVERSATION_PANEL_SELECTOR} div[role="row"]'
+GROUP_HEADER_SELECTOR = 'header [role="button"] span[dir="auto"]'
+# Photos in messages are served from blob: URLs; avatars and emoji are not.
+MESSAGE_IMAGE_SELECTOR = 'img[src^="blob:"]'
+
+# Reads the visible message rows in a single round trip to the browser. Rows are walked
+# from the newest up, and the walk stops at the group's watermark (the newest message
+# already stored), so known messages are neither read nor returned. Every row comes with a
+# selector for its message's data-id (or its data-pre-plain-text if it has none), so its picture
+# is captured from the same message even if rows were added or re-rendered in between.
+EXTRACT_MESSAGES_SCRIPT = """
+({rowSelector, headerSelector, imageSelector, watermarks}) => {
+    // 32-bit FNV-1a over the UTF-8 bytes, identical to text_hash() in whatsapp_scraper.py
+    const textHash = (value) => {
+        let hash = 0x811c9dc5;
+        for (const byte of new TextEncoder().encode(value)) {
+            hash = Math.imul(hash ^ byte, 0x01000193);
+        }
+        return (hash >>> 0).toString(16).padStart(8, '0');
+    };
+    const header = document.querySelector(headerSelector);
+    const groupName = header ? header.innerText : null;
+    const watermark = (watermarks && groupName !== null) ? watermarks[groupName] : null;
+    const allRows = document.querySelectorAll(rowSelector);
+    const rows = [];
+    let reachedWatermark = false;
+    for (let index = allRows.length - 1; index >= 0; index--) {
+        const row = allRows[index];
+        const textElement = row.querySelector('span.selectable-text');
+        const metaElement = row.querySelector('div[data-pre-plain-text]');
+        const text = textElement ? textElement.innerText.trim() : null;
+        const meta = metaElement ? metaElement.getAttribute('data-pre-plain-text').trim() : null;
+        if (watermark && meta) {
+            const parts = meta.split(']');
+            const timestamp = parts[0].slice(1);
+            const sender = (parts[1] || '').split(':')[0].trim();
+            if (timestamp === watermark.timestamp && sender === watermark.sender
+                    && textHash(text || '') === watermark.text_hash) {
+                reachedWatermark = true;
+                break;
+            }
+        }
+        const idElement = row.querySelector('[data-id]');
+        const key = idElement ? `[data-id="${CSS.escape(idElement.getAttribute('data-id'))}"]`
+            : metaElement ? `div[data-pre-plain-text="${CSS.escape(metaElement.getAttribute('data-pre-plain-text'))}"]`
+            : null;
+        const quoted = row.querySelector('[aria-label="Quoted message"]');
+        const quotedSpans = quoted ? quoted.querySelectorAll('span') : [];
+        rows.push({
+            index: index,
+            key: key,
+            text: text,
+            meta: meta,
+            is_reply: !!quoted,
+            quoted_sender: quotedSpans.length > 1 ? quotedSpans[0].innerText : null,
+            quoted_text: quotedSpans.length > 1 ? quotedSpans[1].innerText : null,
+            has_image: !!row.querySelector(imageSelector),
+        });
+    }
+    rows.reverse();
+    return {group_name: groupName, rows: rows, total_rows: allRows.length, reached_watermark: reachedWatermark};
+}
+"""
+
+def text_hash(text):
+    """32-bit FNV-1a hash of a message text, as hex. Matches the textHash function of EXTRACT_MESSAGES_SCRIPT."""
+    value = 0x811c9dc5
+    for byte in (text or '').encode('utf-8'):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return f'{value:08x}'
+
+def parse_meta_text(meta_text):
+    """
+    Splits a data-pre-plain-text value such as "[10:42, 3/7/2024] John Doe: " into (timestamp, sender).
+    """
+    timestamp = meta_text.split(']')[0][1:]
+    sender = meta_text.split(']')[1].split(':')[0].strip()
+    return timestamp, sender
+
+def extract_visible_messages(page, watermarks=None):
+    """
+    Reads the open chat with one page.evaluate call.
+
+    Args:
+        page: The Playwright page showing WhatsApp Web.
+        watermarks: Optional {group_name: watermark} from get_group_watermarks. Rows up to and
+            including the open group's watermark are skipped.
+
+    Returns:
+        A tuple (group_name, rows, skipped), where rows is a list of dictionaries, oldest first,
+        with the keys index, key, text, meta, is_reply, quoted_sender, quoted_text and has_image,
+        and skipped is the number of visible rows that were already known.
+    """
+    payload = page.evaluate(EXTRACT_MESSAGES_SCRIPT, {
+        "rowSelector": MESSAGE_ROW_SELECTOR,
+        "headerSelector": GROUP_HEADER_SELECTOR,
+        "imageSelector": MESSAGE_IMAGE_SELECTOR,
+        "watermarks": watermarks or {},
+    })
+    return payload["group_name"], payload["rows"], payload["total_rows"] - len(payload["rows"])
+
+def capture_message_image(page, row):
+    """
+    Takes a screenshot of the image in an extracted message row, found again by its key.
+    Returns PNG bytes, or None on failure or if the row no longer shows that one message.
+    """
+    if not row.get("key"):
+        return None
+    try:
+        message = page.locator(f'{MESSAGE_ROW_SELECTOR}:has({row["key"]})')
+        if message.count() != 1:
+            print(f"Skipping the picture of a message that is no longer in the chat: {row['meta']}")
+            return None
+        return message.locator(MESSAGE_IMAGE_SELECTOR).first.screenshot()
+    except Exception as e:
+        print(f"ERROR: Could not capture image with screenshot method: {e}")
+        return None
+
+def build_message_records(page, group_name, rows, media_store=None):
+    """
+    Turns extracted rows into tuples for the messages table, capturing images on the way.
+    Images go to the media store and the records reference them by hash.
+    Rows without sender info, or with neither text nor an image, are skipped. Image-only
+    rows whose picture could not be captured are skipped too and marked "capture_failed",
+    so newest_watermark leaves them to be read again.
+
+    Returns:
+        A tuple (records, media_items).
+    """
+    media_store = media_store or get_media_store()
+    records, media_items = [], []
+    for row in rows:
+        if not row["meta"]:
+            continue
+        picture_data = capture_message_image(page, row) if row["has_image"] else None
+        if not row["text"] and not picture_data:
+            if row["has_image"]:
+                row["capture_failed"] = True
+            continue
+        picture_hash = None
+        if picture_data:
+            media_item = media_store.prepare(picture_data)
+            media_items.append(media_item)
+            picture_hash = media_item.sha256
+        message_text = row["text"] or "[Image Post]"
+        timestamp, sender = parse_meta_text(row["meta"])
+        records.append((
+            group_name, sender, message_text, timestamp, picture_hash,
+            1 if row["is_reply"] else 0, row["quoted_text"], row["quoted_sender"],
+        ))
+    return records, media_items
+
+def newest_watermark(rows):
+    """
+    Returns (timestamp, sender, text_hash) for the newest storable row, or None if there is none.
+
+    The watermark stops before the oldest row whose picture could not be captured, so the next
+    pass reads that row again; the rows after it are stored now and ignored as duplicates then.
+    """
+    watermark = None
+    for row in rows:
+        if row.get("capture_failed"):
+            break
+        if row["meta"] and (row["text"] or row["has_image"]):
+            timestamp, sender = parse_meta_text(row["meta"])
+            watermark = timestamp, sender, text_hash(row["text"])
+    return watermark
+
+def insert_messages(db_connection, records, group_name=None, watermark=None, media_items=()):
+    """
+    Inserts message records, the media rows they reference, and the group's new watermark
+    if one is given, without committing. Returns the number of new messages.
+    """
+    insert_media(db_connection, media_items)
+    contact_ids = resolve_contact_ids(db_connection, [name for record in records for name in (record[1], record[7])])
+    # The raw timestamp and names are kept for display; queries use the parsed epoch and contact ids
+    cursor = db_connection.executemany("""
+        INSERT OR IGNORE INTO messages (
+            group_name, sender, message_text, timestamp, picture_hash, is_reply, replied_to_text, replied_to_sender,
+            timestamp_epoch, sender_contact_id, replied_to_contact_id
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (*record, parse_whatsapp_timestamp(record[3]), contact_ids.get(record[1]), contact_ids.get(record[7]))
+        for record in records
+    ])
+    # rowcount skips ignored duplicates and the search index rows written by triggers
+    new_rows = cursor.rowcount
+    if group_name and watermark:
+        set_group_watermark(db_connection, group_name, *watermark)
+    return new_rows
+
+def save_messages(db_connection, records, group_name=None, watermark=None, media_items=()):
+    """Inserts message records, their media and the group's new watermark in a single transaction. Returns the number of new rows."""
+    with db_connection:
+        return insert_messages(db_connection, records, group_name, watermark, media_items)
+
+def scrape_and_save_messages(page, db_connection, writer=None):
+    """
+    Scrapes the messages of the open chat that arrived since the group's watermark and stores them.
+    With a db_writer.DatabaseWriter, `db_connection` is only read from and the rows are
+    handed to the writer thread.
+
+    Returns:
+        A tuple (new, skipped): the number of rows stored, and the number of visible rows
+        that were already known (not walked, or walked but already in the database).
+    """
+    print("Scraping active chat...")
+    try:
+        # 1. Wait for the main conversation panel and its message rows.
+        page.wait_for_selector(CONVERSATION_PANEL_SELECTOR, timeout=10000)
+        page.wait_for_selector(MESSAGE_ROW_SELECTOR, timeout=5000)
+
+        # 2. Read everything newer than the watermark in one go.
+        group_name, rows, skipped = extract_visible_messages(page, get_group_watermarks(db_connection))
+        if not rows:
+            print(f"No new messages in '{group_name}' ({skipped} known).")
+            return 0, skipped
+        print(f"Scraping messages from group: {group_name}")
+
+        # 3. Parse and store in one transaction, moving the watermark with it.
+        records, media_items = build_message_records(page, group_name, rows)
+        store = writer.save_messages if writer else partial(save_messages, db_connection)
+        new_rows = store(records, group_name, newest_watermark(rows), media_items)
+        skipped += len(rows) - new_rows
+        print(f"Finished scraping. {new_rows} new, {skipped} skipped.")
+        return new_rows, skipped
+
+    except Exception as e:
+        print(f"Could not scrape messages: {e}")
+        return 0, 0